@@ -0,0 +1,70 @@
+import asyncio
+import time
+from collections import OrderedDict
+from quake_ingest.config import current_config
+from quake_ingest import metrics
+
+
+#In-process TTL + LRU cache for endpoint results.
+#Identical concurrent requests share one in-flight load (single flight), and
+#invalidate() - called whenever ingest commits new rows - bumps a version so
+#nothing computed before the write is served after it. The TTL is only a backstop
+#for a missed notification.
+class ResponseCache:
+    def __init__(self, max_entries=256, ttl=300, name="response"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.name = name  # cache label on the shared lookup metric
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> load task shared by concurrent callers
+
+    @staticmethod
+    def key(route, **params):
+        """Normalize query parameters into a hashable key; parameter order and unset values don't matter."""
+        return (route, tuple(sorted((name, value) for name, value in params.items() if value is not None)))
+
+    def invalidate(self, *_):
+        self.version += 1
+        self._entries.clear()
+        #loads already running were started against the old data; let new callers start fresh ones
+        self._inflight.clear()
+
+    async def get_or_load(self, key, loader):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+            return entry[1]
+        self.misses += 1
+        metrics.CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+        future = self._inflight.get(key)
+        if future is None:
+            #the load is its own task, so a caller that goes away (client disconnect) doesn't cancel it for the rest
+            future = asyncio.ensure_future(self._load(key, loader, self.version))
+            future.add_done_callback(lambda task: task.cancelled() or task.exception())  # no warning if nobody is left waiting
+            self._inflight[key] = future
+        return await asyncio.shield(future)
+
+    async def _load(self, key, loader, version):
+        try:
+            value = await loader()
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        if version == self.version:
+            self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+#shared by every route; invalidated from main's ingest change handler
+response_cache = ResponseCache(current_config["API_CACHE_SIZE"], current_config["API_CACHE_TTL"])
@@ -0,0 +1,76 @@
+import csv
+import io
+from quake_ingest.db import EARTHQUAKE_COLUMNS
+from quake_ingest.columnar import arrow_schema, record_batch
+
+#Chunk encoders for /export. Each takes an async iterator of row lists (one
+#server-side cursor fetch each) and yields bytes as soon as a chunk is encoded,
+#so the API never holds more than one chunk of the result set.
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+async def csv_chunks(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EARTHQUAKE_COLUMNS)
+    async for rows in chunks:
+        writer.writerows((_csv_value(value) for value in row) for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _csv_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+#pyarrow writers need a file-like sink; this one is drained after every chunk
+class _Sink(io.RawIOBase):
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+async def arrow_chunks(chunks):
+    import pyarrow as pa
+    schema = arrow_schema()
+    sink = _Sink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        async for rows in chunks:
+            writer.write_batch(record_batch(rows, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+async def parquet_chunks(chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = arrow_schema()
+    sink = _Sink()
+    #one row group per cursor chunk; the footer is written on close
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        async for rows in chunks:
+            writer.write_table(pa.Table.from_batches([record_batch(rows, schema)]))
+            yield sink.drain()
+    yield sink.drain()
+
+
+ENCODERS = {"csv": csv_chunks, "arrow": arrow_chunks, "parquet": parquet_chunks}
@@ -0,0 +1,20 @@
+from fastapi import HTTPException
+from quake_ingest.geo import parse_bbox
+
+
+def location_filters(bbox, lat, lon, radius_km):
+    """Validate the optional bbox / lat+lon+radius_km query parameters."""
+    filters = {}
+    try:
+        if bbox is not None:
+            filters["bbox"] = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    radius_params = (lat, lon, radius_km)
+    if any(p is not None for p in radius_params):
+        if any(p is None for p in radius_params):
+            raise HTTPException(status_code=400, detail="lat, lon and radius_km must be given together")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180 and radius_km > 0):
+            raise HTTPException(status_code=400, detail="lat, lon or radius_km is out of range")
+        filters.update(lat=lat, lon=lon, radius_km=radius_km)
+    return filters
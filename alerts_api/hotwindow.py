@@ -0,0 +1,321 @@
+import asyncio
+import heapq
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta
+from quake_ingest.config import current_config
+from quake_ingest.db import EARTHQUAKE_COLUMNS, get_earthquakes, get_earthquakes_by_ids, naive_local
+from quake_ingest.geo import bbox_around, haversine_km, in_bbox
+from quake_ingest import metrics
+
+#In-memory copy of the recent window (HOT_WINDOW_DAYS) of earthquakes, so the
+#listings nearly all traffic asks for (/latest, /alerts over the last hours or days)
+#never reach Postgres.
+#
+#Events sit in parallel arrays sorted by (occurred_at, id): a time range is two
+#bisects and the newest-first listing order is a backwards walk. Two indexes of
+#positions narrow the walk down: one list per whole magnitude and one per
+#GRID_DEGREES cell. A query takes whichever of them holds the fewest candidates,
+#checks the exact get_earthquakes filters on each and stops at offset + limit.
+#
+#The window holds every event from `cutoff` on. A query is answered from memory
+#when it found all the rows it asked for, or when its start lies inside the window;
+#anything else (older pages, sparse filters over all time) falls through to Postgres.
+#The window is filled at startup in the background, kept current from the same
+#change notifications as the response cache, and reloaded every HOT_WINDOW_REFRESH.
+
+#same fields as the database's listing rows, so callers can't tell where a row came from
+EarthquakeRow = namedtuple("EarthquakeRow", EARTHQUAKE_COLUMNS)
+
+#magnitude index lists: one per whole magnitude, the lowest and highest shared by everything beyond
+LOWEST_BAND, HIGHEST_BAND = -1, 9
+GRID_DEGREES = 5
+GRID_COLUMNS, GRID_ROWS = 360 // GRID_DEGREES, 180 // GRID_DEGREES
+EPOCH = datetime(1970, 1, 1)
+NAN = float("nan")
+
+
+def time_key(occurred_at):
+    """occurred_at (naive, as stored) as integer microseconds: the window's sort key."""
+    return (occurred_at - EPOCH) // timedelta(microseconds=1)
+
+
+def magnitude_band(magnitude):
+    if magnitude != magnitude:  # NaN: unknown, never passes a min_magnitude
+        return None
+    return min(max(math.floor(magnitude), LOWEST_BAND), HIGHEST_BAND)
+
+
+def grid_cell(latitude, longitude):
+    x = min(max(math.floor((longitude + 180) / GRID_DEGREES), 0), GRID_COLUMNS - 1)
+    y = min(max(math.floor((latitude + 90) / GRID_DEGREES), 0), GRID_ROWS - 1)
+    return x, y
+
+
+def box_cells(box):
+    """Grid cells overlapping a (west, south, east, north) box; west > east wraps across the antimeridian."""
+    west, south, east, north = box
+    spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+    cells = []
+    for span_west, span_east in spans:
+        x0, y0 = grid_cell(south, span_west)
+        x1, y1 = grid_cell(north, span_east)
+        cells.extend((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    return cells
+
+
+def batch_rows(batch):
+    """Listing rows for the events of a QuakeBatch (an in-process change notification)."""
+    return [EarthquakeRow(**row) for row in batch.rows()]
+
+
+class HotWindow:
+    def __init__(self, days=None, max_events=None, refresh=None, on_update=None):
+        self.window = timedelta(days=current_config["HOT_WINDOW_DAYS"] if days is None else days)
+        self.max_events = max_events or current_config["HOT_WINDOW_MAX_EVENTS"]
+        self.refresh = refresh or current_config["HOT_WINDOW_REFRESH"]
+        self.on_update = on_update  # called once new rows are in, e.g. to drop responses cached without them
+        self.ready = False
+        self.cutoff = None  # time key: the window holds every event at or after it
+        self._events = {}  # id -> EarthquakeRow
+        self._pending = None  # rows arriving while a load runs, applied on top of its result
+        self._tasks = set()
+        self._build()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def fill(self, rows, cutoff):
+        """Replace the contents with rows: every event from cutoff (a naive datetime) on."""
+        self.cutoff = time_key(cutoff)
+        self._events = {row.id: EarthquakeRow(*row) for row in rows}
+        self._build()
+        self.ready = True
+
+    async def load(self):
+        """(Re)fill the window from the database."""
+        cutoff = datetime.now() - self.window
+        self._pending = []
+        try:
+            #one more than fits, so _build knows where a truncated window really starts
+            rows = await get_earthquakes(limit=self.max_events + 1, min_magnitude=None, start=cutoff)
+            pending = self._pending
+        finally:
+            self._pending = None
+        self.fill(rows, cutoff)
+        self.apply(pending)
+
+    async def run(self):
+        """Fill the window, then reload it every refresh seconds as a backstop for missed notifications."""
+        while True:
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"Could not load the recent window, listings go to the database: {e}")
+            await asyncio.sleep(self.refresh)
+
+    def _build(self):
+        #(time key, id, row): the key is computed once per event and ids are unique, so rows are never compared
+        keyed = sorted((time_key(row.occurred_at), row.id, row) for row in self._events.values())
+        first = bisect_left(keyed, (self.cutoff,)) if self.cutoff is not None else 0
+        excess = len(keyed) - first - self.max_events
+        if excess > 0:
+            #start just after the newest event left out, so no event at the new cutoff is missing
+            self.cutoff = keyed[first + excess - 1][0] + 1
+            first = bisect_left(keyed, (self.cutoff,))
+        if first:
+            keyed = keyed[first:]
+            self._events = {event_id: row for _, event_id, row in keyed}
+        rows = self._rows = [row for _, _, row in keyed]
+        self._times = array("q", [key for key, _, _ in keyed])
+        self._magnitude = array("d", [NAN if row.magnitude is None else row.magnitude for row in rows])
+        self._latitude = array("d", [row.latitude for row in rows])
+        self._longitude = array("d", [row.longitude for row in rows])
+        self._bands = {}  # magnitude band -> ascending positions
+        self._cells = {}  # grid cell -> ascending positions
+        for position, (magnitude, latitude, longitude) in enumerate(zip(self._magnitude, self._latitude, self._longitude)):
+            self._index(position, magnitude, latitude, longitude)
+
+    def _index(self, position, magnitude, latitude, longitude):
+        self._bands.setdefault(magnitude_band(magnitude), array("q")).append(position)
+        self._cells.setdefault(grid_cell(latitude, longitude), array("q")).append(position)
+
+    def _append(self, key, row):
+        magnitude = NAN if row.magnitude is None else row.magnitude
+        self._index(len(self._rows), magnitude, row.latitude, row.longitude)
+        self._rows.append(row)
+        self._times.append(key)
+        self._magnitude.append(magnitude)
+        self._latitude.append(row.latitude)
+        self._longitude.append(row.longitude)
+
+    def _replace(self, old, row):
+        """Swap in a revision with the same occurred_at, moving it between index lists if needed."""
+        key = time_key(old.occurred_at)
+        position = bisect_left(self._times, key)
+        while self._rows[position].id != old.id:
+            position += 1
+        magnitude = NAN if row.magnitude is None else row.magnitude
+        for index, before, after in (
+            (self._bands, magnitude_band(self._magnitude[position]), magnitude_band(magnitude)),
+            (self._cells, grid_cell(old.latitude, old.longitude), grid_cell(row.latitude, row.longitude)),
+        ):
+            if before != after:
+                index[before].remove(position)
+                positions = index.setdefault(after, array("q"))
+                positions.insert(bisect_left(positions, position), position)
+        self._rows[position] = row
+        self._magnitude[position] = magnitude
+        self._latitude[position] = row.latitude
+        self._longitude[position] = row.longitude
+
+    def apply(self, rows):
+        """Upsert listing rows (fresh from the database or a written batch) into the window."""
+        if self._pending is not None:
+            self._pending.extend(rows)
+        if not self.ready:
+            return
+        added = []
+        rebuild = False
+        for row in rows:
+            row = EarthquakeRow(*row)
+            old = self._events.get(row.id)
+            if old is not None and old.updated_at is not None and row.updated_at is not None \
+                    and old.updated_at > row.updated_at:
+                continue  # a revision older than the one held
+            key = time_key(row.occurred_at) if row.occurred_at is not None else None
+            inside = key is not None and key >= self.cutoff
+            if old is not None and inside and old.occurred_at == row.occurred_at and not rebuild:
+                self._events[row.id] = row
+                self._replace(old, row)
+                continue
+            if old is not None:
+                #moved in time: its position changes, or it left the window
+                del self._events[row.id]
+                rebuild = True
+            if inside:
+                self._events[row.id] = row
+                added.append((key, row.id, row))
+        added.sort()
+        #the usual case, new events newer than everything held: append in place
+        if rebuild or len(self._events) > self.max_events \
+                or (added and self._rows and added[0][:2] <= (self._times[-1], self._rows[-1].id)):
+            self._build()
+        else:
+            for key, _, row in added:
+                self._append(key, row)
+        metrics.HOT_WINDOW_EVENTS.set(len(self._rows))
+
+    def on_change(self, payload):
+        """Change-notification callback: bring the written rows in (or reload after a bulk change)."""
+        if not self.ready and self._pending is None:
+            return
+        batch = payload.get("batch")
+        if batch is not None:
+            self.apply(batch_rows(batch))
+            self._updated()
+            return
+        ids = payload.get("ids")
+        #no ids: rows changed in bulk (a backfill, retention), reload everything
+        task = asyncio.get_running_loop().create_task(self._load_ids(ids) if ids else self._reload())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load_ids(self, ids):
+        try:
+            rows = await get_earthquakes_by_ids(ids)
+        except Exception as e:
+            print(f"Could not load changed earthquakes into the recent window: {e}")
+            return
+        self.apply(rows)
+        self._updated()
+
+    async def _reload(self):
+        try:
+            await self.load()
+        except Exception as e:
+            print(f"Could not reload the recent window: {e}")
+            return
+        self._updated()
+
+    def _updated(self):
+        if self.on_update is not None:
+            self.on_update()
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def query(self, limit=10, offset=0, min_magnitude=0, start=None, end=None, bbox=None, lat=None, lon=None,
+              radius_km=None, after=None):
+        """The rows get_earthquakes would return for the same arguments, or None when they may reach past the window."""
+        #negative paging is Postgres's to reject, not ours to answer with a wrong slice; an infinite
+        #or NaN min_magnitude has no band to index and is rare enough to leave to it too
+        if not self.ready or limit < 0 or offset < 0 or min_magnitude is not None and not math.isfinite(min_magnitude):
+            metrics.HOT_WINDOW_QUERIES.inc(result="database")
+            return None
+        times = self._times
+        lo, hi = 0, len(times)
+        start_key = None
+        if start is not None:
+            start_key = time_key(naive_local(start))
+            lo = bisect_left(times, start_key)
+        if end is not None:
+            hi = bisect_left(times, time_key(naive_local(end)))
+        after_key = None
+        if after is not None:
+            after_key = time_key(after[0])
+            hi = min(hi, bisect_right(times, after_key))
+        circle_box = bbox_around(lat, lon, radius_km) if radius_km is not None else None
+        boxes = [box for box in (bbox, circle_box) if box is not None]
+
+        wanted = offset + limit
+        found = []
+        if wanted:
+            for position in self._candidates(lo, hi, min_magnitude, boxes):
+                latitude, longitude = self._latitude[position], self._longitude[position]
+                if min_magnitude is not None and not self._magnitude[position] >= min_magnitude:
+                    continue
+                if bbox is not None and not in_bbox(latitude, longitude, bbox):
+                    continue
+                if circle_box is not None and (not in_bbox(latitude, longitude, circle_box)
+                                               or haversine_km(lat, lon, latitude, longitude) > radius_km):
+                    continue
+                if times[position] == after_key and not self._rows[position].id < after[1]:
+                    continue
+                found.append(position)
+                if len(found) == wanted:
+                    break
+        #fewer rows than asked for is only the whole answer if nothing before the window could qualify
+        if len(found) < wanted and (start_key is None or start_key < self.cutoff):
+            metrics.HOT_WINDOW_QUERIES.inc(result="database")
+            return None
+        metrics.HOT_WINDOW_QUERIES.inc(result="memory")
+        return [self._rows[position] for position in found[offset:]]
+
+    def _candidates(self, lo, hi, min_magnitude, boxes):
+        """Positions in [lo, hi), newest first, from the index that leaves the fewest to check."""
+        #merging index lists costs more per position than a plain scan: only worth it when it skips half
+        best, best_cost = None, (hi - lo) // 2
+        choices = []
+        if min_magnitude is not None:
+            floor = magnitude_band(min_magnitude)
+            choices.append([positions for band, positions in self._bands.items() if band is not None and band >= floor])
+        for box in boxes:
+            choices.append([self._cells[cell] for cell in box_cells(box) if cell in self._cells])
+        for lists in choices:
+            cost = sum(map(len, lists))
+            if cost < best_cost:
+                best, best_cost = lists, cost
+        if best is None:
+            return range(hi - 1, lo - 1, -1)
+        return heapq.merge(*(_newest_first(positions, lo, hi) for positions in best), reverse=True)
+
+
+def _newest_first(positions, lo, hi):
+    """The entries of an ascending positions array within [lo, hi), walked backwards without copying."""
+    for i in range(bisect_left(positions, hi) - 1, bisect_left(positions, lo) - 1, -1):
+        yield positions[i]
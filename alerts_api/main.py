@@ -1,65 +1,144 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from pydantic import BaseModel
-from datetime import datetime
-from quake_ingest.db import get_earthquakes, init_db
+from datetime import datetime, timezone
+import time
+from quake_ingest.db import get_earthquakes, get_database_stats, init_db, listen_for_changes, pool_status
+from quake_ingest.config import current_config
+from quake_ingest import notify, metrics
 import asyncio
-from alerts_api.models import Earthquake
+from alerts_api.models import Earthquake, LatestEarthquakes
+from alerts_api.serialize import encode_earthquakes, encode_latest
+from alerts_api.pagination import encode_cursor, decode_cursor
+from alerts_api.cache import response_cache
+from alerts_api.hotwindow import HotWindow
+from alerts_api.filters import location_filters
+from alerts_api.routes import alerts as alerts_routes, export as export_routes, aggregate as aggregate_routes, clusters as cluster_routes, rules as rule_routes, health as health_routes
+from alerts_api.routes.alerts import hub as stream_hub
 import os
 
+STARTED_AT = time.monotonic()
+
+#recent events kept in memory for /alerts and /latest; it drops cached responses again
+#once rows named by a notification are loaded, so none built without them outlive it
+hot_window = HotWindow(on_update=response_cache.invalidate)
+
+def on_ingest_change(payload):
+    response_cache.invalidate()
+    hot_window.on_change(payload)
+    stream_hub.on_change(payload)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    #react whenever ingest commits: in-process writes via notify.subscribe,
+    #writes from a separate ingester process via Postgres LISTEN/NOTIFY
+    notify.subscribe(on_ingest_change)
+    listener = None
+    try:
+        listener = await listen_for_changes(on_ingest_change)
+    except Exception as e:
+        print(f"Could not LISTEN for ingest changes, relying on cache TTL: {e}")
+    #filled in the background: until it is ready, listings simply go to the database
+    window_task = asyncio.create_task(hot_window.run()) if current_config["HOT_WINDOW_DAYS"] else None
     yield
+    notify.unsubscribe(on_ingest_change)
+    if window_task is not None:
+        window_task.cancel()
+        await asyncio.gather(window_task, return_exceptions=True)
+    await hot_window.close()
+    if listener is not None:
+        await listener.close()
 
 app=FastAPI(lifespan=lifespan)
-
-@app.on_event("startup")
-async def startup():
-    await init_db()
+app.include_router(alerts_routes.router)
+app.include_router(export_routes.router)
+app.include_router(aggregate_routes.router)
+app.include_router(cluster_routes.router)
+app.include_router(rule_routes.router)
+app.include_router(health_routes.router)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        #label by route template, not raw path, so ids and query strings don't explode the series count
+        route = request.scope.get("route")
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - start, route=route.path if route else "unmatched",
+                                     method=request.method, status=status)
 
 @app.get("/health")
 def health():
     return {"status": "ok"} 
 
-@app.get("/alerts")
-async def alerts(limit: int = 10, offset: int = 0, min_magnitude: float = 0):
-    results = await get_earthquakes(limit, offset, min_magnitude)
-    return results
+@app.get("/alerts", response_model=list[Earthquake])
+async def alerts(limit: int = 10, offset: int = 0, min_magnitude: float = 0,
+                 start: datetime | None = None, end: datetime | None = None,
+                 bbox: str | None = None, lat: float | None = None, lon: float | None = None,
+                 radius_km: float | None = None, cursor: str | None = None):
+    filters = location_filters(bbox, lat, lon, radius_km)
+    if cursor is not None:
+        if offset:
+            raise HTTPException(status_code=400, detail="use either cursor or offset, not both")
+        try:
+            filters["after"] = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def load():
+        rows = hot_window.query(limit, offset, min_magnitude, start=start, end=end, **filters)
+        if rows is None:
+            rows = await get_earthquakes(limit, offset, min_magnitude, start=start, end=end, **filters)
+        next_cursor = encode_cursor(rows[-1].occurred_at, rows[-1].id) if rows and len(rows) == limit else None
+        return encode_earthquakes(rows), next_cursor
+
+    key = response_cache.key("alerts", limit=limit, offset=offset, min_magnitude=min_magnitude, start=start, end=end, **filters)
+    #the cache holds the encoded body, so a hit costs no serialization at all
+    body, next_cursor = await response_cache.get_or_load(key, load)
+    #the body stays a plain list; the cursor for the following page travels in a header
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
 
 from datetime import datetime, timedelta
 
-@app.get("/latest")
+@app.get("/latest", response_model=LatestEarthquakes)
 async def get_latest():
-    results = await get_earthquakes(limit=20)
-    return {
-        "retrieved_at": datetime.now().isoformat(),
-        "earthquakes": results,
-        "count": len(results)
-    }
+    async def load():
+        rows = hot_window.query(limit=20)
+        if rows is None:
+            rows = await get_earthquakes(limit=20)
+        return encode_earthquakes(rows), len(rows)
+
+    earthquakes_json, count = await response_cache.get_or_load(response_cache.key("latest"), load)
+    return Response(content=encode_latest(datetime.now(), earthquakes_json, count), media_type="application/json")
 
 
 @app.get("/stats")
 async def get_stats():
-    from sqlalchemy import func, select
-    from quake_ingest.db import async_session, Earthquake
-    
-    async with async_session() as session:
-        total_count = await session.scalar(select(func.count(Earthquake.id)))
-        avg_magnitude = await session.scalar(select(func.avg(Earthquake.magnitude)))
-        max_magnitude = await session.scalar(select(func.max(Earthquake.magnitude)))
-        latest_quake = await session.scalar(select(func.max(Earthquake.occurred_at)))
-        
+    #the cached part only changes on ingest; the lag figures are computed fresh on every request
+    stats = await response_cache.get_or_load(response_cache.key("stats"), get_database_stats)
+    latest_quake = stats["latest_earthquake"]
+    last_ingested_at = stats["last_ingested_at"]
     return {
         "system_health": "operational",
         "database_stats": {
-            "total_earthquakes": total_count,
-            "average_magnitude": round(avg_magnitude, 2) if avg_magnitude else 0,
-            "max_magnitude": max_magnitude or 0,
-            "latest_earthquake": latest_quake.isoformat() if latest_quake else None
+            "total_earthquakes": stats["total"],
+            "average_magnitude": round(stats["average_magnitude"], 2) if stats["average_magnitude"] else 0,
+            "max_magnitude": stats["max_magnitude"] or 0,
+            "latest_earthquake": latest_quake.isoformat() if latest_quake else None,
+            "last_ingested_at": last_ingested_at.isoformat() if last_ingested_at else None,
+            #seconds since the ingester last wrote, and since the newest event happened
+            "ingest_lag_seconds": round((datetime.now(timezone.utc) - last_ingested_at).total_seconds(), 1) if last_ingested_at else None,
+            "data_lag_seconds": round((datetime.now() - latest_quake).total_seconds(), 1) if latest_quake else None,
         },
+        "db_pool": pool_status(),
         "api_version": "1.0.0",
-        "uptime_hours": 24
+        "uptime_hours": round((time.monotonic() - STARTED_AT) / 3600, 2)
     }
 
 
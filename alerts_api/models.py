@@ -1,12 +1,51 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
+#USGS leaves some fields empty (e.g. magnitude or place on fresh automatic events)
 class Earthquake(BaseModel):
     id :str
-    place:str
-    magnitude:float
-    depth:float
+    place:str | None
+    magnitude:float | None
+    depth:float | None
     latitude:float
     longitude:float
-    tsunami:bool
-    occurred_at:datetime
\ No newline at end of file
+    tsunami:bool | None
+    occurred_at:datetime
+    updated_at:datetime | None = None
+
+class LatestEarthquakes(BaseModel):
+    retrieved_at:datetime
+    earthquakes:list[Earthquake]
+    count:int
+
+#A rule's region is a polygon ring of [lon, lat] points or a latitude/longitude/radius_km
+#circle (or neither, for the whole world); criteria left out don't constrain. A ring
+#spanning more than 180 degrees of longitude is read as crossing the antimeridian.
+class AlertRuleIn(BaseModel):
+    name:str = Field(min_length=1, max_length=200)
+    webhook_url:str = Field(pattern=r"^https?://")
+    polygon:list[tuple[float, float]] | None = Field(None, min_length=3, max_length=1000)
+    latitude:float | None = Field(None, ge=-90, le=90)
+    longitude:float | None = Field(None, ge=-180, le=180)
+    radius_km:float | None = Field(None, gt=0, le=20000)
+    min_magnitude:float | None = None
+    min_depth:float | None = None
+    max_depth:float | None = None
+    tsunami:bool | None = None
+
+    @model_validator(mode="after")
+    def check_region(self):
+        circle = (self.latitude, self.longitude, self.radius_km)
+        if any(value is not None for value in circle) and any(value is None for value in circle):
+            raise ValueError("latitude, longitude and radius_km must be given together")
+        if self.polygon is not None and self.radius_km is not None:
+            raise ValueError("give either a polygon or a radius, not both")
+        if self.polygon is not None and not all(-180 <= lon <= 180 and -90 <= lat <= 90 for lon, lat in self.polygon):
+            raise ValueError("polygon points must be [lon, lat] in range")
+        if self.min_depth is not None and self.max_depth is not None and self.min_depth > self.max_depth:
+            raise ValueError("min_depth is greater than max_depth")
+        return self
+
+class AlertRule(AlertRuleIn):
+    id:int
+    created_at:datetime
@@ -0,0 +1,19 @@
+import base64
+from datetime import datetime
+
+
+#Opaque keyset cursor: the (occurred_at, id) of the last row on a page, so the
+#next page can seek straight past it instead of counting through an OFFSET.
+def encode_cursor(occurred_at, event_id):
+    raw = f"{occurred_at.isoformat()}|{event_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return the (occurred_at, id) pair inside cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        occurred_at, event_id = raw.split("|", 1)
+        return datetime.fromisoformat(occurred_at), event_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("invalid cursor") from e
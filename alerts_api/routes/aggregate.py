@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+from typing import Literal
+from fastapi import APIRouter, HTTPException
+from quake_ingest.db import get_aggregates, naive_local
+from quake_ingest.summary import UNKNOWN_MAGNITUDE_BIN
+from alerts_api.cache import response_cache
+from alerts_api.filters import location_filters
+
+router = APIRouter()
+
+#minute buckets always group raw events, so keep their range small
+MAX_MINUTE_SPAN = timedelta(days=7)
+
+
+def bucket_rows(rows):
+    """Fold (bucket, magnitude bin, count, energy) rows into one entry per bucket."""
+    buckets = []
+    for bucket, magnitude_bin, count, energy in rows:
+        if not buckets or buckets[-1]["start"] != bucket:
+            buckets.append({"start": bucket, "count": 0, "energy_joules": 0.0, "magnitude_histogram": {}})
+        entry = buckets[-1]
+        entry["count"] += count
+        entry["energy_joules"] += energy
+        label = "unknown" if magnitude_bin == UNKNOWN_MAGNITUDE_BIN else str(magnitude_bin)
+        entry["magnitude_histogram"][label] = count
+    for entry in buckets:
+        entry["start"] = entry["start"].isoformat()
+    return buckets
+
+
+@router.get("/aggregate")
+async def aggregate(bucket: Literal["minute", "hour", "day"] = "hour", start: datetime | None = None,
+                    end: datetime | None = None, min_magnitude: float | None = None,
+                    bbox: str | None = None, lat: float | None = None, lon: float | None = None,
+                    radius_km: float | None = None):
+    """Event counts, whole-magnitude histograms and radiated energy per time bucket."""
+    filters = location_filters(bbox, lat, lon, radius_km)
+    if bucket == "minute":
+        if start is None:
+            raise HTTPException(status_code=400, detail="minute buckets need a start")
+        #either bound may carry a timezone; compare both as stored (naive local time)
+        if naive_local(end or datetime.now()) - naive_local(start) > MAX_MINUTE_SPAN:
+            raise HTTPException(status_code=400, detail="minute buckets are limited to a 7 day range")
+
+    async def load():
+        rows = await get_aggregates(bucket, start=start, end=end, min_magnitude=min_magnitude, **filters)
+        return bucket_rows(rows)
+
+    key = response_cache.key("aggregate", bucket=bucket, start=start, end=end, min_magnitude=min_magnitude, **filters)
+    buckets = await response_cache.get_or_load(key, load)
+    return {"bucket": bucket, "buckets": buckets}
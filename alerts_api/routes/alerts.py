@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from quake_ingest.config import current_config
+from quake_ingest.geo import parse_bbox
+from alerts_api.stream import BroadcastHub, event_stream
+
+router = APIRouter()
+
+#fed by ingest change notifications (wired up in main's lifespan)
+hub = BroadcastHub(current_config["STREAM_QUEUE_SIZE"])
+
+
+@router.get("/alerts/stream")
+async def alerts_stream(request: Request, min_magnitude: float | None = None, bbox: str | None = None):
+    """Push newly ingested earthquakes as Server-Sent Events instead of polling /alerts."""
+    try:
+        region = parse_bbox(bbox) if bbox is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    subscription = hub.subscribe(min_magnitude, region)
+    return StreamingResponse(
+        event_stream(hub, subscription, request.is_disconnected, current_config["STREAM_KEEPALIVE"]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
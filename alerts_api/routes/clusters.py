@@ -0,0 +1,68 @@
+import math
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
+from quake_ingest.db import get_clusters
+from quake_ingest.geo import parse_bbox
+from alerts_api.cache import response_cache
+
+router = APIRouter()
+
+#grid cells across one 256 px map tile: about 32 px per cell at every zoom level
+TILE_CELLS = 8
+MAX_ZOOM = 18
+#most grid cells one request may span: a large screen's viewport is ~60 x 35 cells at any
+#zoom, while the whole world is 8192 cells from zoom 4 and 2**37 at zoom 18
+MAX_CELLS = 4096
+WORLD = (-180.0, -90.0, 180.0, 90.0)
+
+
+def cell_degrees(zoom):
+    """Side of a grid cell in degrees at a web map zoom level (the world is 2**zoom tiles wide)."""
+    return 360 / (2 ** zoom * TILE_CELLS)
+
+
+def spanned_cells(region, cell):
+    """Upper bound on the grid cells a (west, south, east, north) region touches."""
+    west, south, east, north = region
+    width = east - west if west <= east else east - west + 360
+    return (math.floor(width / cell) + 1) * (math.floor((north - south) / cell) + 1)
+
+
+def cluster_rows(rows):
+    """Shape (x, y, count, lat, lon, max mag, mean mag, id, place, depth) rows; single events keep their details."""
+    clusters = []
+    for x, y, count, latitude, longitude, max_magnitude, mean_magnitude, event_id, place, depth in rows:
+        cluster = {
+            "cell": [x, y],
+            "count": count,
+            "latitude": round(latitude, 5),
+            "longitude": round(longitude, 5),
+            "max_magnitude": max_magnitude,
+            "mean_magnitude": round(mean_magnitude, 2) if mean_magnitude is not None else None,
+        }
+        if count == 1:
+            cluster.update(id=event_id, place=place, depth=depth)
+        clusters.append(cluster)
+    return clusters
+
+
+@router.get("/clusters")
+async def clusters(zoom: int = Query(2, ge=0, le=MAX_ZOOM), bbox: str | None = None,
+                   min_magnitude: float | None = None, start: datetime | None = None, end: datetime | None = None):
+    """Events in the viewport aggregated into grid cells sized for the map's zoom level,
+    so the map draws a few hundred circles however many events match."""
+    try:
+        region = parse_bbox(bbox) if bbox is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cell = cell_degrees(zoom)
+    #every non-empty cell is a row: bound them before asking, as a deep zoom over the world would return the catalog
+    if spanned_cells(region or WORLD, cell) > MAX_CELLS:
+        raise HTTPException(status_code=400, detail="area too large for this zoom: pass a smaller bbox or a lower zoom")
+
+    async def load():
+        return cluster_rows(await get_clusters(cell, min_magnitude=min_magnitude, start=start, end=end, bbox=region))
+
+    key = response_cache.key("clusters", zoom=zoom, bbox=region, min_magnitude=min_magnitude, start=start, end=end)
+    cells = await response_cache.get_or_load(key, load)
+    return {"zoom": zoom, "cell_degrees": cell, "total": sum(c["count"] for c in cells), "clusters": cells}
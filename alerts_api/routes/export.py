@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Literal
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from quake_ingest.config import current_config
+from quake_ingest.db import stream_earthquake_rows
+from alerts_api.export import ENCODERS, MEDIA_TYPES
+from alerts_api.filters import location_filters
+
+router = APIRouter()
+
+
+@router.get("/export")
+async def export(format: Literal["csv", "arrow", "parquet"] = "csv", min_magnitude: float = 0,
+                 start: datetime | None = None, end: datetime | None = None,
+                 bbox: str | None = None, lat: float | None = None, lon: float | None = None,
+                 radius_km: float | None = None):
+    """Stream every matching earthquake, oldest first, as CSV, Arrow IPC stream or Parquet."""
+    filters = location_filters(bbox, lat, lon, radius_km)
+    if format != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail=f"{format} export needs pyarrow installed on the server")
+    chunks = stream_earthquake_rows(current_config["EXPORT_CHUNK_SIZE"], min_magnitude, start=start, end=end, **filters)
+    extension = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        ENCODERS[format](chunks),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="earthquakes.{extension}"'},
+    )
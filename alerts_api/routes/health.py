@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from quake_ingest import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus scrape endpoint: request latency, cache and DB pool metrics of this process."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
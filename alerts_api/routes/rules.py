@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException, Response
+from quake_ingest.db import create_alert_rule, delete_alert_rule, get_alert_rule, get_alert_rules
+from quake_ingest.rules import check_webhook_url
+from alerts_api.models import AlertRule, AlertRuleIn
+
+router = APIRouter()
+
+#Alert rules are evaluated by the ingester against every batch it writes (quake_ingest.rules);
+#changes made here reach it through a NOTIFY on the rules channel.
+
+
+def rule_dict(row):
+    return row._asdict()
+
+
+@router.post("/rules", response_model=AlertRule, status_code=201)
+async def create_rule(rule: AlertRuleIn):
+    try:
+        await check_webhook_url(rule.webhook_url)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    values = rule.model_dump()
+    if values["polygon"] is not None:
+        values["polygon"] = [list(point) for point in values["polygon"]]
+    return rule_dict(await create_alert_rule(values))
+
+
+@router.get("/rules", response_model=list[AlertRule])
+async def list_rules():
+    return [rule_dict(row) for row in await get_alert_rules()]
+
+
+@router.get("/rules/{rule_id}", response_model=AlertRule)
+async def get_rule(rule_id: int):
+    row = await get_alert_rule(rule_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="no such rule")
+    return rule_dict(row)
+
+
+@router.delete("/rules/{rule_id}", status_code=204)
+async def delete_rule(rule_id: int):
+    if not await delete_alert_rule(rule_id):
+        raise HTTPException(status_code=404, detail="no such rule")
+    return Response(status_code=204)
@@ -0,0 +1,28 @@
+import json
+from quake_ingest.db import EARTHQUAKE_COLUMNS
+
+
+#Encodes listing rows (plain column tuples, see db.LISTING_COLUMNS) straight to JSON
+#bytes. This skips FastAPI's jsonable_encoder, which reflects over every object
+#field by field; the C json encoder only calls back into Python for datetimes.
+def earthquake_dict(row):
+    return dict(zip(EARTHQUAKE_COLUMNS, row))
+
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def encode_earthquakes(rows):
+    return dumps([earthquake_dict(row) for row in rows])
+
+
+def encode_latest(retrieved_at, earthquakes_json, count):
+    """Wrap an already encoded earthquake list without decoding it again."""
+    return b'{"retrieved_at":' + dumps(retrieved_at) + b',"earthquakes":' + earthquakes_json + b',"count":' + str(count).encode() + b"}"
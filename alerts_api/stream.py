@@ -0,0 +1,81 @@
+import asyncio
+from quake_ingest.db import get_earthquakes_by_ids
+from quake_ingest.geo import in_bbox
+from alerts_api.serialize import earthquake_dict, dumps
+
+
+#One connected client: its filters and a bounded queue of events waiting to be sent.
+#When the queue is full the oldest event is dropped, so a slow client only ever
+#loses its own backlog and never holds up publishing to everyone else.
+class Subscription:
+    def __init__(self, max_queue, min_magnitude=None, bbox=None):
+        self.queue = asyncio.Queue(max_queue)
+        self.min_magnitude = min_magnitude
+        self.bbox = bbox
+        self.dropped = 0
+
+    def matches(self, event):
+        if self.min_magnitude is not None and (event["magnitude"] is None or event["magnitude"] < self.min_magnitude):
+            return False
+        if self.bbox is not None and not in_bbox(event["latitude"], event["longitude"], self.bbox):
+            return False
+        return True
+
+    def offer(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+#Fans newly ingested events out to every connected stream client.
+class BroadcastHub:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self.subscribers = set()
+        self._tasks = set()
+
+    def subscribe(self, min_magnitude=None, bbox=None):
+        subscription = Subscription(self.max_queue, min_magnitude, bbox)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, events):
+        for subscription in list(self.subscribers):
+            for event in events:
+                if subscription.matches(event):
+                    subscription.offer(event)
+
+    def on_change(self, payload):
+        """Change-notification callback: load the written rows and publish them (only if anyone listens)."""
+        if not self.subscribers or not payload.get("ids"):
+            return
+        task = asyncio.get_running_loop().create_task(self._load_and_publish(payload["ids"]))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load_and_publish(self, ids):
+        try:
+            rows = await get_earthquakes_by_ids(ids)
+        except Exception as e:
+            print(f"Could not load streamed earthquakes: {e}")
+            return
+        self.publish([earthquake_dict(row) for row in rows])
+
+
+async def event_stream(hub, subscription, is_disconnected, keepalive=15):
+    """Server-Sent Events for one subscription, with a comment line as keepalive while idle."""
+    try:
+        yield "retry: 5000\n\n"
+        while not await is_disconnected():
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"id: {event['id']}\nevent: earthquake\ndata: {dumps(event).decode()}\n\n"
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,35 @@
+from datetime import datetime
+from fastapi.testclient import TestClient
+from alerts_api.main import app
+from alerts_api.routes.aggregate import bucket_rows
+
+client = TestClient(app)
+
+def test_bucket_rows_folds_bins_into_histograms():
+    rows = [
+        (datetime(2024, 1, 1, 0), 2, 5, 10.0),
+        (datetime(2024, 1, 1, 0), -100, 1, 0.0),
+        (datetime(2024, 1, 1, 1), 4, 1, 100.0),
+    ]
+    buckets = bucket_rows(rows)
+    assert buckets[0] == {
+        "start": "2024-01-01T00:00:00", "count": 6, "energy_joules": 10.0,
+        "magnitude_histogram": {"2": 5, "unknown": 1},
+    }
+    assert buckets[1]["count"] == 1
+
+def test_minute_buckets_need_a_bounded_range():
+    assert client.get("/aggregate?bucket=minute").status_code == 400
+    assert client.get("/aggregate?bucket=minute&start=2020-01-01T00:00:00").status_code == 400
+    assert client.get("/aggregate?bucket=week").status_code == 422
+
+def test_minute_range_mixing_naive_and_aware_bounds(monkeypatch):
+    import alerts_api.routes.aggregate as aggregate
+
+    async def fake_get_aggregates(bucket, **kwargs):
+        return []
+    monkeypatch.setattr(aggregate, "get_aggregates", fake_get_aggregates)
+    aggregate.response_cache.invalidate()
+    response = client.get("/aggregate?bucket=minute&start=2024-01-01T00:00:00&end=2024-01-02T00:00:00Z")
+    assert response.status_code == 200
+    assert client.get("/aggregate?bucket=minute&start=2024-01-01T00:00:00Z&end=2024-02-01T00:00:00").status_code == 400
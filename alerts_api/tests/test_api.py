@@ -0,0 +1,82 @@
+from fastapi.testclient import TestClient
+from alerts_api.main import app
+
+client = TestClient(app)
+
+def test_health():
+    assert client.get("/health").json() == {"status": "ok"}
+
+def test_alerts_rejects_malformed_bbox():
+    assert client.get("/alerts?bbox=1,2,3").status_code == 400
+
+def test_alerts_requires_full_radius_query():
+    assert client.get("/alerts?lat=10&lon=20").status_code == 400
+    assert client.get("/alerts?lat=100&lon=20&radius_km=5").status_code == 400
+
+def test_alerts_rejects_bad_cursor():
+    assert client.get("/alerts?cursor=not-a-cursor").status_code == 400
+
+def test_stats_reports_summary_and_lag(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    import alerts_api.main as main
+
+    async def fake_stats():
+        return {
+            "total": 3, "average_magnitude": 2.456, "max_magnitude": 4.1,
+            "latest_earthquake": datetime.now() - timedelta(minutes=5),
+            "last_ingested_at": datetime.now(timezone.utc) - timedelta(seconds=30),
+        }
+    monkeypatch.setattr(main, "get_database_stats", fake_stats)
+    main.response_cache.invalidate()
+    body = client.get("/stats").json()
+    stats = body["database_stats"]
+    assert stats["total_earthquakes"] == 3
+    assert stats["average_magnitude"] == 2.46
+    assert 29 <= stats["ingest_lag_seconds"] < 60
+    assert 299 <= stats["data_lag_seconds"] < 330
+    assert body["uptime_hours"] >= 0
+
+def make_rows(n):
+    from datetime import datetime
+    from collections import namedtuple
+    Row = namedtuple("Row", "id place magnitude depth latitude longitude tsunami occurred_at updated_at")
+    return [Row(f"us{i}", "Atlantic_Ocean", 3.5, 9.0, 8.0, 7.0, True, datetime(2024, 1, 1, 0, i), None) for i in range(n)]
+
+def test_alerts_encodes_rows_and_returns_next_cursor(monkeypatch):
+    import alerts_api.main as main
+
+    async def fake_get_earthquakes(limit, *args, **kwargs):
+        return make_rows(limit)
+    monkeypatch.setattr(main, "get_earthquakes", fake_get_earthquakes)
+    main.response_cache.invalidate()
+    response = client.get("/alerts?limit=2")
+    assert response.json()[1] == {
+        "id": "us1", "place": "Atlantic_Ocean", "magnitude": 3.5, "depth": 9.0, "latitude": 8.0,
+        "longitude": 7.0, "tsunami": True, "occurred_at": "2024-01-01T00:01:00", "updated_at": None
+    }
+    cursor = response.headers["X-Next-Cursor"]
+    from alerts_api.pagination import decode_cursor
+    assert decode_cursor(cursor)[1] == "us1"
+
+def test_latest_wraps_encoded_rows(monkeypatch):
+    import alerts_api.main as main
+
+    async def fake_get_earthquakes(limit, *args, **kwargs):
+        return make_rows(3)
+    monkeypatch.setattr(main, "get_earthquakes", fake_get_earthquakes)
+    main.response_cache.invalidate()
+    body = client.get("/latest").json()
+    assert body["count"] == 3
+    assert [e["id"] for e in body["earthquakes"]] == ["us0", "us1", "us2"]
+
+def test_openapi_documents_response_models():
+    schema = client.get("/openapi.json").json()
+    alerts = schema["paths"]["/alerts"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert alerts["items"]["$ref"].endswith("/Earthquake")
+
+def test_metrics_records_route_templates():
+    client.get("/health")
+    client.get("/alerts?cursor=not-a-cursor")
+    text = client.get("/metrics").text
+    assert 'earthpulse_http_request_seconds_count{route="/health",method="GET",status="200"}' in text
+    assert 'earthpulse_http_request_seconds_count{route="/alerts",method="GET",status="400"}' in text
@@ -0,0 +1,72 @@
+import asyncio
+from alerts_api.cache import ResponseCache
+
+def test_key_ignores_parameter_order_and_unset_values():
+    assert ResponseCache.key("alerts", a=1, b=None, c=2) == ResponseCache.key("alerts", c=2, a=1)
+
+def test_concurrent_identical_requests_share_one_load():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["row"]
+
+    async def run():
+        cache = ResponseCache()
+        results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(10)))
+        assert results == [["row"]] * 10
+        assert await cache.get_or_load("k", loader) == ["row"]
+    asyncio.run(run())
+    assert len(calls) == 1
+
+def test_invalidate_forces_reload_and_failures_are_not_cached():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("db down")
+        return len(calls)
+
+    async def run():
+        cache = ResponseCache()
+        assert await cache.get_or_load("k", loader) == 1
+        cache.invalidate()
+        try:
+            await cache.get_or_load("k", loader)
+        except RuntimeError:
+            pass
+        assert await cache.get_or_load("k", loader) == 3
+    asyncio.run(run())
+
+def test_entries_expire_after_ttl():
+    async def run():
+        cache = ResponseCache(ttl=0)
+        values = iter([1, 2])
+        async def loader():
+            return next(values)
+        assert await cache.get_or_load("k", loader) == 1
+        assert await cache.get_or_load("k", loader) == 2
+    asyncio.run(run())
+
+def test_cancelled_caller_does_not_cancel_the_shared_load():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["row"]
+
+    async def run():
+        cache = ResponseCache()
+        first = asyncio.create_task(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == ["row"]
+        assert first.cancelled()
+        assert await cache.get_or_load("k", loader) == ["row"]
+    asyncio.run(run())
+    assert len(calls) == 1
@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+from alerts_api.main import app
+from alerts_api.routes.clusters import MAX_CELLS, WORLD, cell_degrees, cluster_rows, spanned_cells
+
+client = TestClient(app)
+
+def test_cells_halve_with_each_zoom_level():
+    assert cell_degrees(0) == 45
+    assert cell_degrees(3) == cell_degrees(2) / 2
+
+def test_cluster_rows_keep_details_of_single_events():
+    rows = [
+        (10, 20, 3, 1.23456789, 2.0, 4.5, 3.0, "a", "x", 10.0),
+        (11, 20, 1, 5.0, 6.0, 2.1, 2.1, "b", "Somewhere", 7.5),
+    ]
+    clusters = cluster_rows(rows)
+    assert clusters[0] == {"cell": [10, 20], "count": 3, "latitude": 1.23457, "longitude": 2.0,
+                           "max_magnitude": 4.5, "mean_magnitude": 3.0}
+    assert clusters[1]["id"] == "b" and clusters[1]["place"] == "Somewhere" and clusters[1]["depth"] == 7.5
+
+def test_clusters_validate_parameters():
+    assert client.get("/clusters?bbox=1,2,3").status_code == 400
+    assert client.get("/clusters?zoom=30").status_code == 422
+
+def test_clusters_need_a_viewport_when_zoomed_in():
+    assert spanned_cells(WORLD, cell_degrees(3)) <= MAX_CELLS < spanned_cells(WORLD, cell_degrees(4))
+    #a screen-sized viewport fits at any zoom, across the antimeridian too
+    assert spanned_cells((179.995, 0.0, -179.995, 0.005), cell_degrees(18)) <= MAX_CELLS
+    assert client.get("/clusters?zoom=18").status_code == 400
+    assert client.get("/clusters?zoom=10&bbox=-130,20,-60,50").status_code == 400
@@ -0,0 +1,36 @@
+import asyncio
+import io
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+from alerts_api.export import csv_chunks, arrow_chunks, parquet_chunks
+
+ROWS = [
+    ("us1", "Atlantic_Ocean", 3.5, 9.0, 8.0, 7.0, True, datetime(2024, 1, 1), None),
+    ("us2", None, None, 1.0, -8.0, -7.0, False, datetime(2024, 1, 2), datetime(2024, 1, 3)),
+]
+
+async def two_chunks():
+    yield ROWS[:1]
+    yield ROWS[1:]
+
+def collect(encoder):
+    async def run():
+        return b"".join([chunk async for chunk in encoder(two_chunks())])
+    return asyncio.run(run())
+
+def test_csv_export():
+    lines = collect(csv_chunks).decode().splitlines()
+    assert lines[0].startswith("id,place,magnitude")
+    assert lines[1] == "us1,Atlantic_Ocean,3.5,9.0,8.0,7.0,True,2024-01-01T00:00:00,"
+    assert len(lines) == 3
+
+def test_arrow_export_round_trips():
+    table = pa.ipc.open_stream(collect(arrow_chunks)).read_all()
+    assert table.column("id").to_pylist() == ["us1", "us2"]
+    assert table.column("magnitude").to_pylist() == [3.5, None]
+
+def test_parquet_export_writes_one_row_group_per_chunk():
+    parquet = pq.ParquetFile(io.BytesIO(collect(parquet_chunks)))
+    assert parquet.metadata.num_row_groups == 2
+    assert parquet.read().column("occurred_at").to_pylist() == [datetime(2024, 1, 1), datetime(2024, 1, 2)]
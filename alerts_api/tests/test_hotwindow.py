@@ -0,0 +1,112 @@
+import random
+from datetime import datetime, timedelta
+from alerts_api.hotwindow import HotWindow, EarthquakeRow
+from quake_ingest.batch import QuakeBatch
+from quake_ingest.geo import bbox_around, haversine_km, in_bbox
+
+NOW = datetime(2024, 3, 10, 12, 0)
+CUTOFF = NOW - timedelta(days=7)
+
+def make_row(id, minutes_ago, magnitude=3.0, latitude=10.0, longitude=20.0, updated_at=None):
+    return EarthquakeRow(id, "somewhere", magnitude, 10.0, latitude, longitude, False,
+                         NOW - timedelta(minutes=minutes_ago), updated_at)
+
+def random_rows(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        make_row(f"ev{i:05d}", rng.randrange(0, 7 * 24 * 60), rng.choice([None, rng.uniform(-1, 8)]),
+                 rng.uniform(-90, 90), rng.uniform(-180, 180))
+        for i in range(count)
+    ]
+
+#what get_earthquakes returns, spelled out over a plain list
+def reference(rows, limit=10, offset=0, min_magnitude=0, start=None, end=None, bbox=None, lat=None, lon=None,
+              radius_km=None, after=None):
+    def keep(row):
+        if min_magnitude is not None and (row.magnitude is None or row.magnitude < min_magnitude):
+            return False
+        if start is not None and row.occurred_at < start or end is not None and row.occurred_at >= end:
+            return False
+        if bbox is not None and not in_bbox(row.latitude, row.longitude, bbox):
+            return False
+        if radius_km is not None and (not in_bbox(row.latitude, row.longitude, bbox_around(lat, lon, radius_km))
+                                      or haversine_km(lat, lon, row.latitude, row.longitude) > radius_km):
+            return False
+        return after is None or (row.occurred_at, row.id) < after
+    ordered = sorted(filter(keep, rows), key=lambda row: (row.occurred_at, row.id), reverse=True)
+    return ordered[offset:offset + limit]
+
+def filled(rows, **kwargs):
+    window = HotWindow(days=7, **kwargs)
+    window.fill(rows, CUTOFF)
+    return window
+
+def test_query_matches_database_semantics():
+    rows = random_rows(3000)
+    window = filled(rows)
+    for params in [
+        {},
+        {"limit": 20},
+        {"limit": 50, "offset": 30, "min_magnitude": None},
+        {"limit": 100, "min_magnitude": 4.5},
+        {"limit": 5, "min_magnitude": 7.5, "start": NOW - timedelta(days=2)},
+        {"limit": 100, "bbox": (170.0, -30.0, -170.0, 30.0), "start": CUTOFF},
+        {"limit": 100, "lat": 35.0, "lon": 139.0, "radius_km": 3000, "start": NOW - timedelta(days=3)},
+        {"limit": 10, "start": NOW - timedelta(days=1), "end": NOW - timedelta(hours=6), "min_magnitude": 2.0},
+        {"limit": 10, "after": (rows[0].occurred_at, rows[0].id)},
+    ]:
+        answer = window.query(**params)
+        assert answer is not None, params
+        assert answer == reference(rows, **params), params
+    assert window.query(limit=20) == reference(rows, limit=20)
+
+def test_falls_through_when_the_answer_may_be_older_than_the_window():
+    window = filled([make_row("a", 10, 5.0), make_row("b", 20, 2.0)])
+    assert window.query(limit=10) is None
+    assert window.query(limit=1) == [make_row("a", 10, 5.0)]
+    #a start inside the window makes a short answer complete
+    assert window.query(limit=10, start=CUTOFF) == [make_row("a", 10, 5.0), make_row("b", 20, 2.0)]
+    assert window.query(limit=10, start=CUTOFF - timedelta(days=1)) is None
+    assert HotWindow(days=7).query() is None  # not loaded yet
+
+def test_apply_appends_revises_and_moves_events():
+    window = filled([make_row("a", 30, 2.0), make_row("b", 20, 3.0)])
+    window.apply([make_row("c", 10, 6.0)])
+    assert [row.id for row in window.query(limit=3, min_magnitude=None)] == ["c", "b", "a"]
+    #a revision in place: the magnitude index follows it
+    window.apply([make_row("a", 30, 6.5, updated_at=NOW)])
+    assert [row.id for row in window.query(limit=2, min_magnitude=6.0)] == ["c", "a"]
+    #an older revision arriving late is ignored
+    window.apply([make_row("a", 30, 1.0, updated_at=NOW - timedelta(hours=1))])
+    assert window.query(limit=1, min_magnitude=6.0, start=CUTOFF)[0].id == "c"
+    assert len(window.query(limit=5, min_magnitude=6.0, start=CUTOFF)) == 2
+    #origin time revised to before the window: gone from memory
+    window.apply([make_row("b", 8 * 24 * 60, 3.0)])
+    assert [row.id for row in window.query(limit=5, min_magnitude=None, start=CUTOFF)] == ["c", "a"]
+
+def test_max_events_keeps_the_newest_whole_timestamps():
+    window = filled([make_row("a", 30), make_row("b", 20), make_row("c", 20), make_row("d", 10)], max_events=2)
+    assert len(window) == 1
+    assert window.query(limit=1) == [make_row("d", 10)]
+    assert window.query(limit=2) is None
+
+def test_on_change_applies_written_batch_and_notifies():
+    updates = []
+    window = filled([], on_update=lambda: updates.append(True))
+    batch = QuakeBatch.from_rows([{
+        "id": "new", "place": "here", "magnitude": 4.0, "depth": 5.0, "latitude": 1.0, "longitude": 2.0,
+        "tsunami": False, "occurred_at": NOW, "updated_at": None,
+    }])
+    window.on_change({"ids": ["new"], "batch": batch})
+    assert [row.id for row in window.query(limit=1)] == ["new"]
+    assert updates == [True]
+
+def test_negative_paging_is_left_to_the_database():
+    window = filled(random_rows(50))
+    assert window.query(limit=-1) is None
+    assert window.query(limit=5, offset=-3) is None
+
+def test_non_finite_min_magnitude_is_left_to_the_database():
+    window = filled(random_rows(50))
+    for min_magnitude in (float("inf"), float("-inf"), float("nan")):
+        assert window.query(limit=5, min_magnitude=min_magnitude) is None
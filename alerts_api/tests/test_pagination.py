@@ -0,0 +1,11 @@
+from datetime import datetime
+import pytest
+from alerts_api.pagination import encode_cursor, decode_cursor
+
+def test_cursor_round_trips():
+    occurred_at = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    assert decode_cursor(encode_cursor(occurred_at, "us7000abcd|x")) == (occurred_at, "us7000abcd|x")
+
+def test_malformed_cursor_raises_value_error():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+from alerts_api.main import app
+from alerts_api.models import AlertRuleIn
+from quake_ingest.config import current_config
+
+client = TestClient(app)
+
+def test_rule_regions_are_validated():
+    assert AlertRuleIn(name="x", webhook_url="http://hook", latitude=1, longitude=2, radius_km=100).radius_km == 100
+    assert AlertRuleIn(name="x", webhook_url="https://hook", polygon=[[0, 0], [1, 0], [1, 1]]).polygon[2] == (1, 1)
+    for body in [
+        {"name": "x", "webhook_url": "http://hook", "latitude": 1, "radius_km": 100},
+        {"name": "x", "webhook_url": "http://hook", "polygon": [[0, 0], [1, 0]]},
+        {"name": "x", "webhook_url": "http://hook", "polygon": [[0, 0], [1, 0], [200, 1]]},
+        {"name": "x", "webhook_url": "http://hook", "polygon": [[0, 0], [1, 0], [1, 1]], "latitude": 0, "longitude": 0, "radius_km": 5},
+        {"name": "x", "webhook_url": "http://hook", "min_depth": 100, "max_depth": 10},
+        {"name": "x", "webhook_url": "ftp://hook"},
+    ]:
+        assert client.post("/rules", json=body).status_code == 422, body
+
+def test_rules_cannot_point_webhooks_inward(monkeypatch):
+    monkeypatch.setitem(current_config, "ALERT_WEBHOOK_ALLOW_PRIVATE", False)
+    for url in ["http://127.0.0.1:8000/hook", "http://169.254.169.254/latest/meta-data", "https://10.1.2.3/",
+                "http://[::1]/hook", "http://[::ffff:192.168.0.1]/hook", "http://localhost/hook"]:
+        response = client.post("/rules", json={"name": "x", "webhook_url": url})
+        assert response.status_code == 422, url
@@ -0,0 +1,38 @@
+import asyncio
+from alerts_api.stream import BroadcastHub, event_stream
+
+def make_event(id, magnitude=3.0, latitude=10.0, longitude=20.0):
+    return {"id": id, "magnitude": magnitude, "latitude": latitude, "longitude": longitude}
+
+def test_publish_applies_subscriber_filters():
+    async def run():
+        hub = BroadcastHub()
+        strong = hub.subscribe(min_magnitude=4.0)
+        boxed = hub.subscribe(bbox=(0, 0, 30, 30))
+        hub.publish([make_event("a", 5.0), make_event("b", 2.0, latitude=-10.0), make_event("c", None)])
+        assert [strong.queue.get_nowait()["id"] for _ in range(strong.queue.qsize())] == ["a"]
+        assert [boxed.queue.get_nowait()["id"] for _ in range(boxed.queue.qsize())] == ["a", "c"]
+    asyncio.run(run())
+
+def test_slow_subscriber_drops_oldest_without_blocking_others():
+    async def run():
+        hub = BroadcastHub(max_queue=2)
+        slow = hub.subscribe()
+        hub.publish([make_event("a"), make_event("b"), make_event("c")])
+        assert slow.dropped == 1
+        assert [slow.queue.get_nowait()["id"] for _ in range(2)] == ["b", "c"]
+    asyncio.run(run())
+
+def test_event_stream_formats_sse_and_unsubscribes():
+    async def run():
+        hub = BroadcastHub()
+        subscription = hub.subscribe()
+        hub.publish([make_event("a")])
+        disconnected = iter([False, True])
+
+        async def is_disconnected():
+            return next(disconnected)
+        chunks = [chunk async for chunk in event_stream(hub, subscription, is_disconnected, keepalive=0.01)]
+        assert chunks[1].startswith("id: a\nevent: earthquake\ndata: {")
+        assert subscription not in hub.subscribers
+    asyncio.run(run())
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import sys
+import time
+import aiohttp
+
+#Closed-loop load test of the read endpoints: `concurrency` clients each send
+#their next request as soon as the previous one answers, and per-request latency
+#is reduced to p50/p99. Path templates get the request number as {i}, so a
+#template can defeat the response cache (e.g. a different offset per request).
+
+DEFAULT_ENDPOINTS = {
+    "alerts": "/alerts?limit=100",
+    "alerts_uncached": "/alerts?limit=100&offset={i}",
+    "alerts_filtered": "/alerts?limit=100&min_magnitude=2.5",
+    "latest": "/latest",
+    "stats": "/stats",
+}
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list, q in [0, 100]."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))  # ceil without floats
+    return sorted_values[int(rank) - 1]
+
+
+async def load_test(session, base_url, template, requests, concurrency):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                async with session.get(base_url + template.format(i=i)) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+async def bench_api(base_url, requests=2000, concurrency=20, endpoints=None, warmup=50):
+    endpoints = endpoints or DEFAULT_ENDPOINTS
+    results = []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for name, template in endpoints.items():
+            await load_test(session, base_url, template, warmup, min(concurrency, warmup))
+            results.append({"endpoint": name, "path": template, **await load_test(session, base_url, template, requests, concurrency)})
+    return results
+
+
+async def start_api(port, workers=1, poll=0.2):
+    """Run the API under uvicorn in a child process and wait until /health answers (checked every poll seconds)."""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "uvicorn", "alerts_api.main:app",
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+        env={**os.environ, "APP_ROLE": "api"},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    async with aiohttp.ClientSession() as session:
+        for _ in range(int(20 / poll)):
+            if process.returncode is not None:
+                raise RuntimeError(f"API exited with status {process.returncode}")
+            try:
+                async with session.get(f"{base_url}/health") as response:
+                    if response.status == 200:
+                        return process, base_url
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(poll)
+    process.terminate()
+    raise RuntimeError("API did not become healthy within 20s")
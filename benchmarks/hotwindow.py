@@ -0,0 +1,52 @@
+import random
+import time
+from datetime import datetime, timedelta
+from benchmarks.api import percentile
+from benchmarks.synthetic import make_feature
+from quake_ingest.parser import parse_batch
+from alerts_api.hotwindow import HotWindow, batch_rows
+
+#The in-memory recent window without a database: a synthetic week of events and
+#the listing shapes the API sees most, each timed over many queries. These are
+#meant to stay well under a millisecond; a shape that falls through to Postgres
+#is reported with answered=False.
+
+WINDOW_DAYS = 7
+
+
+def query_shapes(now):
+    return {
+        "latest": {"limit": 20},
+        "alerts_100": {"limit": 100},
+        "alerts_m4.5": {"limit": 100, "min_magnitude": 4.5},
+        "alerts_day": {"limit": 100, "start": now - timedelta(days=1), "min_magnitude": 2.5},
+        "alerts_bbox": {"limit": 100, "bbox": (-125.0, 32.0, -114.0, 42.0), "start": now - timedelta(days=WINDOW_DAYS)},
+        "alerts_radius": {"limit": 50, "lat": 35.7, "lon": 139.7, "radius_km": 500, "start": now - timedelta(days=3)},
+    }
+
+
+def bench_hot_window(event_count, queries=2000, seed=0):
+    rng = random.Random(seed)
+    now = datetime.now()
+    now_ms = int(now.timestamp() * 1000)
+    batch = parse_batch(make_feature(i, rng, now_ms, time_ms=now_ms - rng.randrange(WINDOW_DAYS * 86_400_000))
+                        for i in range(event_count))
+    rows = batch_rows(batch)
+    window = HotWindow(days=WINDOW_DAYS, max_events=event_count)
+    start = time.perf_counter()
+    window.fill(rows, now - timedelta(days=WINDOW_DAYS))
+    results = {"events": event_count, "fill_ms": round((time.perf_counter() - start) * 1000, 1), "shapes": []}
+    for name, params in query_shapes(now).items():
+        latencies = []
+        for _ in range(queries):
+            start = time.perf_counter()
+            rows = window.query(**params)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        results["shapes"].append({
+            "shape": name,
+            "answered": rows is not None,
+            "p50_us": round(percentile(latencies, 50) * 1e6, 1),
+            "p99_us": round(percentile(latencies, 99) * 1e6, 1),
+        })
+    return results
@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import time
+from sqlalchemy import delete
+
+#One ingest measurement: fetch -> parse -> save for a single feed URL.
+#run.py starts this in a fresh interpreter per size and mode, so the peak RSS
+#reported belongs to that run alone and not to whatever ran before it.
+
+MODES = ("buffered", "streaming")
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on Linux, bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+async def reset_bench_rows():
+    """Delete the rows a previous run wrote, so every run measures inserts."""
+    from quake_ingest.db import async_session, Earthquake
+    from benchmarks.synthetic import BENCH_ID_PREFIX
+    async with async_session() as session:
+        await session.execute(delete(Earthquake).where(Earthquake.id.startswith(BENCH_ID_PREFIX)))
+        await session.commit()
+
+
+async def bench_ingest(url, mode="buffered", batch_size=None):
+    from quake_ingest.config import current_config
+    from quake_ingest.db import configure_engine, init_db, save_earthquakes, save_earthquake_stream
+    from quake_ingest.fetcher import FeedFetcher
+    from quake_ingest.parser import parse_batch, aiter_batches
+
+    batch_size = batch_size or current_config["BATCH_SIZE"]
+    await configure_engine("ingest")
+    await init_db()
+    await reset_bench_rows()
+    result = {"mode": mode, "batch_size": batch_size}
+    async with FeedFetcher() as fetcher:
+        start = time.perf_counter()
+        if mode == "buffered":
+            #the poll path: whole response in memory, one columnar batch, chunked upserts
+            data = await fetcher.fetch(url, conditional=False)
+            fetched = time.perf_counter()
+            batch = parse_batch(data["features"])
+            parsed = time.perf_counter()
+            counts = await save_earthquakes(batch, batch_size)
+            result.update(fetch_seconds=fetched - start, parse_seconds=parsed - fetched, save_seconds=time.perf_counter() - parsed)
+            del data, batch
+        elif mode == "streaming":
+            #fetch, parse and save overlap; memory stays at one batch regardless of feed size
+            counts = await save_earthquake_stream(aiter_batches(fetcher.stream_features(url), batch_size))
+        else:
+            raise ValueError(f"unknown mode {mode!r}, expected one of {MODES}")
+        elapsed = time.perf_counter() - start
+    events = sum(counts.values())
+    result.update(
+        events=events,
+        seconds=round(elapsed, 3),
+        events_per_sec=round(events / elapsed, 1) if elapsed else None,
+        peak_rss_mb=peak_rss_mb(),
+        **counts,
+    )
+    for key in ("fetch_seconds", "parse_seconds", "save_seconds"):
+        if key in result:
+            result[key] = round(result[key], 3)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure one fetch -> parse -> save run and print it as JSON.")
+    parser.add_argument("url")
+    parser.add_argument("--mode", choices=MODES, default="buffered")
+    parser.add_argument("--batch-size", type=int)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(bench_ingest(args.url, args.mode, args.batch_size))))
@@ -0,0 +1,51 @@
+import random
+import time
+from benchmarks.synthetic import make_feature
+from quake_ingest.parser import parse_batch
+from quake_ingest.rules import Rule, RuleIndex
+
+#Alert rule matching without a database: a synthetic rule set (mostly circles and
+#small polygons, a few worldwide magnitude alerts) against a synthetic batch.
+#The whole batch has to be matched well within one poll interval.
+
+
+def make_rules(count, seed=0):
+    rng = random.Random(seed)
+    rules = []
+    for rule_id in range(count):
+        kind = rng.random()
+        latitude, longitude = rng.uniform(-80, 80), rng.uniform(-180, 180)
+        min_magnitude = rng.choice((None, 1.0, 2.5, 4.5))
+        if kind < 0.7:
+            rule = Rule(rule_id, latitude=latitude, longitude=longitude, radius_km=rng.uniform(10, 500),
+                        min_magnitude=min_magnitude)
+        elif kind < 0.95:
+            size = rng.uniform(0.5, 5)
+            west, south = max(-180.0, longitude - size), max(-90.0, latitude - size)
+            polygon = [[west, south], [west + size, south], [west + size, south + size], [west, south + size]]
+            rule = Rule(rule_id, polygon=polygon, min_magnitude=min_magnitude, max_depth=rng.choice((None, 70.0)))
+        else:
+            rule = Rule(rule_id, min_magnitude=rng.choice((5.0, 6.0)), tsunami=rng.choice((None, True)))
+        rules.append(rule)
+    return rules
+
+
+def bench_rules(rule_count, event_count, seed=0):
+    rng = random.Random(seed)
+    now_ms = int(time.time() * 1000)
+    batch = parse_batch(make_feature(i, rng, now_ms) for i in range(event_count))
+    rules = make_rules(rule_count, seed)
+    start = time.perf_counter()
+    index = RuleIndex(rules)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    matches = index.match(batch)
+    elapsed = time.perf_counter() - start
+    return {
+        "rules": rule_count,
+        "events": event_count,
+        "build_ms": round(build * 1000, 1),
+        "match_ms": round(elapsed * 1000, 1),
+        "events_per_sec": round(event_count / elapsed),
+        "matching_rules": len(matches),
+    }
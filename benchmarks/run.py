@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from benchmarks.synthetic import write_feed
+from benchmarks.stub_server import StubFeedServer
+from benchmarks.api import bench_api, start_api
+from benchmarks.rules import bench_rules
+from benchmarks.hotwindow import bench_hot_window
+from benchmarks.startup import bench_startup
+
+#Benchmark driver:
+#    python -m benchmarks.run --sizes 1000,10000,100000 --output results.json
+#    python -m benchmarks.run --baseline results.json   # exits 1 on a regression
+#
+#It writes to the database of the active APP_ENV config; point it at a disposable
+#Postgres. Only rows with synthetic "bench..." ids are touched.
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_ingest(sizes, modes, batch_size=None):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        async with StubFeedServer(directory) as server:
+            for size in sizes:
+                name = f"synthetic_{size}.geojson"
+                feed_bytes = write_feed(Path(directory) / name, size)
+                for mode in modes:
+                    #a fresh interpreter per run keeps peak RSS honest
+                    command = [sys.executable, "-m", "benchmarks.ingest", server.url(name), "--mode", mode]
+                    if batch_size:
+                        command += ["--batch-size", str(batch_size)]
+                    process = await asyncio.create_subprocess_exec(*command, cwd=ROOT, stdout=asyncio.subprocess.PIPE)
+                    stdout, _ = await process.communicate()
+                    if process.returncode != 0:
+                        raise RuntimeError(f"ingest benchmark failed for {size} events ({mode})")
+                    result = {"size": size, "feed_mb": round(feed_bytes / (1 << 20), 1), **json.loads(stdout.splitlines()[-1])}
+                    print(f"ingest {size:>8} {mode:<9} {result['events_per_sec']:>10} events/s  peak {result['peak_rss_mb']} MB")
+                    results.append(result)
+    return results
+
+
+async def run_api(api_url, port, requests, concurrency):
+    process = None
+    if api_url is None:
+        process, api_url = await start_api(port)
+    try:
+        results = await bench_api(api_url, requests, concurrency)
+    finally:
+        if process is not None:
+            process.terminate()
+            await process.wait()
+    for result in results:
+        print(f"api {result['endpoint']:<16} p50 {result['p50_ms']:>7} ms  p99 {result['p99_ms']:>7} ms  {result['rps']} req/s")
+    return results
+
+
+def run_rules(rule_counts, events):
+    results = []
+    for count in rule_counts:
+        result = bench_rules(count, events)
+        print(f"rules {count:>8} x {events} events: index {result['build_ms']} ms, match {result['match_ms']} ms")
+        results.append(result)
+    return results
+
+
+def run_hot_window(event_counts, queries):
+    results = []
+    for count in event_counts:
+        result = bench_hot_window(count, queries)
+        for shape in result["shapes"]:
+            source = "memory" if shape["answered"] else "falls through"
+            print(f"hot window {count:>7} {shape['shape']:<14} p50 {shape['p50_us']:>7} us  p99 {shape['p99_us']:>7} us  ({source})")
+        results.append(result)
+    return results
+
+
+async def run_startup(port, runs):
+    result = await bench_startup(port, runs)
+    print(f"startup import {result['import_ms']} ms  boot {result['boot_ms']} ms  first query {result['first_query_ms']} ms")
+    return result
+
+
+def compare(baseline, current, tolerance):
+    """Regressions of current against baseline beyond tolerance (0.2 = 20%)."""
+    regressions = []
+    before = {(r["size"], r["mode"]): r for r in baseline.get("ingest", [])}
+    for result in current.get("ingest", []):
+        old = before.get((result["size"], result["mode"]))
+        if old is None:
+            continue
+        if result["events_per_sec"] < old["events_per_sec"] * (1 - tolerance):
+            regressions.append(f"ingest {result['size']} {result['mode']}: {old['events_per_sec']} -> {result['events_per_sec']} events/s")
+        if result["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"ingest {result['size']} {result['mode']}: peak RSS {old['peak_rss_mb']} -> {result['peak_rss_mb']} MB")
+    before = {r["endpoint"]: r for r in baseline.get("api", [])}
+    for result in current.get("api", []):
+        old = before.get(result["endpoint"])
+        if old is None:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if result[key] > old[key] * (1 + tolerance):
+                regressions.append(f"api {result['endpoint']}: {key} {old[key]} -> {result[key]}")
+    before = {(r["rules"], r["events"]): r for r in baseline.get("rules", [])}
+    for result in current.get("rules", []):
+        old = before.get((result["rules"], result["events"]))
+        if old is not None and result["match_ms"] > old["match_ms"] * (1 + tolerance):
+            regressions.append(f"rules {result['rules']}: match {old['match_ms']} -> {result['match_ms']} ms")
+    before = {(r["events"], shape["shape"]): shape for r in baseline.get("hot_window", []) for shape in r["shapes"]}
+    for result in current.get("hot_window", []):
+        for shape in result["shapes"]:
+            old = before.get((result["events"], shape["shape"]))
+            if old is not None and shape["p99_us"] > old["p99_us"] * (1 + tolerance):
+                regressions.append(f"hot window {result['events']} {shape['shape']}: p99 {old['p99_us']} -> {shape['p99_us']} us")
+    old, result = baseline.get("startup"), current.get("startup")
+    if old and result:
+        for key in ("import_ms", "boot_ms"):
+            if result[key] > old[key] * (1 + tolerance):
+                regressions.append(f"startup: {key} {old[key]} -> {result[key]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest throughput, alert rule matching, recent window queries, API cold start and latency benchmarks.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated feed sizes, up to 1000000")
+    parser.add_argument("--modes", default="buffered,streaming")
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--rules", default="1000,50000", help="comma separated alert rule counts")
+    parser.add_argument("--rule-events", type=int, default=10000, help="events matched against each rule set")
+    parser.add_argument("--skip-rules", action="store_true")
+    parser.add_argument("--hot-window", default="20000,200000", help="comma separated event counts held in the recent window")
+    parser.add_argument("--hot-window-queries", type=int, default=2000, help="queries timed per shape")
+    parser.add_argument("--skip-hot-window", action="store_true")
+    parser.add_argument("--startup-runs", type=int, default=5, help="cold starts of the API to take the median of")
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--api-url", help="benchmark an already running API instead of starting one")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    started = datetime.now(timezone.utc)
+    results = {
+        "meta": {
+            "started_at": started.isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+    }
+    if not args.skip_ingest:
+        sizes = [int(size) for size in args.sizes.split(",")]
+        results["ingest"] = asyncio.run(run_ingest(sizes, args.modes.split(","), args.batch_size))
+    if not args.skip_rules:
+        results["rules"] = run_rules([int(count) for count in args.rules.split(",")], args.rule_events)
+    if not args.skip_hot_window:
+        results["hot_window"] = run_hot_window([int(count) for count in args.hot_window.split(",")], args.hot_window_queries)
+    if not args.skip_startup:
+        results["startup"] = asyncio.run(run_startup(args.api_port, args.startup_runs))
+    if not args.skip_api:
+        results["api"] = asyncio.run(run_api(args.api_url, args.api_port, args.requests, args.concurrency))
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{started:%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"results written to {output}")
+
+    if args.baseline:
+        regressions = compare(json.loads(Path(args.baseline).read_text()), results, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import statistics
+import subprocess
+import sys
+import time
+import aiohttp
+from benchmarks.api import start_api
+
+#Cold start of an API worker, what every new dyno or autoscaled worker pays
+#before it serves traffic:
+#    import_ms       importing alerts_api.main in a fresh interpreter
+#    boot_ms         spawning uvicorn until /health answers (imports, lifespan, init_db)
+#    first_query_ms  the first /latest after that (opens the first pooled connection)
+#Each figure is the median of several runs.
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import alerts_api.main; print(time.perf_counter() - start)"
+
+
+def measure_import(runs=5):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True).stdout
+        timings.append(float(output.split()[-1]) * 1000)
+    return statistics.median(timings)
+
+
+async def measure_boot(port):
+    start = time.perf_counter()
+    process, base_url = await start_api(port, poll=0.01)
+    boot = time.perf_counter() - start
+    try:
+        async with aiohttp.ClientSession() as session:
+            start = time.perf_counter()
+            async with session.get(f"{base_url}/latest") as response:
+                await response.read()
+                response.raise_for_status()
+            first_query = time.perf_counter() - start
+    finally:
+        process.terminate()
+        await process.wait()
+    return boot * 1000, first_query * 1000
+
+
+async def bench_startup(port, runs=5):
+    boots = [await measure_boot(port) for _ in range(runs)]
+    return {
+        "runs": runs,
+        "import_ms": round(measure_import(runs), 1),
+        "boot_ms": round(statistics.median(boot for boot, _ in boots), 1),
+        "first_query_ms": round(statistics.median(query for _, query in boots), 1),
+    }
+
+
+if __name__ == "__main__":
+    #import time alone needs no database
+    print(f"import alerts_api.main: {measure_import():.1f} ms")
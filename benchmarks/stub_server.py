@@ -0,0 +1,130 @@
+import json
+from abc import ABC, abstractmethod
+import random
+from datetime import datetime, timezone
+from pathlib import Path
+from aiohttp import web
+from benchmarks.synthetic import make_feature
+
+
+#aiohttp server lifecycle shared by the stubs; each subclass declares its routes
+class _StubServer(ABC):
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    @abstractmethod
+    def add_routes(self, router):
+        ...
+
+    async def start(self):
+        app = web.Application()
+        self.add_routes(app.router)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        #port 0 picks a free port; read back the one actually bound
+        self.port = self._runner.addresses[0][1]
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+
+#Local stand-in for the USGS feed CDN: serves the generated files under /feeds/,
+#gzip-encoded when a .gz sibling exists, with ETag/Last-Modified and 304s just
+#like the real thing (all handled by aiohttp's FileResponse).
+class StubFeedServer(_StubServer):
+    def __init__(self, directory, host="127.0.0.1", port=0):
+        super().__init__(host, port)
+        self.directory = Path(directory)
+
+    def add_routes(self, router):
+        router.add_get("/feeds/{name}", self._feed)
+
+    async def _feed(self, request):
+        path = (self.directory / request.match_info["name"]).resolve()
+        if path.parent != self.directory.resolve() or not path.is_file():
+            raise web.HTTPNotFound()
+        return web.FileResponse(path)
+
+    def url(self, name):
+        return f"{self.base_url}/feeds/{name}"
+
+
+#Local stand-in for the FDSN event service (/count and /query, GeoJSON only).
+#The synthetic catalog has one event every 3600 / events_per_hour seconds since
+#the epoch, so any time range has a known, reproducible set of events; queries
+#matching more than max_allowed are refused with 400 like the real service.
+#minmagnitude is accepted but not applied.
+class StubFdsnServer(_StubServer):
+    def __init__(self, events_per_hour=10, max_allowed=20000, host="127.0.0.1", port=0, id_prefix="stub"):
+        super().__init__(host, port)
+        self.interval_ms = 3_600_000 // events_per_hour
+        self.max_allowed = max_allowed
+        self.id_prefix = id_prefix
+        self.queries = []  # (method, starttime, endtime) of every request, for tests
+
+    def add_routes(self, router):
+        router.add_get("/count", self._count)
+        router.add_get("/query", self._query)
+
+    def _range(self, request):
+        def ms(name):
+            value = datetime.fromisoformat(request.query[name]).replace(tzinfo=timezone.utc)
+            return int(value.timestamp() * 1000)
+        start, end = ms("starttime"), ms("endtime")
+        self.queries.append((request.path.strip("/"), request.query["starttime"], request.query["endtime"]))
+        #both ends inclusive, as in FDSN
+        return range(-(-start // self.interval_ms), end // self.interval_ms + 1)
+
+    async def _count(self, request):
+        events = self._range(request)
+        return web.json_response({"count": len(events), "maxAllowed": self.max_allowed})
+
+    async def _query(self, request):
+        events = self._range(request)
+        if len(events) > self.max_allowed:
+            return web.Response(status=400, text=f"Error 400: {len(events)} matching events exceeds search limit of {self.max_allowed}")
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        await response.write(f'{{"type":"FeatureCollection","metadata":{{"count":{len(events)}}},"features":['.encode())
+        for position, index in enumerate(events):
+            feature = make_feature(index, random.Random(index), 0, self.id_prefix, time_ms=index * self.interval_ms)
+            await response.write(((", " if position else "") + json.dumps(feature)).encode())
+        await response.write(b"]}")
+        await response.write_eof()
+        return response
+
+
+#Local webhook receiver for alert rule deliveries: records every POSTed JSON body
+#per hook name and answers with `status` (set it to 500 to exercise failures).
+class StubWebhookServer(_StubServer):
+    def __init__(self, status=200, host="127.0.0.1", port=0):
+        super().__init__(host, port)
+        self.status = status
+        self.received = []  # (hook name, payload)
+
+    def add_routes(self, router):
+        router.add_post("/hooks/{name}", self._hook)
+
+    async def _hook(self, request):
+        self.received.append((request.match_info["name"], await request.json()))
+        return web.Response(status=self.status)
+
+    def url(self, name):
+        return f"{self.base_url}/hooks/{name}"
@@ -0,0 +1,101 @@
+import gzip
+import json
+import random
+import time
+
+#Synthetic USGS-shaped GeoJSON feeds for the benchmarks.
+#Features carry the full property set of the real summary feeds so parse and
+#transfer costs are realistic, and are written out in chunks so a 1M event feed
+#never has to exist as one Python object.
+
+#every synthetic id starts with this, so benchmark rows can be told apart and deleted
+BENCH_ID_PREFIX = "bench"
+
+NETWORKS = ("ak", "ci", "hv", "nc", "nn", "pr", "tx", "us", "uu", "uw")
+DIRECTIONS = ("N", "NNE", "NE", "E", "SE", "S", "SW", "W", "NW")
+MAG_TYPES = ("md", "ml", "mb", "mww")
+
+
+def make_feature(index, rng, now_ms, id_prefix=BENCH_ID_PREFIX, time_ms=None):
+    net = NETWORKS[index % len(NETWORKS)]
+    event_id = f"{id_prefix}{net}{index:08d}"
+    if time_ms is None:
+        time_ms = now_ms - rng.randrange(30 * 86_400_000)
+    #about 1% of events come without a magnitude, like the real feed
+    mag = None if rng.random() < 0.01 else round(max(-1.0, rng.gauss(1.6, 1.1)), 2)
+    place = f"{rng.randint(1, 150)} km {rng.choice(DIRECTIONS)} of Synthetic {index % 997}"
+    longitude, latitude, depth = round(rng.uniform(-180, 180), 4), round(rng.uniform(-80, 80), 4), round(rng.uniform(-3, 650), 2)
+    return {
+        "type": "Feature",
+        "properties": {
+            "mag": mag,
+            "place": place,
+            "time": time_ms,
+            "updated": time_ms + rng.randrange(3_600_000),
+            "tz": None,
+            "url": f"https://earthquake.usgs.gov/earthquakes/eventpage/{event_id}",
+            "detail": f"https://earthquake.usgs.gov/earthquakes/feed/v1.0/detail/{event_id}.geojson",
+            "felt": None,
+            "cdi": None,
+            "mmi": None,
+            "alert": None,
+            "status": "automatic",
+            "tsunami": 1 if rng.random() < 0.001 else 0,
+            "sig": int(max(0, (mag or 0) * 60)),
+            "net": net,
+            "code": event_id[len(id_prefix) + len(net):],
+            "ids": f",{event_id},",
+            "sources": f",{net},",
+            "types": ",origin,phase-data,",
+            "nst": rng.randint(3, 80),
+            "dmin": round(rng.uniform(0, 2), 4),
+            "rms": round(rng.uniform(0, 1.2), 2),
+            "gap": rng.randint(20, 300),
+            "magType": rng.choice(MAG_TYPES),
+            "type": "earthquake",
+            "title": f"M {mag} - {place}",
+        },
+        "geometry": {"type": "Point", "coordinates": [longitude, latitude, depth]},
+        "id": event_id,
+    }
+
+
+def iter_feed_chunks(count, seed=0, now_ms=None, features_per_chunk=1000):
+    """Yield the feed as UTF-8 chunks: metadata, features, then the trailing bbox."""
+    rng = random.Random(seed)
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    metadata = {
+        "generated": now_ms,
+        "url": f"synthetic://{count}",
+        "title": f"Synthetic Earthquakes ({count})",
+        "status": 200,
+        "api": "1.10.3",
+        "count": count,
+    }
+    yield f'{{"type":"FeatureCollection","metadata":{json.dumps(metadata)},"features":['.encode()
+    for start in range(0, count, features_per_chunk):
+        features = (json.dumps(make_feature(i, rng, now_ms)) for i in range(start, min(count, start + features_per_chunk)))
+        yield (("," if start else "") + ",".join(features)).encode()
+    yield b'],"bbox":[-180,-80,-3,180,80,650]}'
+
+
+def write_feed(path, count, seed=0, compress=True):
+    """Write a feed of count events to path (plus path.gz, which the stub server serves gzip-encoded)."""
+    size = 0
+    with open(path, "wb") as plain:
+        gz = gzip.open(f"{path}.gz", "wb", compresslevel=6) if compress else None
+        try:
+            for chunk in iter_feed_chunks(count, seed):
+                plain.write(chunk)
+                if gz is not None:
+                    gz.write(chunk)
+                size += len(chunk)
+        finally:
+            if gz is not None:
+                gz.close()
+    return size
+
+
+def make_feed(count, seed=0):
+    """The whole feed as a dict; for small counts only."""
+    return json.loads(b"".join(iter_feed_chunks(count, seed)))
@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlencode
+import aiohttp
+from .config import current_config
+from .fetcher import FeedFetcher, FetchError
+from .parser import aiter_batches
+from .pipeline import make_parse_executor, run_parse
+from .db import WriteError, init_db, configure_engine, announce_refresh
+from .deadletter import save_or_quarantine, quarantine, parse_rejects, EMPTY_COUNTS
+
+#Historical backfill from the FDSN event service, for gaps the rolling summary
+#feeds can't fill (a fresh deployment, an outage longer than all_day).
+#
+#The range is cut into windows that are fetched concurrently. Each window is
+#counted first; one holding more events than a single query may return is split
+#in half until it fits. Results are streamed straight into batched upserts or,
+#with a parse executor, parsed in worker processes so several windows use several
+#cores. Every finished window is appended to a checkpoint file so a rerun resumes.
+#
+#    python -m quake_ingest.backfill 2020-01-01 2024-01-01 --min-magnitude 2.5
+
+#USGS rejects queries that match more events than this (the count endpoint reports the live value)
+MAX_EVENTS_PER_QUERY = 20000
+#windows are never split below this; a denser one is fetched anyway
+MIN_WINDOW = timedelta(minutes=1)
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def query_url(base_url, method, start, end, min_magnitude=None):
+    """URL of an FDSN "count" or "query" request for [start, end] (naive UTC datetimes)."""
+    params = {"format": "geojson", "starttime": start.strftime(TIME_FORMAT), "endtime": end.strftime(TIME_FORMAT)}
+    if method == "query":
+        params["orderby"] = "time-asc"
+    if min_magnitude is not None:
+        params["minmagnitude"] = min_magnitude
+    return f"{base_url.rstrip('/')}/{method}?{urlencode(params)}"
+
+
+def remaining_windows(start, end, done, window):
+    """Cut [start, end) into windows of at most `window`, leaving out the (start, end) intervals in done."""
+    gaps = []
+    cursor = start
+    for done_start, done_end in sorted(done):
+        if done_end <= cursor:
+            continue
+        if done_start >= end:
+            break
+        if done_start > cursor:
+            gaps.append((cursor, done_start))
+        cursor = max(cursor, done_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    windows = []
+    for gap_start, gap_end in gaps:
+        while gap_start < gap_end:
+            windows.append((gap_start, min(gap_start + window, gap_end)))
+            gap_start += window
+    return windows
+
+
+#Append-only JSON lines file of finished windows. Lines are only written after a
+#window's rows are committed, so a crash at worst repeats a window (upserts are idempotent).
+class Checkpoint:
+    def __init__(self, path, min_magnitude=None):
+        self.path = Path(path)
+        self.min_magnitude = min_magnitude
+
+    def load(self):
+        if not self.path.exists():
+            return []
+        done = []
+        with open(self.path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                #a window loaded with a higher magnitude floor is not done for a lower one
+                if entry.get("min_magnitude") == self.min_magnitude:
+                    done.append((datetime.fromisoformat(entry["start"]), datetime.fromisoformat(entry["end"])))
+        return done
+
+    def record(self, start, end, counts):
+        entry = {"start": start.isoformat(), "end": end.isoformat(), "min_magnitude": self.min_magnitude, **counts}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+class Backfill:
+    def __init__(self, start, end, base_url=None, min_magnitude=None, window=None, concurrency=None,
+                 checkpoint=None, batch_size=None, fetcher=None, executor=None):
+        self.start = start
+        self.end = end
+        self.base_url = base_url or current_config["FDSN_URL"]
+        self.min_magnitude = min_magnitude
+        self.window = window or timedelta(days=current_config["BACKFILL_WINDOW_DAYS"])
+        self.concurrency = concurrency or current_config["BACKFILL_CONCURRENCY"]
+        self.checkpoint = Checkpoint(checkpoint, min_magnitude) if checkpoint else None
+        self.batch_size = batch_size or current_config["BATCH_SIZE"]
+        self.fetcher = fetcher
+        self.executor = executor  # from pipeline.make_parse_executor; None streams and parses on the loop
+        self.totals = {"windows": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+        self.failed = []
+
+    async def run(self):
+        done = self.checkpoint.load() if self.checkpoint else []
+        queue = asyncio.Queue()
+        for window in remaining_windows(self.start, self.end, done, self.window):
+            queue.put_nowait(window)
+        own_fetcher = self.fetcher is None
+        if own_fetcher:
+            self.fetcher = FeedFetcher()
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if own_fetcher:
+                await self.fetcher.close()
+                self.fetcher = None
+        if self.totals["inserted"] or self.totals["updated"]:
+            #rows were written without per-row notifications; let API caches know once
+            await announce_refresh()
+        return self.totals
+
+    async def _worker(self, queue):
+        while True:
+            start, end = await queue.get()
+            try:
+                for window in await self._process(start, end):
+                    queue.put_nowait(window)
+            except Exception as e:
+                #left out of the checkpoint, so the next run tries this window again
+                self.failed.append((start, end))
+                print(f"Backfill window {start} - {end} failed: {e}")
+            finally:
+                queue.task_done()
+
+    async def _process(self, start, end):
+        """Load one window; returns the halves to queue instead if it holds too many events."""
+        answer = await self.fetcher.fetch(query_url(self.base_url, "count", start, end, self.min_magnitude), conditional=False)
+        count, limit = answer["count"], answer.get("maxAllowed", MAX_EVENTS_PER_QUERY)
+        if count > limit and end - start > MIN_WINDOW:
+            middle = start + (end - start) / 2
+            return [(start, middle), (middle, end)]
+        counts = await self._load(start, end) if count else {"inserted": 0, "updated": 0, "unchanged": 0}
+        for key, value in counts.items():
+            self.totals[key] += value
+        self.totals["windows"] += 1
+        if self.checkpoint:
+            self.checkpoint.record(start, end, counts)
+        print(f"Backfilled {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M}: {count} events, {counts['inserted']} new")
+        return []
+
+    async def _load(self, start, end):
+        url = query_url(self.base_url, "query", start, end, self.min_magnitude)
+        for attempt in range(self.fetcher.retries + 1):
+            rejects = []
+            try:
+                #old events are not news: no per-row notifications to live stream clients
+                if self.executor is None:
+                    #each streamed batch on its own, so a row the database refuses is quarantined, not fatal
+                    counts = dict(EMPTY_COUNTS)
+                    async for batch in aiter_batches(self.fetcher.stream_features(url), self.batch_size, rejects):
+                        for key, value in (await save_or_quarantine(batch, url, announce=False)).items():
+                            counts[key] += value
+                else:
+                    #a window is at most one result cap of events: fetch it whole, parse it off the loop
+                    body = await self.fetcher.fetch(url, conditional=False, decode=False)
+                    _, batch, rejects = await run_parse(self.executor, body)
+                    counts = await save_or_quarantine(batch, url, announce=False)
+                await quarantine(parse_rejects(url, rejects))
+                return counts
+            except (FetchError, WriteError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                #upserts are idempotent, so re-reading the window from the start is safe
+                if attempt >= self.fetcher.retries or (isinstance(e, WriteError) and not e.transient):
+                    raise
+                await asyncio.sleep(random.uniform(0, self.fetcher.backoff * (2 ** attempt)))
+
+
+def parse_time(value):
+    """ISO date or datetime; timezone-aware values are converted to naive UTC."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill historical earthquakes from the FDSN event service.")
+    parser.add_argument("start", type=parse_time, help="UTC start, e.g. 2020-01-01")
+    parser.add_argument("end", type=parse_time, nargs="?", help="UTC end (default: now)")
+    parser.add_argument("--min-magnitude", type=float)
+    parser.add_argument("--window-days", type=float, help="initial window length")
+    parser.add_argument("--concurrency", type=int)
+    parser.add_argument("--checkpoint", default="backfill.checkpoint.jsonl", help="resume file ('' disables)")
+    parser.add_argument("--base-url", help="FDSN event service, e.g. a local stub server")
+    parser.add_argument("--parse-executor", choices=("stream", "thread", "process"), default="process",
+                        help="stream: parse while downloading on the event loop; thread/process: parse whole windows in a pool")
+    args = parser.parse_args(argv)
+
+    await configure_engine("ingest")
+    await init_db()
+    executor = None if args.parse_executor == "stream" else make_parse_executor(args.parse_executor, args.concurrency)
+    backfill = Backfill(
+        args.start, args.end or datetime.now(timezone.utc).replace(tzinfo=None),
+        base_url=args.base_url, min_magnitude=args.min_magnitude,
+        window=timedelta(days=args.window_days) if args.window_days else None,
+        concurrency=args.concurrency, checkpoint=args.checkpoint or None, executor=executor,
+    )
+    try:
+        totals = await backfill.run()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print(f"Backfill finished: {totals}")
+    if backfill.failed:
+        print(f"{len(backfill.failed)} windows failed; run the same command again to retry them")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -0,0 +1,126 @@
+from array import array
+from datetime import datetime
+
+#sentinel for a missing epoch-ms timestamp; missing floats are stored as NaN
+NO_TIME = -1 << 63
+NAN = float("nan")
+
+
+#Struct-of-arrays batch of parsed earthquakes for the parse -> save hop.
+#Numbers live in typed arrays (float64 for magnitude/depth/coordinates, int64
+#epoch-ms for times) instead of one dict per event, and the database layer
+#binds whole columns as Postgres arrays, so no per-event objects are built.
+class QuakeBatch:
+    __slots__ = ("ids", "places", "magnitude", "depth", "latitude", "longitude", "tsunami", "time_ms", "updated_ms")
+
+    def __init__(self):
+        self.ids = []
+        self.places = []
+        self.magnitude = array("d")
+        self.depth = array("d")
+        self.latitude = array("d")
+        self.longitude = array("d")
+        self.tsunami = array("b")
+        self.time_ms = array("q")
+        self.updated_ms = array("q")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, id, place, magnitude, depth, latitude, longitude, tsunami, time_ms, updated_ms):
+        #convert and check everything first: a bad value must raise before any column grows,
+        #or the columns would no longer line up
+        if not isinstance(id, str) or not id:
+            raise ValueError(f"invalid event id {id!r}")
+        magnitude = NAN if magnitude is None else float(magnitude)
+        depth = NAN if depth is None else float(depth)
+        latitude, longitude = float(latitude), float(longitude)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError(f"coordinates out of range: {latitude}, {longitude}")
+        time_ms = int(time_ms)
+        updated_ms = NO_TIME if updated_ms is None else int(updated_ms)
+        self.ids.append(id)
+        self.places.append(place)
+        self.magnitude.append(magnitude)
+        self.depth.append(depth)
+        self.latitude.append(latitude)
+        self.longitude.append(longitude)
+        self.tsunami.append(1 if tsunami else 0)
+        self.time_ms.append(time_ms)
+        self.updated_ms.append(updated_ms)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a batch from parse_feature-style dicts."""
+        batch = cls()
+        for row in rows:
+            updated = row.get("updated_at")
+            batch.append(
+                row["id"], row["place"], row["magnitude"], row["depth"], row["latitude"],
+                row["longitude"], row["tsunami"], _to_ms(row["occurred_at"]),
+                _to_ms(updated) if updated is not None else None,
+            )
+        return batch
+
+    def extend(self, other):
+        """Append all events of another batch (columns are concatenated, not copied per event)."""
+        for name in self.__slots__:
+            getattr(self, name).extend(getattr(other, name))
+        return self
+
+    def take(self, indices):
+        """Return a new batch holding only the events at indices, in that order."""
+        batch = QuakeBatch()
+        for name in self.__slots__:
+            column = getattr(self, name)
+            taken = [column[i] for i in indices]
+            setattr(batch, name, array(column.typecode, taken) if isinstance(column, array) else taken)
+        return batch
+
+    def dedupe(self):
+        """Keep only the last occurrence of each id (Postgres can't upsert one row twice per statement)."""
+        last = {event_id: i for i, event_id in enumerate(self.ids)}
+        if len(last) == len(self.ids):
+            return self
+        return self.take(sorted(last.values()))
+
+    def time_range(self):
+        """(earliest, latest) occurred_at as datetimes, or None for an empty batch."""
+        if not self.time_ms:
+            return None
+        return _from_ms(min(self.time_ms)), _from_ms(max(self.time_ms))
+
+    def columns(self, start=0, stop=None):
+        """Column lists for rows start:stop, ready to bind as Postgres array parameters."""
+        stop = len(self) if stop is None else stop
+        return {
+            "id": self.ids[start:stop],
+            "place": self.places[start:stop],
+            "magnitude": self.magnitude[start:stop].tolist(),
+            "depth": self.depth[start:stop].tolist(),
+            "latitude": self.latitude[start:stop].tolist(),
+            "longitude": self.longitude[start:stop].tolist(),
+            "tsunami": self.tsunami[start:stop].tolist(),
+            "occurred_at": [_from_ms(ms) for ms in self.time_ms[start:stop]],
+            "updated_at": [None if ms == NO_TIME else _from_ms(ms) for ms in self.updated_ms[start:stop]],
+        }
+
+    def rows(self):
+        """Yield the events as dicts, for consumers that still want one mapping per event."""
+        columns = self.columns()
+        names = list(columns)
+        for values in zip(*columns.values()):
+            row = dict(zip(names, values))
+            for name in ("magnitude", "depth"):
+                if row[name] != row[name]:  # NaN
+                    row[name] = None
+            row["tsunami"] = bool(row["tsunami"])
+            yield row
+
+
+#same local-time conversion the parser has always used for occurred_at
+def _from_ms(ms):
+    return datetime.fromtimestamp(ms / 1000)
+
+def _to_ms(value):
+    return round(value.timestamp() * 1000)
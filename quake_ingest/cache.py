@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from .db import get_revisions
+from .batch import NO_TIME
+from . import metrics
+
+
+#Remembers the last "updated" marker seen for each event id so unchanged
+#features can be dropped before parsing and before they ever reach the database.
+#Bounded: once max_size ids are held, the least recently seen id is evicted.
+class RevisionCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._revisions = OrderedDict()
+        self._generated = {}  # feed url -> metadata.generated of the last processed response
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._revisions)
+
+    def get(self, event_id):
+        return self._revisions.get(event_id)
+
+    def remember(self, event_id, updated):
+        self._revisions[event_id] = updated
+        self._revisions.move_to_end(event_id)
+        while len(self._revisions) > self.max_size:
+            self._revisions.popitem(last=False)
+
+    def is_new_generation(self, url, data):
+        """False when the feed at url still carries the metadata.generated we last processed."""
+        generated = data.get("metadata", {}).get("generated")
+        return generated is None or self._generated.get(url) != generated
+
+    def remember_generation(self, url, data):
+        generated = data.get("metadata", {}).get("generated")
+        #responses can finish out of order in the pipeline; never step back to an older generation
+        previous = self._generated.get(url)
+        if generated is not None and previous is not None and previous > generated:
+            return
+        self._generated[url] = generated
+
+    def claim_features(self, features):
+        """Return only the features that are new or carry a different "updated" marker.
+
+        The returned revisions are recorded straight away so a feed polled concurrently
+        doesn't write the same revision again; call release_features if the write fails.
+        """
+        changed = [feature for feature in features if self.claim(feature["id"], feature["properties"].get("updated"))]
+        self._count(len(features) - len(changed), len(changed))
+        return changed
+
+    def claim_batch(self, batch):
+        """claim_features for an already parsed QuakeBatch; returns the changed events as a new batch."""
+        changed = [i for i, (event_id, updated) in enumerate(zip(batch.ids, batch.updated_ms))
+                   if self.claim(event_id, None if updated == NO_TIME else updated)]
+        self._count(len(batch) - len(changed), len(changed))
+        return batch if len(changed) == len(batch) else batch.take(changed)
+
+    def claim(self, event_id, updated):
+        """Record this revision; False if it is the one already recorded (nothing to do)."""
+        if updated is not None and self._revisions.get(event_id) == updated:
+            self._revisions.move_to_end(event_id)
+            return False
+        self.remember(event_id, updated)
+        return True
+
+    def _count(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+        metrics.CACHE_LOOKUPS.inc(hits, cache="revision", result="hit")
+        metrics.CACHE_LOOKUPS.inc(misses, cache="revision", result="miss")
+
+    def release_features(self, features):
+        self.release_ids(feature["id"] for feature in features)
+
+    def release_ids(self, ids):
+        for event_id in ids:
+            self._revisions.pop(event_id, None)
+
+    async def warm(self):
+        """Seed the cache with the revisions of the most recent events already in the database."""
+        rows = await get_revisions(self.max_size)
+        #rows come newest first; insert oldest first so the newest are evicted last
+        for event_id, updated_at in reversed(rows):
+            if updated_at is not None:
+                self.remember(event_id, round(updated_at.timestamp() * 1000))
+        return len(self._revisions)
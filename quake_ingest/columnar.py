@@ -0,0 +1,20 @@
+#Arrow schema and record batches for earthquake rows (EARTHQUAKE_COLUMNS order), shared
+#by the API's /export encoders and the partition archiver. pyarrow is optional:
+#it is only imported when one of these is called.
+
+
+def arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.string()), ("place", pa.string()), ("magnitude", pa.float64()), ("depth", pa.float64()),
+        ("latitude", pa.float64()), ("longitude", pa.float64()), ("tsunami", pa.bool_()),
+        ("occurred_at", pa.timestamp("ms")), ("updated_at", pa.timestamp("ms")),
+    ])
+
+
+def record_batch(rows, schema):
+    import pyarrow as pa
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+    )
@@ -1,40 +1,119 @@
 import os
-from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy import Column, Float, String, Boolean, DateTime, Integer
+from sqlalchemy import Column, Float, String, Boolean, DateTime, Integer, Index, BigInteger, Text
+from sqlalchemy import exc as sa_exc
 import datetime 
-from sqlalchemy import select
-from sqlalchemy.dialects.postgresql import insert
+import json
+import math
+from sqlalchemy import select, delete, or_, literal_column, text, func, bindparam, SmallInteger, tuple_
+from sqlalchemy.dialects.postgresql import insert, ARRAY, JSONB
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .config import current_config
+from .batch import QuakeBatch
+from .geo import bbox_around, EARTH_RADIUS_KM
+from . import notify, metrics
+from .summary import install_summary, UNKNOWN_MAGNITUDE_BIN
+from .partitions import ensure_partitions, is_partitioned, migrate_unpartitioned, months_between, upcoming_months
+
+
+def database_url(cfg=current_config):
+    url = cfg["DATABASE_URL"]
+    if url and url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+        # Remove sslmode parameter - asyncpg handles SSL differently
+        url = url.split("?")[0]
+    return url
+
+DATABASE_URL = database_url()
+
+#which pool profile (config "DB_POOL") this process uses: "api" or "ingest"
+APP_ROLE = os.environ.get("APP_ROLE", "api")
+
+
+#the default async pool, timing how long each checkout waits for a free connection
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        with metrics.POOL_WAIT_SECONDS.time():
+            return super()._do_get()
+
+
+def build_engine(role=APP_ROLE, cfg=current_config):
+    """Create the async engine for a process role from the environment's config."""
+    pool = cfg["DB_POOL"][role]
+    return create_async_engine(
+        database_url(cfg),
+        #echo prints every SQL statement: handy while developing, pure overhead on the hot path
+        echo=cfg["SQL_ECHO"],
+        poolclass=TimedQueuePool,
+        pool_size=pool["pool_size"],
+        max_overflow=pool["max_overflow"],
+        pool_timeout=pool["pool_timeout"],
+        pool_recycle=pool["pool_recycle"],
+        pool_pre_ping=pool["pool_pre_ping"],
+        connect_args={
+            "prepared_statement_cache_size": cfg["DB_STATEMENT_CACHE_SIZE"],
+            "server_settings": {
+                "statement_timeout": str(cfg["DB_STATEMENT_TIMEOUT_MS"]),
+                "application_name": f"earthpulse-{role}",
+            },
+        },
+    )
+
+
+#the engine is built on first use (get_engine), not at import: importing this module
+#(every API worker, every CLI) loads no driver and opens no pool until it talks to Postgres
+_engine = None
+_engine_role = APP_ROLE
 
+#create base class. Our models will inherit from this base.
+Base = declarative_base() 
 
+#session factory, bound to the engine when get_engine builds it
+_session_factory = sessionmaker(class_=AsyncSession, expire_on_commit=False)
 
-load_dotenv()
-password=os.environ.get("DB_PASSWORD")
 
+def get_engine():
+    """This process's engine, built for its pool profile on first call."""
+    global _engine
+    if _engine is None:
+        _engine = build_engine(_engine_role)
+        _session_factory.configure(bind=_engine)
+    return _engine
 
 
-DATABASE_URL = current_config["DATABASE_URL"]
+def async_session():
+    get_engine()
+    return _session_factory()
 
-if DATABASE_URL and DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
-    # Remove sslmode parameter - asyncpg handles SSL differently
-    DATABASE_URL = DATABASE_URL.split("?")[0]
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-#create the async engine 
-#echo=true will print all SQL statements to console, useful for debugging 
-#Remember - May need to turn it off in production to decrease processing overhead
-engine = create_async_engine(DATABASE_URL, echo=True)
+async def configure_engine(role):
+    """Switch this process to another pool profile, e.g. configure_engine("ingest") in the ingester."""
+    global _engine, _engine_role
+    if role == _engine_role:
+        return get_engine()
+    previous = _engine
+    _engine, _engine_role = None, role
+    engine = get_engine()
+    if previous is not None:
+        await previous.dispose()
+    return engine
 
-#create base class. Our models will inherit from this base.
-Base = declarative_base() 
 
-#create session factory 
-async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+def pool_status():
+    """Connection pool statistics for the current engine."""
+    pool = get_engine().pool
+    return {
+        "role": _engine_role,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
 
 #create a class which inherits from Base. Each attribute of this class is a column. 
+#The table is partitioned by month on occurred_at (see partitions.py), which is why
+#occurred_at is part of the primary key.
 class Earthquake(Base):
     __tablename__ = "earthquakes"
     id = Column(String, primary_key=True)
@@ -44,54 +123,522 @@ class Earthquake(Base):
     latitude=Column(Float)
     longitude=Column(Float)
     tsunami=Column(Boolean)
-    occurred_at=Column(DateTime) 
-
-#converts python dicts to earthquake objects, handles dbsession ops
-async def save_earthquakes(earthquakes_imp):
-    earthquake_objects=[]
-    for earthquake in earthquakes_imp:
-        eq_object = Earthquake(
-            id=earthquake["id"],
-            place=earthquake["place"],
-            magnitude=earthquake["magnitude"],
-            depth=earthquake["depth"],
-            latitude=earthquake["latitude"],
-            longitude=earthquake["longitude"],
-            tsunami=earthquake["tsunami"],
-            occurred_at=earthquake["occurred_at"]  # Already a datetime object from your parser
-        )
-        earthquake_objects.append(eq_object) 
-    
+    occurred_at=Column(DateTime, primary_key=True)
+    updated_at=Column(DateTime) #feed revision marker, bumped by USGS on every revision
+    __table_args__ = (
+        #(occurred_at, id) is the listing order and the keyset pagination key
+        Index("ix_earthquakes_occurred_at_id", occurred_at, id),
+        Index("ix_earthquakes_magnitude", magnitude),
+        #GiST over point(lon, lat) lets bounding-box filters use "point <@ box" index scans
+        Index("ix_earthquakes_location", func.point(longitude, latitude), postgresql_using="gist"),
+        {"postgresql_partition_by": "RANGE (occurred_at)"},
+    )
+
+#single-row running totals maintained by triggers on earthquakes (see summary.py)
+class EarthquakeSummary(Base):
+    __tablename__ = "earthquake_summary"
+    id = Column(SmallInteger, primary_key=True, autoincrement=False)
+    total = Column(BigInteger, nullable=False, default=0)
+    magnitude_sum = Column(Float, nullable=False, default=0)
+    magnitude_count = Column(BigInteger, nullable=False, default=0)
+    last_ingested_at = Column(DateTime(timezone=True))
+
+#per hour and whole-magnitude bin counts and energy, maintained by the same triggers
+class EarthquakeRollup(Base):
+    __tablename__ = "earthquake_rollup_hourly"
+    bucket = Column(DateTime, primary_key=True)
+    magnitude_bin = Column(SmallInteger, primary_key=True, autoincrement=False)
+    count = Column(BigInteger, nullable=False)
+    energy_joules = Column(Float, nullable=False)
+
+#events the ingester could not parse or write, kept with the reason for inspection
+#instead of failing the feed or batch they came with (see deadletter.py)
+class DeadLetter(Base):
+    __tablename__ = "earthquake_dead_letters"
+    id = Column(BigInteger, primary_key=True)
+    event_id = Column(String, index=True)
+    stage = Column(String, nullable=False)  # "parse" or "write"
+    source = Column(String)  # feed or query URL
+    error = Column(Text, nullable=False)
+    payload = Column(JSONB)
+    received_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+#user alert rules, matched against every ingest write by the ingester (see rules.py).
+#A region is either a polygon ring of [lon, lat] points or latitude/longitude/radius_km;
+#unset criteria don't constrain.
+class AlertRule(Base):
+    __tablename__ = "alert_rules"
+    id = Column(BigInteger, primary_key=True)
+    name = Column(String, nullable=False)
+    webhook_url = Column(String, nullable=False)
+    polygon = Column(JSONB)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    radius_km = Column(Float)
+    min_magnitude = Column(Float)
+    min_depth = Column(Float)
+    max_depth = Column(Float)
+    tsunami = Column(Boolean)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+#one row recording which SCHEMA_VERSION init_db last set up; workers that find the
+#current version skip all DDL
+class SchemaVersion(Base):
+    __tablename__ = "earthpulse_schema"
+    id = Column(SmallInteger, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False)
+    applied_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+#bump whenever init_db's setup changes (tables, columns, indexes, triggers), so the next start applies it
+SCHEMA_VERSION = 1
+
+EARTHQUAKE_COLUMNS = ("id", "place", "magnitude", "depth", "latitude", "longitude", "tsunami", "occurred_at", "updated_at")
+
+#array type each column is bound as; tsunami travels as 0/1 and NaN marks a missing float
+_COLUMN_ARRAY_TYPES = {
+    "id": ARRAY(String), "place": ARRAY(String), "magnitude": ARRAY(Float), "depth": ARRAY(Float),
+    "latitude": ARRAY(Float), "longitude": ARRAY(Float), "tsunami": ARRAY(SmallInteger),
+    "occurred_at": ARRAY(DateTime), "updated_at": ARRAY(DateTime),
+}
+
+
+def build_upsert(skip_unchanged=True):
+    """Build INSERT ... SELECT FROM unnest(...) ON CONFLICT (id, occurred_at) DO UPDATE for a whole QuakeBatch slice.
+
+    Every column is bound as one array parameter, so the statement text is the same
+    for any number of rows (asyncpg prepares it once) and no per-row dicts are built.
+    """
+    table = Earthquake.__table__
+    source = func.unnest(*[bindparam(col, type_=_COLUMN_ARRAY_TYPES[col]) for col in EARTHQUAKE_COLUMNS])\
+        .table_valued(*EARTHQUAKE_COLUMNS).render_derived(with_types=False)
+    values = []
+    for col in EARTHQUAKE_COLUMNS:
+        if col in ("magnitude", "depth"):
+            values.append(func.nullif(source.c[col], literal_column("'NaN'::float8")))
+        elif col == "tsunami":
+            values.append(source.c[col] != 0)
+        else:
+            values.append(source.c[col])
+    stmt = insert(table).from_select(EARTHQUAKE_COLUMNS, select(*values))
+    updates = {col: stmt.excluded[col] for col in EARTHQUAKE_COLUMNS if col not in ("id", "occurred_at")}
+    where = None
+    if skip_unchanged:
+        # only rewrite a row when at least one column actually differs
+        where = or_(*[table.c[col].is_distinct_from(stmt.excluded[col]) for col in updates])
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.id, table.c.occurred_at], set_=updates, where=where)
+    # xmax is 0 for freshly inserted tuples and non-zero for updated ones.
+    # Rows skipped by the WHERE clause are not returned at all.
+    return stmt.returning(table.c.id, literal_column("xmax = 0").label("inserted"))
+
+
+_UPSERTS = {True: build_upsert(True), False: build_upsert(False)}
+
+
+def build_relocate():
+    """DELETE the stored rows of batch ids whose occurred_at changed.
+
+    The upsert only matches on (id, occurred_at), so without this a revised origin
+    time would leave the old row behind, possibly in another partition.
+    """
+    table = Earthquake.__table__
+    source = func.unnest(bindparam("id", type_=ARRAY(String)), bindparam("occurred_at", type_=ARRAY(DateTime)))\
+        .table_valued("id", "occurred_at").render_derived(with_types=False)
+    return delete(table).where(table.c.id == source.c.id, table.c.occurred_at != source.c.occurred_at)
+
+
+_RELOCATE = build_relocate()
+
+#months known to have a partition in this process, so writes only check the catalog for new ones
+_partition_months = set()
+
+
+async def ensure_batch_partitions(batch):
+    """Create partitions for every month a batch's events fall into (a backfill may reach years back)."""
+    span = batch.time_range()
+    if span is None:
+        return
+    months = set(months_between(*span)) - _partition_months
+    if months:
+        async with get_engine().begin() as conn:
+            await ensure_partitions(conn, months)
+        _partition_months.update(months)
+
+
+def forget_partitions(months):
+    """Drop months from the known-partition set, e.g. after retention detached them."""
+    _partition_months.difference_update(months)
+
+
+#upserts a QuakeBatch (or a list of parsed dicts) in batch_size slices
+#A failed save_earthquakes. transient is False when the database rejected the data
+#itself (the same rows would fail again) and True for everything that may pass on
+#a retry: lost connections, timeouts, pool exhaustion, failover.
+class WriteError(Exception):
+    def __init__(self, message, transient):
+        super().__init__(message)
+        self.transient = transient
+
+
+def _is_transient(error):
+    return not isinstance(error, (sa_exc.DataError, sa_exc.IntegrityError, sa_exc.ProgrammingError))
+
+
+#returns a dict of inserted/updated/unchanged counts; raises WriteError if nothing was committed
+#announce=False skips the per-row change notifications, for bulk loads of old events
+#that live stream clients shouldn't receive (see announce_refresh)
+async def save_earthquakes(earthquakes_imp, batch_size=None, skip_unchanged=True, announce=True):
+    batch_size = batch_size or current_config["BATCH_SIZE"]
+    batch = earthquakes_imp if isinstance(earthquakes_imp, QuakeBatch) else QuakeBatch.from_rows(earthquakes_imp)
+    # Postgres refuses to touch the same row twice in one INSERT ... ON CONFLICT
+    batch = batch.dedupe()
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    written_ids = []
+    inserted_ids = []
     try:
+        await ensure_batch_partitions(batch)
         async with async_session() as session:
-            # Use SQLAlchemy's built-in merge function to handle upserts
-            for eq_object in earthquake_objects:
-                await session.merge(eq_object)
+            for start in range(0, len(batch), batch_size):
+                columns = batch.columns(start, start + batch_size)
+                with metrics.UPSERT_SECONDS.time():
+                    await session.execute(_RELOCATE, {"id": columns["id"], "occurred_at": columns["occurred_at"]})
+                    result = await session.execute(_UPSERTS[skip_unchanged], columns)
+                    written = result.all()
+                inserted = sum(1 for row in written if row.inserted)
+                counts["inserted"] += inserted
+                counts["updated"] += len(written) - inserted
+                counts["unchanged"] += len(columns["id"]) - len(written)
+                written_ids.extend(row.id for row in written)
+                inserted_ids.extend(row.id for row in written if row.inserted)
+            #NOTIFY is transactional: listeners only hear about it once the commit lands
+            if announce:
+                for payload in notify.payloads(written_ids):
+                    await session.execute(select(func.pg_notify(notify.CHANNEL, payload)))
             await session.commit()
-            return True
+        for result, count in counts.items():
+            metrics.ROWS_WRITTEN.inc(count, result=result)
+        if written_ids and announce:
+            #in-process subscribers (the alert rule engine) also get the written rows themselves,
+            #and which of them are new rather than revisions
+            position = {event_id: i for i, event_id in enumerate(batch.ids)}
+            notify.publish({"ids": written_ids, "batch": batch.take([position[i] for i in written_ids]),
+                            "inserted": inserted_ids})
+        return counts
     except Exception as e:
-        print(f"Database error: {e}")
-        return False
+        transient = _is_transient(e)
+        metrics.WRITE_FAILURES.inc(kind="transient" if transient else "data")
+        raise WriteError(f"Database error: {e}", transient) from e
+
+
+#consumes a (possibly async) iterator of QuakeBatches, e.g. parser.iter_batches over a
+#streamed feed, so a large feed is written without ever being held in memory whole
+async def save_earthquake_stream(batches, announce=True):
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    async def save(batch):
+        counts = await save_earthquakes(batch, announce=announce)
+        for key in totals:
+            totals[key] += counts[key]
+
+    if hasattr(batches, "__aiter__"):
+        async for batch in batches:
+            await save(batch)
+    else:
+        for batch in batches:
+            await save(batch)
+    return totals
+
+async def save_dead_letters(entries):
+    """Insert dead-letter dicts (event_id, stage, source, error, payload)."""
+    async with async_session() as session:
+        await session.execute(insert(DeadLetter), entries)
+        await session.commit()
+
+async def announce_refresh():
+    """Notify listeners that data changed without naming rows: caches are dropped, nothing is streamed."""
+    payload = {"ids": []}
+    async with async_session() as session:
+        await session.execute(select(func.pg_notify(notify.CHANNEL, json.dumps(payload))))
+        await session.commit()
+    notify.publish(payload)
+
+async def schema_version(conn):
+    """SCHEMA_VERSION the database was last set up for, or None if init_db never completed there."""
+    if (await conn.execute(text(f"SELECT to_regclass('{SchemaVersion.__tablename__}')"))).scalar() is None:
+        return None
+    return (await conn.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1))).scalar()
+
 
 async def init_db():
-    """Create all tables in the database if they don't exist."""
-    async with engine.begin() as conn:
+    """Set up tables, indexes, triggers and partitions, unless the database is already at SCHEMA_VERSION.
+
+    A warm start costs one catalog lookup and one row read, instead of create_all
+    reflecting every table on every boot of every worker.
+    """
+    async with get_engine().connect() as conn:
+        current = await schema_version(conn)
+    #a newer deployment may already have moved the schema on: never set up an older one over it
+    if current is not None and current >= SCHEMA_VERSION:
+        return False
+    async with get_engine().begin() as conn:
+        #workers booting together: one sets up, the rest wait here and then find it done
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('earthpulse_schema'))"))
+        current = await schema_version(conn)
+        if current is not None and current >= SCHEMA_VERSION:
+            return False
+        if await is_partitioned(conn) is False:
+            #create_all never alters an existing table, so add columns introduced later by hand
+            await conn.execute(text("ALTER TABLE earthquakes ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP"))
+            await migrate_unpartitioned(conn, lambda c: c.run_sync(Earthquake.__table__.create), EARTHQUAKE_COLUMNS)
         await conn.run_sync(Base.metadata.create_all)
-
-
-async def get_earthquakes(limit=10, offset=0, min_magnitude=0):
-    try:
-        async with async_session() as session:
-            from sqlalchemy import select
-            query = select(Earthquake).where(Earthquake.magnitude >= min_magnitude)\
-                .order_by(Earthquake.occurred_at.desc())\
-                .offset(offset)\
-                .limit(limit)
-            result = await session.execute(query)
-            return result.scalars().all()
-    except Exception as e:
-        print(f"Database error: {e}")
-        return []
+        #same for indexes: create_all only builds them together with a new table
+        await conn.execute(text("DROP INDEX IF EXISTS ix_earthquakes_occurred_at"))  # superseded by (occurred_at, id)
+        await conn.run_sync(_create_missing_indexes)
+        await install_summary(conn)
+        #later months are added by the ingester's maintain_partitions and on demand by save_earthquakes
+        upcoming = upcoming_months(datetime.datetime.now(), current_config["PARTITION_PREMAKE_MONTHS"])
+        await ensure_partitions(conn, upcoming)
+        await conn.execute(insert(SchemaVersion).values(id=1, version=SCHEMA_VERSION).on_conflict_do_update(
+            index_elements=[SchemaVersion.id], set_={"version": SCHEMA_VERSION, "applied_at": func.now()},
+        ))
+    _partition_months.update(upcoming)
+    print(f"Database schema set up at version {SCHEMA_VERSION}")
+    return True
+
+
+#yields lists of up to chunk_size rows through a server-side cursor, oldest first,
+#so a full-catalog export never materializes the whole result in this process
+async def stream_earthquake_rows(chunk_size, min_magnitude=0, start=None, end=None, bbox=None, lat=None, lon=None, radius_km=None):
+    filters = earthquake_filters(min_magnitude, start, end, bbox, lat, lon, radius_km)
+    query = select(*LISTING_COLUMNS).where(*filters)\
+        .order_by(Earthquake.occurred_at, Earthquake.id)\
+        .execution_options(yield_per=chunk_size)
+    async with async_session() as session:
+        result = await session.stream(query)
+        async for rows in result.partitions(chunk_size):
+            yield rows
+
+
+AGGREGATE_BUCKETS = ("minute", "hour", "day")
+
+
+def _is_hour_aligned(value):
+    return value is None or (value.minute == 0 and value.second == 0 and value.microsecond == 0)
+
+
+#per-bucket rows of (bucket start, magnitude bin, count, energy in joules), computed in Postgres.
+#Hour and day buckets over the whole globe come from the hourly rollup table; minute
+#buckets, regional or magnitude-filtered queries, and ranges not on hour boundaries
+#fall back to grouping the raw events (still an index range scan on occurred_at).
+def build_aggregate_query(bucket, start=None, end=None, min_magnitude=None, bbox=None, lat=None, lon=None, radius_km=None):
+    if bucket not in AGGREGATE_BUCKETS:
+        raise ValueError(f"bucket must be one of {AGGREGATE_BUCKETS}")
+    unit = literal_column(f"'{bucket}'")  # whitelisted above; a bind parameter would break GROUP BY
+    regional = bbox is not None or radius_km is not None
+    exact_bins = min_magnitude is None or float(min_magnitude).is_integer()
+    if bucket != "minute" and not regional and exact_bins and _is_hour_aligned(start) and _is_hour_aligned(end):
+        bucket_col = func.date_trunc(unit, EarthquakeRollup.bucket)
+        query = select(bucket_col, EarthquakeRollup.magnitude_bin, func.sum(EarthquakeRollup.count), func.sum(EarthquakeRollup.energy_joules))\
+            .where(EarthquakeRollup.count != 0)
+        if start is not None:
+            query = query.where(EarthquakeRollup.bucket >= naive_local(start))
+        if end is not None:
+            query = query.where(EarthquakeRollup.bucket < naive_local(end))
+        if min_magnitude is not None:
+            query = query.where(EarthquakeRollup.magnitude_bin >= min_magnitude)
+    else:
+        bucket_col = func.date_trunc(unit, Earthquake.occurred_at)
+        magnitude_bin = func.coalesce(func.floor(Earthquake.magnitude).cast(SmallInteger), UNKNOWN_MAGNITUDE_BIN)
+        energy = func.coalesce(func.power(10.0, 1.5 * Earthquake.magnitude + 4.8), 0)
+        query = select(bucket_col, magnitude_bin, func.count(), func.sum(energy))\
+            .where(*earthquake_filters(min_magnitude, start, end, bbox, lat, lon, radius_km))
+    return query.group_by(literal_column("1"), literal_column("2")).order_by(literal_column("1"), literal_column("2"))
+
+
+async def get_aggregates(bucket, **filters):
+    query = build_aggregate_query(bucket, **filters)
+    async with async_session() as session:
+        result = await session.execute(query)
+        return result.all()
+
+
+#Viewport clustering for the map: events are snapped to a fixed grid of cell_degrees
+#squares anchored at (-180, -90), so the same cell keeps the same position as the
+#viewport pans. One row per non-empty cell: (x, y, count, mean latitude, mean longitude,
+#max magnitude, mean magnitude, id, place, depth) - the last three describe the
+#event itself when the cell holds just one.
+def build_cluster_query(cell_degrees, min_magnitude=None, start=None, end=None, bbox=None):
+    if not cell_degrees > 0:
+        raise ValueError("cell_degrees must be positive")
+    cell_x = func.floor((Earthquake.longitude + 180.0) / cell_degrees).cast(Integer)
+    cell_y = func.floor((Earthquake.latitude + 90.0) / cell_degrees).cast(Integer)
+    query = select(
+        cell_x, cell_y, func.count(), func.avg(Earthquake.latitude), func.avg(Earthquake.longitude),
+        func.max(Earthquake.magnitude), func.avg(Earthquake.magnitude),
+        func.min(Earthquake.id), func.min(Earthquake.place), func.min(Earthquake.depth),
+    ).where(*earthquake_filters(min_magnitude, start, end, bbox))
+    return query.group_by(literal_column("1"), literal_column("2"))
+
+
+async def get_clusters(cell_degrees, **filters):
+    query = build_cluster_query(cell_degrees, **filters)
+    async with async_session() as session:
+        result = await session.execute(query)
+        return result.all()
+
+
+async def get_earthquakes_by_ids(ids):
+    async with async_session() as session:
+        query = select(*LISTING_COLUMNS).where(Earthquake.id.in_(ids)).order_by(Earthquake.occurred_at, Earthquake.id)
+        result = await session.execute(query)
+        return result.all()
+
+
+#everything /stats needs in one round trip: totals from the summary row, maxima via index lookups
+async def get_database_stats():
+    average = EarthquakeSummary.magnitude_sum / func.nullif(EarthquakeSummary.magnitude_count, 0)
+    query = select(
+        EarthquakeSummary.total,
+        average.label("average_magnitude"),
+        select(func.max(Earthquake.magnitude)).scalar_subquery().label("max_magnitude"),
+        select(func.max(Earthquake.occurred_at)).scalar_subquery().label("latest_earthquake"),
+        EarthquakeSummary.last_ingested_at,
+    ).where(EarthquakeSummary.id == 1)
+    async with async_session() as session:
+        row = (await session.execute(query)).one_or_none()
+    if row is None:
+        return {"total": 0, "average_magnitude": None, "max_magnitude": None, "latest_earthquake": None, "last_ingested_at": None}
+    return row._asdict()
+
+
+async def get_last_ingested_at():
+    """When the ingester last committed rows (timezone-aware), or None on an empty database."""
+    async with async_session() as session:
+        return await session.scalar(select(EarthquakeSummary.last_ingested_at).where(EarthquakeSummary.id == 1))
+
+
+#LISTENs for ingest writes made by other processes (or for another channel, e.g.
+#notify.RULES_CHANNEL); returns the connection to close when done
+async def listen_for_changes(callback, channel=notify.CHANNEL):
+    conn = await get_engine().connect()
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.add_listener(
+        channel, lambda connection, pid, channel, payload: callback(json.loads(payload))
+    )
+    return conn
+
+
+ALERT_RULE_COLUMNS = tuple(AlertRule.__table__.c)
+
+
+async def get_alert_rules():
+    async with async_session() as session:
+        result = await session.execute(select(*ALERT_RULE_COLUMNS).order_by(AlertRule.id))
+        return result.all()
+
+
+async def get_alert_rule(rule_id):
+    async with async_session() as session:
+        result = await session.execute(select(*ALERT_RULE_COLUMNS).where(AlertRule.id == rule_id))
+        return result.one_or_none()
+
+
+#rule changes are announced on notify.RULES_CHANNEL so the ingester reloads its rule index
+async def create_alert_rule(values):
+    async with async_session() as session:
+        result = await session.execute(insert(AlertRule).values(**values).returning(*ALERT_RULE_COLUMNS))
+        row = result.one()
+        await session.execute(select(func.pg_notify(notify.RULES_CHANNEL, json.dumps({"created": row.id}))))
+        await session.commit()
+        return row
+
+
+async def delete_alert_rule(rule_id):
+    """Returns False if there was no such rule."""
+    async with async_session() as session:
+        result = await session.execute(delete(AlertRule).where(AlertRule.id == rule_id).returning(AlertRule.id))
+        if result.first() is None:
+            return False
+        await session.execute(select(func.pg_notify(notify.RULES_CHANNEL, json.dumps({"deleted": rule_id}))))
+        await session.commit()
+        return True
+
+
+def _create_missing_indexes(sync_conn):
+    for index in Earthquake.__table__.indexes:
+        index.create(sync_conn, checkfirst=True)
+
+
+async def get_revisions(limit):
+    """Return (id, updated_at) pairs for the most recent earthquakes, newest first."""
+    async with async_session() as session:
+        query = select(Earthquake.id, Earthquake.updated_at)\
+            .order_by(Earthquake.occurred_at.desc())\
+            .limit(limit)
+        result = await session.execute(query)
+        return result.all()
+
+
+def naive_local(value):
+    #occurred_at is stored as naive local time (see parser), so compare like with like
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def _in_box(west, south, east, north):
+    location = func.point(Earthquake.longitude, Earthquake.latitude)
+    if west <= east:
+        return location.op("<@")(func.box(func.point(west, south), func.point(east, north)))
+    #the box wraps across the antimeridian: split it into two
+    return or_(_in_box(west, south, 180.0, north), _in_box(-180.0, south, east, north))
+
+
+def _distance_km(lat, lon):
+    dlat = func.radians(Earthquake.latitude - lat, type_=Float) / 2.0
+    dlon = func.radians(Earthquake.longitude - lon, type_=Float) / 2.0
+    a = func.power(func.sin(dlat, type_=Float), 2) \
+        + math.cos(math.radians(lat)) * func.cos(func.radians(Earthquake.latitude, type_=Float), type_=Float) \
+        * func.power(func.sin(dlon, type_=Float), 2)
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(a, type_=Float)), type_=Float)
+
+
+def earthquake_filters(min_magnitude=0, start=None, end=None, bbox=None, lat=None, lon=None, radius_km=None):
+    """WHERE conditions shared by every earthquake listing query."""
+    conditions = []
+    if min_magnitude is not None:
+        conditions.append(Earthquake.magnitude >= min_magnitude)
+    if start is not None:
+        conditions.append(Earthquake.occurred_at >= naive_local(start))
+    if end is not None:
+        conditions.append(Earthquake.occurred_at < naive_local(end))
+    if bbox is not None:
+        conditions.append(_in_box(*bbox))
+    if radius_km is not None:
+        #the bounding box is served by the GiST index, the exact distance then trims its corners
+        conditions.append(_in_box(*bbox_around(lat, lon, radius_km)))
+        conditions.append(_distance_km(lat, lon) <= radius_km)
+    return conditions
+
+
+#listing queries select plain columns rather than ORM entities: the rows come back as
+#lightweight named tuples with no identity-map bookkeeping or attribute instrumentation
+LISTING_COLUMNS = tuple(Earthquake.__table__.c[col] for col in EARTHQUAKE_COLUMNS)
+
+
+#database errors propagate so callers (and the API response cache) never mistake an outage for an empty page
+#after is an (occurred_at, id) pair from the last row of the previous page: seeking past
+#it costs the same on every page, unlike offset which walks all the skipped rows
+async def get_earthquakes(limit=10, offset=0, min_magnitude=0, start=None, end=None, bbox=None, lat=None, lon=None, radius_km=None, after=None):
+    async with async_session() as session:
+        filters = earthquake_filters(min_magnitude, start, end, bbox, lat, lon, radius_km)
+        if after is not None:
+            filters.append(tuple_(Earthquake.occurred_at, Earthquake.id) < tuple_(*after))
+        query = select(*LISTING_COLUMNS).where(*filters)\
+            .order_by(Earthquake.occurred_at.desc(), Earthquake.id.desc())\
+            .offset(offset)\
+            .limit(limit)
+        result = await session.execute(query)
+        return result.all()
 
 
 
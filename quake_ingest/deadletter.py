@@ -0,0 +1,66 @@
+import json
+from datetime import datetime, timezone
+from .config import current_config
+from .db import save_dead_letters, save_earthquakes, WriteError
+from . import metrics
+
+#Quarantine for events that can't be ingested. A malformed feature or a row the
+#database refuses is recorded here with the reason, and the rest of its feed or
+#batch goes through as usual. Entries go to the earthquake_dead_letters table,
+#or to the DEAD_LETTER_FILE (JSON lines) while the database itself is unavailable.
+
+EMPTY_COUNTS = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+
+def dead_letter(stage, source, error, payload, event_id=None):
+    #round-trip through JSON so datetimes and other stray types can't break the insert
+    return {
+        "event_id": event_id,
+        "stage": stage,
+        "source": source,
+        "error": str(error),
+        "payload": json.loads(json.dumps(payload, default=str)),
+    }
+
+
+def parse_rejects(source, rejects):
+    """Dead letters for parse_batch's (feature, reason) rejects."""
+    return [
+        dead_letter("parse", source, reason, feature, feature.get("id") if isinstance(feature, dict) else None)
+        for feature, reason in rejects
+    ]
+
+
+async def quarantine(entries):
+    if not entries:
+        return
+    for entry in entries:
+        metrics.DEAD_LETTERS.inc(stage=entry["stage"])
+    try:
+        await save_dead_letters(entries)
+    except Exception as e:
+        print(f"Could not store {len(entries)} dead letters in the database ({e}), appending to {current_config['DEAD_LETTER_FILE']}")
+        received_at = datetime.now(timezone.utc).isoformat()
+        with open(current_config["DEAD_LETTER_FILE"], "a") as f:
+            for entry in entries:
+                f.write(json.dumps({**entry, "received_at": received_at}) + "\n")
+
+
+async def save_or_quarantine(batch, source, announce=True):
+    """save_earthquakes, isolating bad rows: a batch the database rejects for its data is
+    split in halves until the offending events are found; those are quarantined and
+    everything else is written. Transient errors are raised for the caller to retry."""
+    try:
+        return await save_earthquakes(batch, announce=announce)
+    except WriteError as e:
+        if e.transient:
+            raise
+        if len(batch) == 1:
+            await quarantine([dead_letter("write", source, e.__cause__ or e, next(batch.rows()), batch.ids[0])])
+            return dict(EMPTY_COUNTS)
+    middle = len(batch) // 2
+    totals = dict(EMPTY_COUNTS)
+    for half in (batch.take(range(middle)), batch.take(range(middle, len(batch)))):
+        for key, value in (await save_or_quarantine(half, source, announce)).items():
+            totals[key] += value
+    return totals
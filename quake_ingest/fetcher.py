@@ -1,20 +1,113 @@
 import asyncio
+import json
+import random
 import aiohttp
 from datetime import datetime
 from .config import current_config
+from .streaming import aiter_features
+from . import metrics
 
 
 
 
 USGS_FEED_URL = current_config["USGS_FEED_URL"]
 
-async def fetch_earthquake_data():
-    async with aiohttp.ClientSession() as session:
-        async with session.get(USGS_FEED_URL) as response:
+#statuses worth another attempt: USGS/CDN hiccups and rate limiting
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    pass
+
+
+#Long-lived fetcher: one pooled aiohttp session reused across polls, conditional
+#requests with the ETag/Last-Modified validators of the previous response, and
+#retry with jittered exponential backoff on transient failures.
+class FeedFetcher:
+    def __init__(self, timeout=None, retries=None, backoff=None):
+        self.timeout = timeout or current_config["FETCH_TIMEOUT"]
+        self.retries = current_config["FETCH_RETRIES"] if retries is None else retries
+        self.backoff = current_config["FETCH_BACKOFF"] if backoff is None else backoff
+        self._session = None
+        self._validators = {}  # url -> {"If-None-Match": ..., "If-Modified-Since": ...}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=min(10, self.timeout)),
+                connector=aiohttp.TCPConnector(limit=10, ttl_dns_cache=300),
+                headers={"Accept-Encoding": "gzip, deflate"},  # aiohttp decompresses transparently
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _backoff_delay(self, attempt):
+        #full jitter: anywhere between 0 and backoff * 2^attempt
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    async def fetch(self, url=USGS_FEED_URL, conditional=True, decode=True):
+        """Return the decoded feed (the raw body if decode=False), or None if the server answered 304 Not Modified."""
+        feed = metrics.feed_name(url)
+        with metrics.FETCH_SECONDS.time(feed=feed):
+            return await self._fetch(url, feed, self._validators.get(url, {}) if conditional else {}, decode)
+
+    async def _fetch(self, url, feed, headers, decode):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._get_session().get(url, headers=headers) as response:
+                    metrics.FETCH_RESPONSES.inc(feed=feed, status=response.status)
+                    if response.status == 304:
+                        return None
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        await asyncio.sleep(self._backoff_delay(attempt))
+                        continue
+                    if response.status != 200:
+                        raise FetchError(f"API request failed with status {response.status}")
+                    body = await response.read()
+                    metrics.FETCH_BYTES.inc(len(body), feed=feed)
+                    data = json.loads(body) if decode else body
+                    self._remember_validators(url, response)
+                    return data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.retries:
+                    raise FetchError(f"API request failed: {e!r}") from e
+                await asyncio.sleep(self._backoff_delay(attempt))
+
+    async def stream_features(self, url, chunk_size=1 << 16):
+        """Yield the features of url one at a time while the body is still downloading."""
+        async with self._get_session().get(url, timeout=aiohttp.ClientTimeout(total=None, sock_read=self.timeout)) as response:
             if response.status != 200:
-                raise Exception(f"API request failed with status {response.status}")
-            data = await response.json()
-            return data
+                raise FetchError(f"API request failed with status {response.status}")
+            async for feature in aiter_features(response.content.iter_chunked(chunk_size)):
+                yield feature
+
+    def invalidate(self, url):
+        """Drop the cached validators so the next fetch of url downloads the full body again."""
+        self._validators.pop(url, None)
+
+    def _remember_validators(self, url, response):
+        validators = {}
+        if response.headers.get("ETag"):
+            validators["If-None-Match"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = response.headers["Last-Modified"]
+        self._validators[url] = validators
+
+
+#one-shot, unconditional fetch; long running callers should keep a FeedFetcher instead
+async def fetch_earthquake_data(url=USGS_FEED_URL):
+    async with FeedFetcher() as fetcher:
+        return await fetcher.fetch(url, conditional=False)
 
 if __name__ == "__main__":
     async def main():
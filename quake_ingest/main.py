@@ -1,21 +1,85 @@
-from .fetcher import fetch_earthquake_data 
-from .parser import parse_data 
-from .db import save_earthquakes, init_db
+from .fetcher import FeedFetcher
+from .db import init_db, configure_engine, get_last_ingested_at
+from .cache import RevisionCache
+from .pipeline import IngestPipeline, make_parse_executor
+from .retention import maintain_partitions
+from .rules import RuleEngine, make_notifier
+from . import notify
 from .config import current_config
-import asyncio 
+from . import metrics
+from aiohttp import web
+import asyncio
+import time
+
+
+async def serve_metrics(port):
+    """The ingester's equivalent of the API's /metrics, on its own small aiohttp server."""
+    async def handle(request):
+        return web.Response(body=metrics.render().encode(), headers={"Content-Type": metrics.CONTENT_TYPE})
+    app=web.Application()
+    app.router.add_get("/metrics", handle)
+    runner=web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, port=port).start()
+    return runner
+
+
+#restart delays after a crash: doubling from RESTART_BACKOFF up to RESTART_BACKOFF_MAX seconds,
+#back to the start once an ingester has stayed up for HEALTHY_RUN seconds
+RESTART_BACKOFF = 1
+RESTART_BACKOFF_MAX = 300
+HEALTHY_RUN = 600
+
+
+async def run_ingester(fetcher, executor):
+    await configure_engine("ingest") #the ingester's own, smaller pool profile
+    await init_db() #create database before entering the loop
+    revisions = RevisionCache(current_config["REVISION_CACHE_SIZE"])
+    await revisions.warm() #so a restart doesn't rewrite everything still in the feed
+    last = await get_last_ingested_at() #a gap since then is caught up from a longer feed
+    rules = RuleEngine(make_notifier())
+    await rules.load() #every committed write is matched against the users' alert rules
+    notify.subscribe(rules.on_change)
+    pipeline = IngestPipeline(fetcher, revisions, executor=executor, since=last.timestamp() if last else None)
+    #fetch, parse and write run concurrently, joined by bounded queues; partition upkeep and rule reloads run alongside
+    background = [asyncio.create_task(maintain_partitions()), asyncio.create_task(rules.run())]
+    try:
+        await pipeline.run()
+    finally:
+        notify.unsubscribe(rules.on_change)
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await rules.close()
 
 
 async def ingest_data_loop():
+    fetcher = FeedFetcher() #keeps one pooled connection to USGS across polls
+    executor = make_parse_executor() #parsing happens off the event loop
+    metrics_runner = None
+    delay = RESTART_BACKOFF
     try:
-        await init_db() #create database before entering the loop
+        if current_config["INGEST_METRICS_PORT"]:
+            metrics_runner = await serve_metrics(current_config["INGEST_METRICS_PORT"])
+        #supervise: a crash (database down at startup, a bug in one stage) restarts the ingester instead of ending it
         while True:
-            data=await fetch_earthquake_data()
-            parsed_data=parse_data(data)
-            await save_earthquakes(parsed_data)
-            await asyncio.sleep(current_config["POLL_INTERVAL"])
-    except Exception as e:
-        print(f"error: {e}")
-        return []
-    
+            started = time.monotonic()
+            try:
+                await run_ingester(fetcher, executor)
+            except Exception as e:
+                print(f"error: {e}")
+            if time.monotonic() - started >= HEALTHY_RUN:
+                delay = RESTART_BACKOFF
+            metrics.INGEST_RESTARTS.inc()
+            print(f"restarting ingester in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESTART_BACKOFF_MAX)
+    finally:
+        await fetcher.close()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
 if __name__ == "__main__":
-    asyncio.run(ingest_data_loop())
\ No newline at end of file
+    asyncio.run(ingest_data_loop())
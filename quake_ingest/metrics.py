@@ -0,0 +1,165 @@
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+#Minimal Prometheus-style metrics shared by the ingester and the API.
+#Every metric registers itself when it is created; render() produces the text
+#exposition format served on the API's /metrics and on the ingester's metrics port.
+#Everything runs on one event loop, so plain dicts need no locking.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 21600, 86400)
+
+_registry = []
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    return "+Inf" if value == math.inf else repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values tuple -> value
+        _registry.append(self)
+
+    def _key(self, labels):
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, self.labelnames, key, value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labelnames, key, value in self.samples():
+            lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels))
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # per-bucket counts, sum, count
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        bucket_labels = self.labelnames + ("le",)
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", bucket_labels, key + (_format_value(float(bound)),), cumulative
+            yield f"{self.name}_sum", self.labelnames, key, total
+            yield f"{self.name}_count", self.labelnames, key, count
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def feed_name(url):
+    """Short label for a feed URL, e.g. all_hour for .../summary/all_hour.geojson."""
+    return url.rstrip("/").rsplit("/", 1)[-1].split("?", 1)[0].removesuffix(".geojson")
+
+
+#ingest
+FETCH_SECONDS = Histogram("earthpulse_fetch_seconds", "Feed request latency including retries", ["feed"])
+FETCH_BYTES = Counter("earthpulse_fetch_bytes_total", "Decoded feed body bytes downloaded", ["feed"])
+FETCH_RESPONSES = Counter("earthpulse_fetch_responses_total", "Feed responses by HTTP status", ["feed", "status"])
+PARSE_SECONDS = Histogram("earthpulse_parse_seconds", "Time to parse the changed features of one feed response")
+UPSERT_SECONDS = Histogram("earthpulse_upsert_seconds", "Time per INSERT ... ON CONFLICT batch statement")
+ROWS_WRITTEN = Counter("earthpulse_rows_written_total", "Upserted rows by outcome", ["result"])
+CYCLE_ROWS = Histogram("earthpulse_cycle_rows", "Changed events written per ingest cycle", ["feed"],
+                       buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000))
+INGEST_LAG = Histogram("earthpulse_ingest_lag_seconds", "Commit time minus the event's time or updated timestamp",
+                       ["since"], buckets=LAG_BUCKETS)
+STAGE_SECONDS = Histogram("earthpulse_stage_seconds", "Time per item in each ingest pipeline stage", ["stage"])
+STAGE_EVENTS = Counter("earthpulse_stage_events_total", "Events handled per ingest pipeline stage", ["stage"])
+QUEUE_DEPTH = Gauge("earthpulse_pipeline_queue_depth", "Items waiting between ingest pipeline stages", ["queue"])
+WRITE_FAILURES = Counter("earthpulse_write_failures_total", "Failed upserts by kind (transient or data)", ["kind"])
+DEAD_LETTERS = Counter("earthpulse_dead_letters_total", "Events quarantined instead of ingested", ["stage"])
+INGEST_RESTARTS = Counter("earthpulse_ingest_restarts_total", "Times the ingester restarted after a crash")
+RULE_MATCH_SECONDS = Histogram("earthpulse_rule_match_seconds", "Time to match one written batch against all alert rules")
+ALERT_DELIVERIES = Counter("earthpulse_alert_deliveries_total", "Alert notifications by outcome (ok or error)", ["result"])
+ALERT_DELIVERY_SECONDS = Histogram("earthpulse_alert_delivery_seconds", "Time per alert notification, e.g. one webhook POST")
+LAST_INGEST = Gauge("earthpulse_last_ingest_timestamp_seconds", "Unix time of the last successful cycle", ["feed"])
+
+#shared
+POOL_WAIT_SECONDS = Histogram("earthpulse_db_pool_wait_seconds", "Time spent waiting to check out a pooled connection")
+CACHE_LOOKUPS = Counter("earthpulse_cache_lookups_total", "Cache lookups by cache and result (hit ratio = hit / all)",
+                        ["cache", "result"])
+
+#API
+HTTP_SECONDS = Histogram("earthpulse_http_request_seconds", "API request latency by route template", ["route", "method", "status"])
+HOT_WINDOW_QUERIES = Counter("earthpulse_hot_window_queries_total",
+                             "Listing queries answered from the in-memory recent window (memory) or sent to Postgres (database)",
+                             ["result"])
+HOT_WINDOW_EVENTS = Gauge("earthpulse_hot_window_events", "Events held in the in-memory recent window")
@@ -0,0 +1,41 @@
+import json
+
+#Change notifications from the ingest path. save_earthquakes sends the ids it wrote
+#on this Postgres NOTIFY channel (for API processes) and to in-process subscribers
+#(for an API running in the same process as the ingester).
+CHANNEL = "earthquakes_changed"
+#alert rules created or deleted through the API; the ingester reloads its rule index
+RULES_CHANNEL = "alert_rules_changed"
+
+#NOTIFY payloads must stay under 8000 bytes; USGS ids are ~10-15 characters
+IDS_PER_NOTIFY = 250
+
+_subscribers = []
+
+
+def subscribe(callback):
+    """callback(payload) is called with {"ids": [...]} after every committed write.
+
+    Writes made in this process also pass the written rows as payload["batch"] (a QuakeBatch)
+    and the ids among them that were inserted rather than updated as payload["inserted"].
+    """
+    _subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+
+def publish(payload):
+    for callback in list(_subscribers):
+        try:
+            callback(payload)
+        except Exception as e:
+            print(f"change subscriber failed: {e}")
+
+
+def payloads(ids):
+    """Split ids into NOTIFY-sized JSON payloads."""
+    for start in range(0, len(ids), IDS_PER_NOTIFY):
+        yield json.dumps({"ids": ids[start:start + IDS_PER_NOTIFY]})
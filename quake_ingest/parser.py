@@ -1,24 +1,89 @@
 import asyncio
+import json
 from datetime import datetime
 from .fetcher import fetch_earthquake_data
+from .batch import QuakeBatch
 
 def parse_data(data):
-    earthquakes_imp=[]
-    features = data.get("features", [])
+    return parse_features(data.get("features", []))
+
+def parse_features(features):
+    return [parse_feature(feature) for feature in features]
+
+#errors a malformed feature raises in parse_into (missing keys, nulls, wrong types, bad values)
+MALFORMED = (KeyError, TypeError, ValueError, IndexError, AttributeError)
+
+#fills a columnar QuakeBatch straight from the features, without a dict per event.
+#With a rejects list, malformed features are appended to it as (feature, reason)
+#instead of failing the whole feed.
+def parse_batch(features, rejects=None):
+    batch=QuakeBatch()
+    for feature in features:
+        _parse_or_reject(batch, feature, rejects)
+    return batch
+
+#parse stage of the ingest pipeline, run in a thread or worker process:
+#raw response body -> (feed metadata, QuakeBatch of its features, rejected features)
+def decode_feed(body):
+    data=json.loads(body)
+    rejects=[]
+    return data.get("metadata", {}), parse_batch(data.get("features", []), rejects), rejects
+
+def parse_into(batch, feature):
+    properties=feature["properties"]
+    longitude, latitude, depth=feature["geometry"]["coordinates"][:3]
+    updated=properties.get("updated")
+    batch.append(
+        feature["id"], properties["place"], properties["mag"], depth, latitude, longitude,
+        properties["tsunami"], int(properties["time"]), int(updated) if updated is not None else None,
+    )
+
+def _parse_or_reject(batch, feature, rejects):
+    if rejects is None:
+        parse_into(batch, feature)
+        return
+    try:
+        parse_into(batch, feature)
+    except MALFORMED as e:
+        rejects.append((feature, f"{type(e).__name__}: {e}"))
+
+#lazy version for streamed feeds: groups features into batches of batch_size as they arrive
+def iter_batches(features, batch_size, rejects=None):
+    batch=QuakeBatch()
     for feature in features:
-        container={}
-        container["id"]=feature["id"]
-        container["place"]=feature["properties"]["place"]
-        container["magnitude"]=feature["properties"]["mag"]
-        container["depth"]=feature["geometry"]["coordinates"][2]
-        container["latitude"]=feature["geometry"]["coordinates"][1]
-        container["longitude"]=feature["geometry"]["coordinates"][0]
-        container["tsunami"]=feature["properties"]["tsunami"]
-        timestamp=int(feature["properties"]["time"])
-        date_time=datetime.fromtimestamp(timestamp/1000)
-        container["occurred_at"]=date_time
-        earthquakes_imp.append(container)
-    return earthquakes_imp
+        _parse_or_reject(batch, feature, rejects)
+        if len(batch)>=batch_size:
+            yield batch
+            batch=QuakeBatch()
+    if len(batch):
+        yield batch
+
+async def aiter_batches(features, batch_size, rejects=None):
+    batch=QuakeBatch()
+    async for feature in features:
+        _parse_or_reject(batch, feature, rejects)
+        if len(batch)>=batch_size:
+            yield batch
+            batch=QuakeBatch()
+    if len(batch):
+        yield batch
+
+def parse_feature(feature):
+    container={}
+    container["id"]=feature["id"]
+    container["place"]=feature["properties"]["place"]
+    container["magnitude"]=feature["properties"]["mag"]
+    container["depth"]=feature["geometry"]["coordinates"][2]
+    container["latitude"]=feature["geometry"]["coordinates"][1]
+    container["longitude"]=feature["geometry"]["coordinates"][0]
+    container["tsunami"]=feature["properties"]["tsunami"]
+    timestamp=int(feature["properties"]["time"])
+    date_time=datetime.fromtimestamp(timestamp/1000)
+    container["occurred_at"]=date_time
+    #USGS bumps "updated" whenever an event is revised
+    updated=feature["properties"].get("updated")
+    container["updated_at"]=datetime.fromtimestamp(int(updated)/1000) if updated is not None else None
+    return container
 
 if __name__=="__main__":
     async def test_parser():
@@ -0,0 +1,124 @@
+import datetime
+from sqlalchemy import text
+
+#earthquakes is range-partitioned by month on occurred_at: earthquakes_p2024_01 holds
+#[2024-01-01, 2024-02-01). Queries with a time range only scan the partitions it
+#overlaps, vacuum works one month at a time, and old months leave the table by
+#detaching their partition (retention.py) instead of a huge DELETE.
+#
+#Partitions are created ahead of time for the coming months, and on demand by
+#save_earthquakes for any month a batch reaches into (backfills of old data).
+#Postgres needs the partition key in every unique constraint, so the primary key
+#is (id, occurred_at); save_earthquakes removes a revised event's old row when USGS
+#moves its origin time.
+
+PARENT = "earthquakes"
+PREFIX = "earthquakes_p"
+
+
+def month_start(value):
+    return datetime.datetime(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first, last):
+    """Month starts from first's month through last's month, inclusive."""
+    month, last = month_start(first), month_start(last)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def upcoming_months(now, ahead):
+    """The current month and the `ahead` months after it."""
+    this_month = month_start(now)
+    return months_between(this_month, add_months(this_month, ahead))
+
+
+def partition_name(month):
+    return f"{PREFIX}{month:%Y_%m}"
+
+
+def partition_month(name):
+    """Inverse of partition_name; None for tables that aren't monthly partitions."""
+    if not name.startswith(PREFIX):
+        return None
+    try:
+        return datetime.datetime.strptime(name[len(PREFIX):], "%Y_%m")
+    except ValueError:
+        return None
+
+
+def partition_ddl(month):
+    return (f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')")
+
+
+#monthly partitions currently attached to earthquakes
+LIST_PARTITIONS = f"""
+    SELECT child.relname FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = '{PARENT}'
+"""
+
+#monthly partition tables that exist but are detached: left behind by an interrupted archive run
+LIST_DETACHED = f"""
+    SELECT relname FROM pg_class
+    WHERE relkind = 'r' AND relname LIKE '{PREFIX}%'
+      AND NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = pg_class.oid)
+"""
+
+
+async def attached_months(conn):
+    result = await conn.execute(text(LIST_PARTITIONS))
+    return {month for month in (partition_month(name) for name, in result) if month is not None}
+
+
+async def ensure_partitions(conn, months):
+    """Create the partitions for months that don't have one yet; returns the months created."""
+    #serialize creators (ingester, backfill, API startup) until commit, so none trips over another's CREATE
+    await conn.execute(text(f"SELECT pg_advisory_xact_lock(hashtext('{PARENT}_partitions'))"))
+    missing = sorted(set(months) - await attached_months(conn))
+    for month in missing:
+        await conn.execute(text(partition_ddl(month)))
+    return missing
+
+
+async def is_partitioned(conn):
+    kind = (await conn.execute(text(f"SELECT relkind FROM pg_class WHERE relname = '{PARENT}'"))).scalar()
+    return kind == "p" if kind is not None else None
+
+
+async def migrate_unpartitioned(conn, create_table, columns):
+    """Turn a plain earthquakes table from before partitioning into a partitioned one.
+
+    Runs before install_summary in init_db's transaction: the rows are copied into the
+    new table before its triggers exist, so the totals they already count stay right.
+    """
+    await conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {PARENT}_unpartitioned"))
+    #free the index names (earthquakes_pkey, ix_earthquakes_*) for the new table
+    indexes = await conn.execute(text(f"SELECT indexname FROM pg_indexes WHERE tablename = '{PARENT}_unpartitioned'"))
+    for name, in indexes.all():
+        await conn.execute(text(f"ALTER INDEX {name} RENAME TO {name}_unpartitioned"))
+    await create_table(conn)
+    first, last, undated = (await conn.execute(text(
+        f"SELECT min(occurred_at), max(occurred_at), count(*) FILTER (WHERE occurred_at IS NULL) FROM {PARENT}_unpartitioned"
+    ))).one()
+    if first is not None:
+        await ensure_partitions(conn, months_between(first, last))
+        names = ", ".join(columns)
+        await conn.execute(text(f"INSERT INTO {PARENT} ({names}) SELECT {names} FROM {PARENT}_unpartitioned WHERE occurred_at IS NOT NULL"))
+    if undated:
+        #a range partition can't hold a NULL key; such rows never showed up in any time-ordered listing either.
+        #DELETE rather than leave them to DROP TABLE, which fires no trigger: the summary
+        #triggers (renamed along with the table) take them out of the /stats totals
+        await conn.execute(text(f"DELETE FROM {PARENT}_unpartitioned WHERE occurred_at IS NULL"))
+        print(f"Dropped {undated} earthquakes without occurred_at while partitioning")
+    await conn.execute(text(f"DROP TABLE {PARENT}_unpartitioned"))
@@ -0,0 +1,277 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from .batch import QuakeBatch, NO_TIME
+from .config import current_config, USGS_SUMMARY_URL
+from .deadletter import save_or_quarantine, quarantine, parse_rejects
+from .parser import decode_feed
+from .scheduler import FeedScheduler
+from . import metrics
+
+#The ingester as three concurrent stages joined by bounded queues:
+#
+#    FeedScheduler -> fetch -> [responses] -> parse (executor) -> [parsed] -> writer -> Postgres
+#
+#A full queue blocks the stage that feeds it, so a slow database first holds back
+#parsing and then, through the scheduler's semaphore, fetching: memory stays bounded
+#and nothing is dropped. Parsing runs in a thread or process pool so a large feed
+#never stalls the event loop, and the writer merges whatever has queued up into
+#one upsert, flushed on size or after a short delay.
+#
+#Faults stay local: a malformed feature or a row the database rejects is
+#quarantined (deadletter.py) while the rest is written, transient write failures
+#are retried with backoff, and after downtime longer than the widest polled feed
+#covers, a catch-up fetch of a longer feed (all_week, all_month) fills the gap.
+
+PARSE_EXECUTORS = ("inline", "thread", "process")
+
+#time span covered by each USGS summary feed, by the suffix of its name
+FEED_WINDOWS = {"hour": 3600, "day": 86400, "week": 7 * 86400, "month": 30 * 86400}
+
+
+def feed_window(url):
+    return FEED_WINDOWS.get(metrics.feed_name(url).rsplit("_", 1)[-1], 0)
+
+
+def catch_up_url(downtime, feeds):
+    """The all_* feed to fetch once after `downtime` seconds without a successful cycle,
+    or None when the regularly polled feeds still reach back far enough."""
+    covered = max((feed_window(feed["url"]) for feed in feeds), default=0)
+    if downtime <= covered:
+        return None
+    for period in ("day", "week", "month"):
+        if FEED_WINDOWS[period] >= downtime:
+            return f"{USGS_SUMMARY_URL}/all_{period}.geojson"
+    print(f"Down for {downtime / 86400:.1f} days, longer than any feed reaches back: "
+          f"run quake_ingest.backfill for the gap before the last 30 days")
+    return f"{USGS_SUMMARY_URL}/all_month.geojson"
+
+
+def make_parse_executor(kind=None, workers=None):
+    """Executor for decode_feed: None for "inline" (on the event loop), else a thread or process pool."""
+    kind = kind or current_config["PARSE_EXECUTOR"]
+    workers = workers or current_config["PARSE_WORKERS"]
+    if kind == "inline":
+        return None
+    if kind == "thread":
+        return ThreadPoolExecutor(workers, thread_name_prefix="parse")
+    if kind == "process":
+        #spawn, not fork: a forked child would inherit the parent's event loop and DB connections
+        return ProcessPoolExecutor(workers, mp_context=get_context("spawn"))
+    raise ValueError(f"unknown parse executor {kind!r}, expected one of {PARSE_EXECUTORS}")
+
+
+async def run_parse(executor, body):
+    if executor is None:
+        return decode_feed(body)
+    return await asyncio.get_running_loop().run_in_executor(executor, decode_feed, body)
+
+
+#how far behind USGS we are: commit time minus each written event's origin time and last update
+def observe_lag(batch, now=None):
+    now_ms = (time.time() if now is None else now) * 1000
+    for since, column in (("event", batch.time_ms), ("update", batch.updated_ms)):
+        for ms in column:
+            if ms != NO_TIME:
+                metrics.INGEST_LAG.observe(max(0.0, (now_ms - ms) / 1000), since=since)
+
+
+#Work done by one stage: items handled, events in them and time spent busy.
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.events = 0
+        self.busy = 0.0
+        self.started = time.monotonic()
+
+    def record(self, seconds, events=0):
+        self.items += 1
+        self.events += events
+        self.busy += seconds
+        metrics.STAGE_SECONDS.observe(seconds, stage=self.name)
+        metrics.STAGE_EVENTS.inc(events, stage=self.name)
+
+    def snapshot(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "items": self.items,
+            "events": self.events,
+            "events_per_sec": round(self.events / elapsed, 1),
+            "busy_ratio": round(self.busy / elapsed, 3),  # near 1.0 (or more, with several workers): the bottleneck
+        }
+
+
+class IngestPipeline:
+    def __init__(self, fetcher, revisions, feeds=None, max_concurrency=None, executor=None, parse_workers=None,
+                 queue_size=None, flush_rows=None, flush_interval=None, report_interval=None, since=None):
+        self.fetcher = fetcher
+        self.revisions = revisions
+        self.feeds = feeds or current_config["FEEDS"]
+        self.max_concurrency = max_concurrency or current_config["MAX_CONCURRENT_FETCHES"]
+        self.executor = executor
+        self.parse_workers = parse_workers or current_config["PARSE_WORKERS"]
+        self.flush_rows = flush_rows or current_config["WRITE_FLUSH_ROWS"]
+        self.flush_interval = current_config["WRITE_FLUSH_INTERVAL"] if flush_interval is None else flush_interval
+        self.report_interval = current_config["STATS_REPORT_INTERVAL"] if report_interval is None else report_interval
+        queue_size = queue_size or current_config["PIPELINE_QUEUE_SIZE"]
+        self.responses = asyncio.Queue(queue_size)  # (url, raw body)
+        self.parsed = asyncio.Queue(queue_size)  # (url, metadata, claimed QuakeBatch)
+        self.stats = {name: StageStats(name) for name in ("fetch", "parse", "write")}
+        self.write_retries = current_config["WRITE_RETRIES"]
+        self.write_backoff = current_config["WRITE_BACKOFF"]
+        #unix time of the last cycle that got through (rows committed or nothing new); since is
+        #the last commit before this process started, so a restart after downtime catches up too
+        self.last_healthy = since
+        self._write_failing = False
+        self._tasks = set()
+
+    async def run(self):
+        if self.last_healthy is not None:
+            self._catch_up(time.time() - self.last_healthy)
+        self.last_healthy = time.time()
+        scheduler = FeedScheduler(self.feeds, self.fetch, self.max_concurrency)
+        stages = [scheduler.run(), self._writer(), *(self._parser() for _ in range(self.parse_workers))]
+        if self.report_interval:
+            stages.append(self._reporter())
+        await asyncio.gather(*stages)
+
+    async def fetch(self, url):
+        """Fetch stage, run by the scheduler for each poll: hand the raw body on to the parsers."""
+        start = time.perf_counter()
+        body = await self.fetcher.fetch(url, decode=False)
+        self.stats["fetch"].record(time.perf_counter() - start)
+        if body is not None:  # None is a 304 Not Modified
+            await self._put(self.responses, "responses", (url, body))
+
+    async def _parser(self):
+        while True:
+            url, body = await self._get(self.responses, "responses")
+            try:
+                start = time.perf_counter()
+                metadata, batch, rejects = await run_parse(self.executor, body)
+                elapsed = time.perf_counter() - start
+                self.stats["parse"].record(elapsed, len(batch))
+                metrics.PARSE_SECONDS.observe(elapsed)
+                feed = {"metadata": metadata}
+                #skip a generation we already processed; claiming drops revisions already written from any feed
+                if not self.revisions.is_new_generation(url, feed):
+                    self._healthy()
+                    continue
+                #claimed like good events, so a bad revision is quarantined once, not on every poll
+                await quarantine(parse_rejects(url, [
+                    (feature, reason) for feature, reason in rejects
+                    if not isinstance(feature, dict) or self.revisions.claim(feature.get("id"), (feature.get("properties") or {}).get("updated"))
+                ]))
+                changed = self.revisions.claim_batch(batch)
+                if not len(changed):
+                    self.revisions.remember_generation(url, feed)
+                    self._healthy()
+                    continue
+                await self._put(self.parsed, "parsed", (url, metadata, changed))
+            except Exception as e:
+                print(f"error parsing {url}: {e}")
+                self.fetcher.invalidate(url)  # refetch the full body next poll
+            finally:
+                self.responses.task_done()
+
+    async def _writer(self):
+        pending = []
+        rows = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = await asyncio.wait_for(self._get(self.parsed, "parsed"), timeout)
+            except asyncio.TimeoutError:
+                item = None
+            if item is not None:
+                pending.append(item)
+                rows += len(item[2])
+                self.parsed.task_done()
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if pending and (rows >= self.flush_rows or time.monotonic() >= deadline):
+                await self.flush(pending)
+                pending, rows, deadline = [], 0, None
+
+    async def flush(self, pending):
+        """Write the claimed batches of several responses as one upsert, retrying transient failures."""
+        batch = QuakeBatch()
+        for _, _, changed in pending:
+            batch.extend(changed)
+        source = ",".join(sorted({url for url, _, _ in pending}))
+        start = time.perf_counter()
+        counts = None
+        for attempt in range(self.write_retries + 1):
+            try:
+                counts = await save_or_quarantine(batch, source)
+                break
+            except Exception as e:
+                #save_or_quarantine only lets transient failures through: back off and try again
+                print(f"write attempt {attempt + 1} failed: {e}")
+                if attempt < self.write_retries:
+                    await asyncio.sleep(random.uniform(0, self.write_backoff * (2 ** attempt)))
+        self.stats["write"].record(time.perf_counter() - start, len(batch))
+        if counts is None:  # still failing: retry these events next poll
+            self._write_failing = True
+            for url, _, changed in pending:
+                self.revisions.release_ids(changed.ids)
+                self.fetcher.invalidate(url)  # don't let a 304 hide the events we failed to write
+            return None
+        now = time.time()
+        for url, metadata, changed in pending:
+            self.revisions.remember_generation(url, {"metadata": metadata})
+            feed = metrics.feed_name(url)
+            metrics.CYCLE_ROWS.observe(len(changed), feed=feed)
+            metrics.LAST_INGEST.set(now, feed=feed)
+        observe_lag(batch, now)
+        self._write_failing = False
+        self._healthy(wrote=True)
+        return counts
+
+    def _healthy(self, wrote=False):
+        #a cycle with nothing to write proves nothing while writes are failing
+        if self._write_failing and not wrote:
+            return
+        now = time.time()
+        if self.last_healthy is not None:
+            self._catch_up(now - self.last_healthy)
+        self.last_healthy = now
+
+    def _catch_up(self, downtime):
+        url = catch_up_url(downtime, self.feeds)
+        if url is None:
+            return
+        print(f"No successful ingest for {downtime / 3600:.1f}h, catching up from {url}")
+        #through the normal fetch stage, off the scheduler so regular polls aren't delayed
+        task = asyncio.get_running_loop().create_task(self._catch_up_fetch(url, downtime))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _catch_up_fetch(self, url, downtime):
+        try:
+            await self.fetch(url)
+        except Exception as e:
+            print(f"catch-up fetch of {url} failed: {e}")
+            #put the gap back so the next successful cycle tries again
+            self.last_healthy = min(self.last_healthy or time.time(), time.time() - downtime)
+
+    async def _put(self, queue, name, item):
+        await queue.put(item)
+        metrics.QUEUE_DEPTH.set(queue.qsize(), queue=name)
+
+    async def _get(self, queue, name):
+        item = await queue.get()
+        metrics.QUEUE_DEPTH.set(queue.qsize(), queue=name)
+        return item
+
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            print("pipeline " + " | ".join(
+                f"{name}: {s['items']} items, {s['events_per_sec']} events/s, busy {s['busy_ratio']:.0%}"
+                for name, s in ((name, stats.snapshot()) for name, stats in self.stats.items())
+            ))
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import datetime
+import os
+from pathlib import Path
+from sqlalchemy import text
+from .config import current_config
+from .columnar import arrow_schema, record_batch
+from .partitions import PARENT, LIST_DETACHED, attached_months, ensure_partitions, partition_name, partition_month, \
+    month_start, add_months, upcoming_months
+from . import db
+
+#Retention for the monthly earthquakes partitions (partitions.py). Partitions that
+#ended more than RETENTION_MONTHS before the current month are detached, written to
+#ARCHIVE_DIR as zstd-compressed Parquet (one file per month, same columns as /export)
+#and dropped, so the live table - and every query on it - only spans recent months.
+#
+#Detaching is a catalog change, not a DELETE: no dead tuples, no vacuum debt. Since
+#no DELETE trigger fires, the /stats totals are adjusted here. The hourly rollup
+#keeps archived months, so /aggregate still covers them.
+#
+#    python -m quake_ingest.retention --retention-months 24
+
+#the previous month is still inside the all_month feed and the catch-up window: archiving
+#it would let the next revision recreate the partition and count its events twice
+MIN_RETENTION_MONTHS = 1
+
+#the partition's rows leave the running totals (last_ingested_at is left alone)
+SUBTRACT_SUMMARY = """
+    UPDATE earthquake_summary s SET
+        total = s.total - d.total,
+        magnitude_sum = s.magnitude_sum - d.magnitude_sum,
+        magnitude_count = s.magnitude_count - d.magnitude_count
+    FROM (SELECT count(*) AS total, coalesce(sum(magnitude), 0) AS magnitude_sum, count(magnitude) AS magnitude_count
+          FROM {table}) d
+    WHERE s.id = 1
+"""
+
+
+def expired_months(months, retention_months, now=None):
+    """Partition months that ended more than retention_months full months before the current one."""
+    cutoff = add_months(month_start(now or datetime.datetime.now()), -retention_months)
+    return sorted(month for month in months if month < cutoff)
+
+
+def archive_path(archive_dir, month):
+    """File for a month's archive; a month archived again (a backfill recreated it) gets a numbered sibling."""
+    path = Path(archive_dir) / f"{partition_name(month)}.parquet"
+    copy = 1
+    while path.exists():
+        path = Path(archive_dir) / f"{partition_name(month)}.{copy}.parquet"
+        copy += 1
+    return path
+
+
+async def detach_partition(month):
+    table = partition_name(month)
+    async with db.get_engine().begin() as conn:
+        await conn.execute(text(SUBTRACT_SUMMARY.format(table=table)))
+        await conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {table}"))
+    db.forget_partitions([month])
+
+
+#streams a detached partition through a server-side cursor, one row group per fetch
+async def export_table(table, path, chunk_size):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = arrow_schema()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    count = 0
+    query = text(f"SELECT {', '.join(db.EARTHQUAKE_COLUMNS)} FROM {table} ORDER BY occurred_at, id")\
+        .execution_options(yield_per=chunk_size)
+    async with db.async_session() as session:
+        result = await session.stream(query)
+        with pq.ParquetWriter(partial, schema, compression="zstd") as writer:
+            async for rows in result.partitions(chunk_size):
+                writer.write_table(pa.Table.from_batches([record_batch(rows, schema)]))
+                count += len(rows)
+    #only a complete file gets the final name
+    os.replace(partial, path)
+    return count
+
+
+async def archive_table(table, archive_dir, chunk_size):
+    path = archive_path(archive_dir, partition_month(table))
+    count = await export_table(table, path, chunk_size)
+    async with db.get_engine().begin() as conn:
+        await conn.execute(text(f"DROP TABLE {table}"))
+    print(f"Archived {count} earthquakes from {table} to {path}")
+    return path
+
+
+async def apply_retention(retention_months, archive_dir=None, chunk_size=None, now=None):
+    """Detach, archive and drop the expired partitions; returns the archive files written."""
+    if retention_months < MIN_RETENTION_MONTHS:
+        raise ValueError(f"retention must keep at least {MIN_RETENTION_MONTHS} full month, got {retention_months}")
+    archive_dir = archive_dir or current_config["ARCHIVE_DIR"]
+    chunk_size = chunk_size or current_config["EXPORT_CHUNK_SIZE"]
+    async with db.get_engine().connect() as conn:
+        expired = expired_months(await attached_months(conn), retention_months, now)
+    for month in expired:
+        await detach_partition(month)
+    #also picks up partitions an interrupted earlier run detached but never archived
+    async with db.get_engine().connect() as conn:
+        detached = sorted(name for name, in await conn.execute(text(LIST_DETACHED)) if partition_month(name) is not None)
+    paths = [await archive_table(table, archive_dir, chunk_size) for table in detached]
+    if expired:
+        #counts changed without a write: let API caches know
+        await db.announce_refresh()
+    return paths
+
+
+async def maintain_partitions(interval=None):
+    """Ingester background task: keep partitions ready for the coming months and apply RETENTION_MONTHS."""
+    interval = interval or current_config["MAINTENANCE_INTERVAL"]
+    while True:
+        try:
+            async with db.get_engine().begin() as conn:
+                await ensure_partitions(conn, upcoming_months(datetime.datetime.now(), current_config["PARTITION_PREMAKE_MONTHS"]))
+            retention_months = current_config["RETENTION_MONTHS"]
+            if retention_months is not None and retention_months < MIN_RETENTION_MONTHS:
+                print(f"RETENTION_MONTHS={retention_months} ignored: at least {MIN_RETENTION_MONTHS} full month must be kept")
+            elif retention_months is not None:
+                await apply_retention(retention_months)
+        except Exception as e:
+            print(f"partition maintenance failed: {e}")
+        await asyncio.sleep(interval)
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive and drop earthquakes partitions older than the retention window.")
+    parser.add_argument("--retention-months", type=int, default=current_config["RETENTION_MONTHS"],
+                        help="full months to keep before the current one")
+    parser.add_argument("--archive-dir", default=current_config["ARCHIVE_DIR"])
+    args = parser.parse_args(argv)
+    if args.retention_months is None:
+        parser.error("no retention configured: pass --retention-months or set RETENTION_MONTHS")
+    if args.retention_months < MIN_RETENTION_MONTHS:
+        parser.error(f"--retention-months must be at least {MIN_RETENTION_MONTHS}")
+
+    await db.configure_engine("ingest")
+    await db.init_db()
+    paths = await apply_retention(args.retention_months, args.archive_dir)
+    print(f"Retention finished: {len(paths)} partitions archived")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
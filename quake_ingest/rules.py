@@ -0,0 +1,362 @@
+import asyncio
+import ipaddress
+import math
+import socket
+from bisect import bisect_right
+import time
+from urllib.parse import urlsplit
+import aiohttp
+from aiohttp.resolver import ThreadedResolver
+from .config import current_config
+from .db import get_alert_rules, listen_for_changes
+from .geo import bbox_around, haversine_km
+from . import notify, metrics
+
+#User alert rules, matched against every batch the ingester writes.
+#
+#Rules live in the alert_rules table (managed through the API's /rules routes).
+#The ingester keeps them in a RuleIndex: a grid of cell_degrees squares, each
+#listing the rules whose region's bounding box touches it. An event only looks at
+#the rules of its own cell (plus the few with no region or a huge one), so a
+#batch costs about events x rules-per-cell instead of events x rules. Matches are
+#grouped per rule and handed to a notifier: one delivery per rule and batch.
+
+NOTIFIERS = ("webhook", "log")
+#a region covering more cells than this is checked against every event instead of being gridded
+MAX_RULE_CELLS = 4096
+
+
+def point_in_polygon(lon, lat, ring):
+    """Ray casting on a [[lon, lat], ...] ring (the closing point is optional)."""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def unwrap_ring(ring):
+    """A ring spanning more than 180 degrees of longitude is taken to cross the antimeridian:
+    its western longitudes come back shifted by +360, so the region is one contiguous span."""
+    lons = [point[0] for point in ring]
+    if max(lons) - min(lons) <= 180:
+        return ring
+    return [[lon + 360 if lon < 0 else lon, lat] for lon, lat in ring]
+
+
+#One alert rule; None fields don't constrain. tsunami=True only matches events with a
+#tsunami flag, False only events without one.
+class Rule:
+    FIELDS = ("id", "name", "webhook_url", "polygon", "latitude", "longitude", "radius_km",
+              "min_magnitude", "min_depth", "max_depth", "tsunami")
+    __slots__ = FIELDS + ("ring",)  # ring: the polygon with longitudes unwrapped across the antimeridian
+
+    def __init__(self, id, name=None, webhook_url=None, polygon=None, latitude=None, longitude=None, radius_km=None,
+                 min_magnitude=None, min_depth=None, max_depth=None, tsunami=None):
+        self.id = id
+        self.name = name
+        self.webhook_url = webhook_url
+        self.polygon = polygon
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+        self.min_magnitude = min_magnitude
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.tsunami = tsunami
+        self.ring = unwrap_ring(polygon) if polygon else None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{name: getattr(row, name) for name in cls.FIELDS})
+
+    def bbox(self):
+        """(west, south, east, north) around the region, west > east across the antimeridian; None without a region."""
+        if self.ring:
+            lons = [point[0] for point in self.ring]
+            lats = [point[1] for point in self.ring]
+            east = max(lons)
+            return (min(lons), min(lats), east - 360 if east > 180 else east, max(lats))
+        if self.radius_km is not None:
+            return bbox_around(self.latitude, self.longitude, self.radius_km)
+        return None
+
+    def matches(self, latitude, longitude, magnitude, depth, tsunami):
+        #cheap scalar tests first; NaN (unknown magnitude or depth) fails any bound
+        if self.min_magnitude is not None and not magnitude >= self.min_magnitude:
+            return False
+        if self.min_depth is not None and not depth >= self.min_depth:
+            return False
+        if self.max_depth is not None and not depth <= self.max_depth:
+            return False
+        if self.tsunami is not None and bool(tsunami) != self.tsunami:
+            return False
+        if self.ring:
+            if longitude < 0 and self.ring is not self.polygon:
+                longitude += 360
+            return point_in_polygon(longitude, latitude, self.ring)
+        if self.radius_km is not None:
+            return haversine_km(self.latitude, self.longitude, latitude, longitude) <= self.radius_km
+        return True
+
+
+#Candidate lists (per cell, and the worldwide one) are sorted by magnitude floor, so an
+#event only walks the rules whose floor it reaches: most events are small and most
+#worldwide rules are "anything above M5" alerts.
+class RuleIndex:
+    def __init__(self, rules, cell_degrees=None):
+        self.cell_degrees = cell_degrees or current_config["RULE_GRID_DEGREES"]
+        self.rules = list(rules)
+        self.grid = {}  # (x, y) -> ([magnitude floors], [Rule])
+        self.everywhere = ([], [])  # rules without a region, or with one too large to grid
+        #inserted in floor order, so every list comes out sorted without sorting each one
+        for rule in sorted(self.rules, key=_floor):
+            floor = _floor(rule)
+            cells = self._cells(rule.bbox())
+            for floors, rules in ([self.everywhere] if cells is None else map(self._entry, cells)):
+                floors.append(floor)
+                rules.append(rule)
+
+    def _entry(self, cell):
+        entry = self.grid.get(cell)
+        if entry is None:
+            entry = self.grid[cell] = ([], [])
+        return entry
+
+    def __len__(self):
+        return len(self.rules)
+
+    def _cell(self, longitude, latitude):
+        return math.floor((longitude + 180) / self.cell_degrees), math.floor((latitude + 90) / self.cell_degrees)
+
+    def _cells(self, bbox):
+        if bbox is None:
+            return None
+        west, south, east, north = bbox
+        #across the antimeridian: grid both pieces
+        spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        ranges = []
+        for span_west, span_east in spans:
+            x0, y0 = self._cell(span_west, south)
+            x1, y1 = self._cell(span_east, north)
+            ranges.append((x0, x1, y0, y1))
+        if sum((x1 - x0 + 1) * (y1 - y0 + 1) for x0, x1, y0, y1 in ranges) > MAX_RULE_CELLS:
+            return None
+        return [(x, y) for x0, x1, y0, y1 in ranges for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def candidates(self, latitude, longitude, magnitude=math.inf):
+        """Rules that may match an event here: its cell's and the worldwide ones, floors above magnitude left out."""
+        if magnitude != magnitude:  # unknown magnitude: only rules without a floor
+            magnitude = -math.inf
+        found = []
+        for floors, rules in (self.grid.get(self._cell(longitude, latitude), _EMPTY), self.everywhere):
+            found.extend(rules[:bisect_right(floors, magnitude)])
+        return found
+
+    def match(self, batch):
+        """{rule id: [batch indices]} for the events of a QuakeBatch each rule matches."""
+        matches = {}
+        columns = zip(batch.latitude, batch.longitude, batch.magnitude, batch.depth, batch.tsunami)
+        for index, (latitude, longitude, magnitude, depth, tsunami) in enumerate(columns):
+            for rule in self.candidates(latitude, longitude, magnitude):
+                if rule.matches(latitude, longitude, magnitude, depth, tsunami):
+                    matches.setdefault(rule.id, []).append(index)
+        return matches
+
+
+_EMPTY = ((), ())
+
+
+def _floor(rule):
+    return -math.inf if rule.min_magnitude is None else rule.min_magnitude
+
+
+def event_dicts(batch, indices):
+    """JSON-ready events (the API's listing fields) for the given batch indices."""
+    events = []
+    for row in batch.take(indices).rows():
+        for name in ("occurred_at", "updated_at"):
+            if row[name] is not None:
+                row[name] = row[name].isoformat()
+        events.append(row)
+    return events
+
+
+def public_address(address):
+    """False for loopback, private, link-local (cloud metadata endpoints) and other non-routable addresses."""
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_webhook_url(url):
+    """Raise ValueError unless url is http(s) to a host resolving only to public addresses.
+
+    Rules are created without authentication and delivered from inside the deployment, so a
+    webhook must not reach localhost or internal services; ALERT_WEBHOOK_ALLOW_PRIVATE lifts
+    this for local development.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("webhook_url must be an http(s) URL with a host")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    if current_config["ALERT_WEBHOOK_ALLOW_PRIVATE"]:
+        return
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        raise ValueError(f"cannot resolve webhook host {parts.hostname}: {e}") from e
+    for *_, sockaddr in infos:
+        if not public_address(sockaddr[0]):
+            raise ValueError(f"webhook host {parts.hostname} resolves to non-public address {sockaddr[0]}")
+
+
+#Used for deliveries: a DNS record changed after the rule was checked still can't point a POST inward.
+class PublicResolver(ThreadedResolver):
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        hosts = [entry for entry in await super().resolve(host, port, family) if public_address(entry["host"])]
+        if not hosts:
+            raise OSError(f"{host} resolves to no public address")
+        return hosts
+
+
+#Notifiers deliver one rule's matches from one batch: deliver(rule, events).
+class LogNotifier:
+    async def deliver(self, rule, events):
+        print(f"alert rule {rule.id} ({rule.name}): {len(events)} earthquakes, e.g. {events[0]['place']}")
+
+    async def close(self):
+        pass
+
+
+#POSTs {"rule_id", "rule_name", "events": [...]} as JSON to the rule's webhook_url.
+class WebhookNotifier:
+    def __init__(self, timeout=None):
+        self.timeout = aiohttp.ClientTimeout(total=timeout or current_config["ALERT_WEBHOOK_TIMEOUT"])
+        self._session = None
+
+    async def deliver(self, rule, events):
+        #checked again here: the rule may predate the check, or its host may have moved since
+        await check_webhook_url(rule.webhook_url)
+        if self._session is None:
+            connector = None
+            if not current_config["ALERT_WEBHOOK_ALLOW_PRIVATE"]:
+                connector = aiohttp.TCPConnector(resolver=PublicResolver())
+            self._session = aiohttp.ClientSession(timeout=self.timeout, connector=connector)
+        payload = {"rule_id": rule.id, "rule_name": rule.name, "events": events}
+        #a redirect could lead anywhere, so none are followed
+        async with self._session.post(rule.webhook_url, json=payload, allow_redirects=False) as response:
+            response.raise_for_status()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def make_notifier(kind=None):
+    kind = kind or current_config["ALERT_NOTIFIER"]
+    if kind == "webhook":
+        return WebhookNotifier()
+    if kind == "log":
+        return LogNotifier()
+    raise ValueError(f"unknown alert notifier {kind!r}, expected one of {NOTIFIERS}")
+
+
+#Runs in the ingester: subscribed to notify, it matches the rows every committed write
+#inserted (the in-process notification carries them as a QuakeBatch) and delivers in the
+#background, so a slow webhook never holds up ingest. Revisions of an event already
+#stored are not delivered again: USGS updates most events several times in their first hours.
+class RuleEngine:
+    def __init__(self, notifier, cell_degrees=None, reload_interval=None, concurrency=None):
+        self.notifier = notifier
+        self.cell_degrees = cell_degrees
+        self.reload_interval = reload_interval or current_config["RULES_RELOAD_INTERVAL"]
+        self.index = RuleIndex([], cell_degrees)
+        self.rules = {}
+        self._deliveries = asyncio.Semaphore(concurrency or current_config["ALERT_DELIVERY_CONCURRENCY"])
+        self._changed = asyncio.Event()
+        self._tasks = set()
+
+    def set_rules(self, rules):
+        self.rules = {rule.id: rule for rule in rules}
+        self.index = RuleIndex(self.rules.values(), self.cell_degrees)
+
+    async def load(self):
+        rules = {row.id: Rule.from_row(row) for row in await get_alert_rules()}
+        #tens of thousands of rules take a moment to index: keep the event loop responsive meanwhile
+        self.index = await asyncio.to_thread(RuleIndex, rules.values(), self.cell_degrees)
+        self.rules = rules
+
+    async def run(self):
+        """Reload the rules whenever the API announces a change, and every reload_interval regardless."""
+        listener = None
+        try:
+            listener = await listen_for_changes(lambda payload: self._changed.set(), notify.RULES_CHANNEL)
+        except Exception as e:
+            print(f"Could not LISTEN for rule changes, reloading every {self.reload_interval}s: {e}")
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), self.reload_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+                try:
+                    await self.load()
+                except Exception as e:
+                    print(f"Could not reload alert rules: {e}")
+        finally:
+            if listener is not None:
+                await listener.close()
+
+    async def evaluate(self, batch):
+        """Match a batch off the event loop and start the deliveries; returns {rule id: [batch indices]}."""
+        #a reload swaps in a new index and rules rather than changing these, so the thread can read them
+        index, rules = self.index, self.rules
+        with metrics.RULE_MATCH_SECONDS.time():
+            matches = await asyncio.to_thread(index.match, batch)
+        for rule_id, indices in matches.items():
+            self._spawn(self._deliver(rules[rule_id], event_dicts(batch, indices)))
+        return matches
+
+    def on_change(self, payload):
+        """notify subscriber; API-originated notifications carry no batch and are ignored.
+
+        Runs inside notify.publish right after the commit, so the match itself goes to a thread.
+        """
+        batch = payload.get("batch")
+        if batch is None or not len(self.index):
+            return
+        inserted = set(payload.get("inserted", ()))
+        batch = batch.take([i for i, event_id in enumerate(batch.ids) if event_id in inserted])
+        if len(batch):
+            self._spawn(self.evaluate(batch))
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, rule, events):
+        async with self._deliveries:
+            start = time.perf_counter()
+            try:
+                await self.notifier.deliver(rule, events)
+                metrics.ALERT_DELIVERIES.inc(result="ok")
+            except Exception as e:
+                metrics.ALERT_DELIVERIES.inc(result="error")
+                print(f"alert delivery for rule {rule.id} failed: {e!r}")
+            finally:
+                metrics.ALERT_DELIVERY_SECONDS.observe(time.perf_counter() - start)
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.notifier.close()
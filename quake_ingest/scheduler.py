@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+
+#Polls several feeds concurrently, each on its own fixed-rate interval.
+#handler(url) runs one fetch -> parse -> save cycle for a feed; a semaphore caps
+#how many cycles run at once so the big feeds can't pile up on top of each other.
+class FeedScheduler:
+    def __init__(self, feeds, handler, max_concurrency=2):
+        self.feeds = feeds
+        self.handler = handler
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(self):
+        await asyncio.gather(*(self._poll(feed["url"], feed["interval"]) for feed in self.feeds))
+
+    async def _poll(self, url, interval):
+        next_run = time.monotonic()
+        while True:
+            async with self._semaphore:
+                try:
+                    await self.handler(url)
+                except Exception as e:
+                    #one failing feed must not stop the others
+                    print(f"error polling {url}: {e}")
+            #fixed rate: a slow cycle eats into the wait instead of pushing every later poll back
+            next_run += interval
+            delay = next_run - time.monotonic()
+            if delay < 0:
+                next_run = time.monotonic()
+                delay = 0
+            await asyncio.sleep(delay)
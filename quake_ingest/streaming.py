@@ -0,0 +1,156 @@
+import asyncio
+import codecs
+import json
+import sys
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+# parser states
+_START, _KEY, _COLON, _VALUE, _AFTER_VALUE, _ARRAY, _ELEMENT, _AFTER_ELEMENT, _DONE = range(9)
+
+
+#Incremental reader for a GeoJSON FeatureCollection. Text is fed in arbitrary
+#chunks and each element of the top-level "features" array is decoded and handed
+#back as soon as it is complete, so only one feature (plus one unfinished chunk)
+#is ever held in memory. Other top-level members such as "metadata" are decoded
+#whole and kept on the instance.
+class FeatureStream:
+    def __init__(self):
+        self.metadata = None
+        self._buffer = ""
+        self._pos = 0
+        self._state = _START
+        self._key = None
+
+    def feed(self, text, final=False):
+        """Add text and return the list of features completed by it."""
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        features = []
+        while self._step(features, final):
+            pass
+        if final and self._state != _DONE:
+            raise ValueError("truncated GeoJSON: FeatureCollection is incomplete")
+        return features
+
+    def close(self):
+        return self.feed("", final=True)
+
+    def _skip_whitespace(self):
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        return self._pos < len(self._buffer)
+
+    def _expect(self, chars):
+        char = self._buffer[self._pos]
+        if char not in chars:
+            raise ValueError(f"unexpected {char!r} at offset {self._pos}, expected one of {chars!r}")
+        self._pos += 1
+        return char
+
+    def _decode(self, final):
+        #returns the decoded value, or None if the buffer ends before the value does.
+        #A value ending exactly at the end of the buffer may be a truncated number,
+        #so it is only accepted once more text (or the end of input) has arrived.
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None
+        if end == len(self._buffer) and not final:
+            return None
+        self._pos = end
+        return (value,)
+
+    def _step(self, features, final):
+        if self._state == _DONE or not self._skip_whitespace():
+            return False
+        state = self._state
+        if state == _START:
+            self._expect("{")
+            self._state = _KEY
+        elif state == _KEY:
+            if self._buffer[self._pos] == "}":
+                self._pos += 1
+                self._state = _DONE
+                return True
+            decoded = self._decode(final)
+            if decoded is None:
+                return False
+            self._key = decoded[0]
+            self._state = _COLON
+        elif state == _COLON:
+            self._expect(":")
+            self._state = _ARRAY if self._key == "features" else _VALUE
+        elif state == _VALUE:
+            decoded = self._decode(final)
+            if decoded is None:
+                return False
+            if self._key == "metadata":
+                self.metadata = decoded[0]
+            self._state = _AFTER_VALUE
+        elif state == _AFTER_VALUE:
+            self._state = _KEY if self._expect(",}") == "," else _DONE
+        elif state == _ARRAY:
+            self._expect("[")
+            self._state = _ELEMENT
+        elif state == _ELEMENT:
+            if self._buffer[self._pos] == "]":
+                self._pos += 1
+                self._state = _AFTER_VALUE
+                return True
+            decoded = self._decode(final)
+            if decoded is None:
+                return False
+            features.append(decoded[0])
+            self._state = _AFTER_ELEMENT
+        elif state == _AFTER_ELEMENT:
+            if self._expect(",]") == ",":
+                self._state = _ELEMENT
+            else:
+                self._state = _AFTER_VALUE
+        return True
+
+
+def iter_features(chunks):
+    """Yield features from an iterable of bytes (UTF-8) or str chunks."""
+    stream = FeatureStream()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        text = utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+        yield from stream.feed(text)
+    yield from stream.feed(utf8.decode(b"", final=True), final=True)
+
+
+async def aiter_features(chunks):
+    """Async version of iter_features, e.g. over aiohttp's response.content.iter_chunked()."""
+    stream = FeatureStream()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in chunks:
+        text = utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+        for feature in stream.feed(text):
+            yield feature
+    for feature in stream.feed(utf8.decode(b"", final=True), final=True):
+        yield feature
+
+
+def iter_file_features(path, chunk_size=1 << 16):
+    """Yield features from a GeoJSON file on disk without loading it whole."""
+    with open(path, "rb") as f:
+        yield from iter_features(iter(lambda: f.read(chunk_size), b""))
+
+
+if __name__ == "__main__":
+    #stream a local GeoJSON file (e.g. an FDSN backfill download) straight into the database
+    from .config import current_config
+    from .db import init_db, save_earthquake_stream
+    from .parser import iter_batches
+
+    async def load(path):
+        await init_db()
+        counts = await save_earthquake_stream(iter_batches(iter_file_features(path), current_config["BATCH_SIZE"]))
+        print(f"Loaded {path}: {counts}")
+
+    asyncio.run(load(sys.argv[1]))
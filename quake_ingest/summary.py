@@ -0,0 +1,107 @@
+from sqlalchemy import text
+
+#Running totals for /stats, kept in the single row of earthquake_summary by
+#statement-level triggers with transition tables: each upsert statement adjusts
+#the totals once by the rows it inserted, updated (old values out, new values in)
+#or deleted, so /stats never has to count the whole table.
+#max(magnitude) and max(occurred_at) are not kept here; both are index lookups.
+#
+#The same triggers maintain earthquake_rollup_hourly: event count and radiated
+#energy per hour and whole-magnitude bin, which /aggregate reads instead of
+#grouping raw events.
+
+#log10(E [joules]) = 1.5 M + 4.8 (Gutenberg-Richter energy relation)
+ENERGY_SQL = "coalesce(power(10::double precision, 1.5 * magnitude + 4.8), 0)"
+#events without a magnitude go into their own bin
+UNKNOWN_MAGNITUDE_BIN = -100
+MAGNITUDE_BIN_SQL = f"coalesce(floor(magnitude)::smallint, {UNKNOWN_MAGNITUDE_BIN})"
+
+SUMMARY_FUNCTIONS = [
+    """
+    CREATE OR REPLACE FUNCTION earthquake_summary_apply(sign integer, rows_count bigint, mag_sum double precision, mag_count bigint)
+    RETURNS void AS $$
+        UPDATE earthquake_summary SET
+            total = total + sign * rows_count,
+            magnitude_sum = magnitude_sum + sign * coalesce(mag_sum, 0),
+            magnitude_count = magnitude_count + sign * mag_count,
+            last_ingested_at = now()
+        WHERE id = 1
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION earthquake_summary_insert() RETURNS trigger AS $$
+    BEGIN
+        PERFORM earthquake_summary_apply(1, count(*), sum(magnitude), count(magnitude)) FROM new_rows;
+        INSERT INTO earthquake_rollup_hourly AS r (bucket, magnitude_bin, count, energy_joules)
+            SELECT date_trunc('hour', occurred_at), {bin}, count(*), sum({energy})
+            FROM new_rows GROUP BY 1, 2
+            ON CONFLICT (bucket, magnitude_bin) DO UPDATE
+            SET count = r.count + excluded.count, energy_joules = r.energy_joules + excluded.energy_joules;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION earthquake_summary_update() RETURNS trigger AS $$
+    BEGIN
+        PERFORM earthquake_summary_apply(-1, count(*), sum(magnitude), count(magnitude)) FROM old_rows;
+        PERFORM earthquake_summary_apply(1, count(*), sum(magnitude), count(magnitude)) FROM new_rows;
+        INSERT INTO earthquake_rollup_hourly AS r (bucket, magnitude_bin, count, energy_joules)
+            SELECT bucket, magnitude_bin, sum(count), sum(energy) FROM (
+                SELECT date_trunc('hour', occurred_at) AS bucket, {bin} AS magnitude_bin, -1 AS count, -{energy} AS energy FROM old_rows
+                UNION ALL
+                SELECT date_trunc('hour', occurred_at), {bin}, 1, {energy} FROM new_rows
+            ) changes GROUP BY 1, 2
+            ON CONFLICT (bucket, magnitude_bin) DO UPDATE
+            SET count = r.count + excluded.count, energy_joules = r.energy_joules + excluded.energy_joules;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION earthquake_summary_delete() RETURNS trigger AS $$
+    BEGIN
+        PERFORM earthquake_summary_apply(-1, count(*), sum(magnitude), count(magnitude)) FROM old_rows;
+        UPDATE earthquake_rollup_hourly r SET count = r.count - d.count, energy_joules = r.energy_joules - d.energy
+            FROM (SELECT date_trunc('hour', occurred_at) AS bucket, {bin} AS magnitude_bin, count(*) AS count, sum({energy}) AS energy
+                  FROM old_rows GROUP BY 1, 2) d
+            WHERE r.bucket = d.bucket AND r.magnitude_bin = d.magnitude_bin;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+]
+
+#transition tables allow only one event per trigger, hence three triggers
+SUMMARY_TRIGGERS = {
+    "earthquake_summary_on_insert": "AFTER INSERT ON earthquakes REFERENCING NEW TABLE AS new_rows "
+                                    "FOR EACH STATEMENT EXECUTE FUNCTION earthquake_summary_insert()",
+    "earthquake_summary_on_update": "AFTER UPDATE ON earthquakes REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+                                    "FOR EACH STATEMENT EXECUTE FUNCTION earthquake_summary_update()",
+    "earthquake_summary_on_delete": "AFTER DELETE ON earthquakes REFERENCING OLD TABLE AS old_rows "
+                                    "FOR EACH STATEMENT EXECUTE FUNCTION earthquake_summary_delete()",
+}
+
+#seed the totals and rollups from the existing rows the first time they are installed
+SEED_SUMMARY = """
+    INSERT INTO earthquake_summary (id, total, magnitude_sum, magnitude_count)
+    SELECT 1, count(*), coalesce(sum(magnitude), 0), count(magnitude) FROM earthquakes
+    ON CONFLICT (id) DO NOTHING
+"""
+
+SEED_ROLLUP = f"""
+    INSERT INTO earthquake_rollup_hourly (bucket, magnitude_bin, count, energy_joules)
+    SELECT date_trunc('hour', occurred_at), {MAGNITUDE_BIN_SQL}, count(*), sum({ENERGY_SQL})
+    FROM earthquakes
+    WHERE NOT EXISTS (SELECT 1 FROM earthquake_rollup_hourly)
+    GROUP BY 1, 2
+"""
+
+
+async def install_summary(conn):
+    """Create the summary functions and triggers and seed the totals (run inside init_db's transaction)."""
+    for statement in SUMMARY_FUNCTIONS:
+        await conn.execute(text(statement.replace("{bin}", MAGNITUDE_BIN_SQL).replace("{energy}", ENERGY_SQL)))
+    for name, definition in SUMMARY_TRIGGERS.items():
+        await conn.execute(text(f"DROP TRIGGER IF EXISTS {name} ON earthquakes"))
+        await conn.execute(text(f"CREATE TRIGGER {name} {definition}"))
+    #the triggers' locks keep writers out until commit, so the seed can't miss or double count rows
+    await conn.execute(text(SEED_SUMMARY))
+    await conn.execute(text(SEED_ROLLUP))
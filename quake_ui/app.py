@@ -1,59 +1,131 @@
+import math
+import os
 import streamlit as st
 import requests
 import pandas as pd
+import numpy as np
 import folium
 from streamlit_folium import st_folium
 
+API_URL = os.getenv("EARTHPULSE_API_URL", "https://earthpulse-e965f2ce55ce.herokuapp.com")
+# Magnitude bands: below 2.5 green, below 4.5 orange, anything stronger red
+MAGNITUDE_BINS = [-np.inf, 2.5, 4.5, np.inf]
+MAGNITUDE_COLORS = ["green", "orange", "red"]
+# Must match alerts_api.routes.clusters.TILE_CELLS
+TILE_CELLS = 8
+DEFAULT_ZOOM = 2
+
+
+# Responses are cached per path and filter values, so a rerun (every widget
+# interaction) only goes to the API when the filters or the viewport changed
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_json(path, **params):
+    response = requests.get(f"{API_URL}{path}", params=params, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def wrap_longitude(lng):
+    return (lng + 180) % 360 - 180
+
+
+def viewport_bbox(bounds, zoom):
+    """west,south,east,north for /clusters, widened to whole grid cells so small pans reuse the cache."""
+    if not bounds:
+        return None
+    south_west, north_east = bounds["_southWest"], bounds["_northEast"]
+    if north_east["lng"] - south_west["lng"] >= 360:
+        west, east = -180.0, 180.0
+    else:
+        # Leaflet keeps counting past ±180 as you pan around the world
+        west, east = wrap_longitude(south_west["lng"]), wrap_longitude(north_east["lng"])
+    cell = 360 / (2 ** zoom * TILE_CELLS)
+    west = max(-180.0, math.floor(west / cell) * cell)
+    east = min(180.0, math.ceil(east / cell) * cell)
+    south = max(-90.0, math.floor(south_west["lat"] / cell) * cell)
+    north = min(90.0, math.ceil(north_east["lat"] / cell) * cell)
+    return f"{west:g},{south:g},{east:g},{north:g}"
+
+
+def cluster_layer(clusters):
+    """All clusters as one GeoJSON layer; colors, sizes and labels computed column-wise."""
+    df = pd.DataFrame(clusters)
+    magnitude = df["max_magnitude"].astype(float)
+    colors = pd.cut(magnitude.fillna(0), MAGNITUDE_BINS, right=False, labels=MAGNITUDE_COLORS).astype(str)
+    single = df["count"] == 1
+    radius = np.where(single, magnitude.fillna(0).clip(lower=0.5) * 2, 8 + 4 * np.log10(df["count"].clip(lower=1)))
+    magnitude_text = magnitude.round(1).astype(str)
+    cluster_label = df["count"].astype(str) + " earthquakes<br>Max magnitude: " + magnitude_text
+    if "place" in df:
+        event_label = df["place"].fillna("Unknown place") + "<br>Magnitude: " + magnitude_text \
+            + "<br>Depth: " + df["depth"].astype(str) + " km"
+        labels = np.where(single, event_label, cluster_label)
+    else:
+        labels = cluster_label
+    features = [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]},
+         "properties": {"color": color, "radius": float(r), "label": label}}
+        for lon, lat, color, r, label in zip(df["longitude"], df["latitude"], colors, radius, labels)
+    ]
+    return folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        marker=folium.CircleMarker(fill=True, fill_opacity=0.6, weight=1),
+        style_function=lambda feature: {
+            "color": feature["properties"]["color"],
+            "fillColor": feature["properties"]["color"],
+            "radius": feature["properties"]["radius"],
+        },
+        tooltip=folium.GeoJsonTooltip(fields=["label"], labels=False),
+    )
+
+
 st.title("🌍 Earth Pulse")
 min_mag = st.slider("Minimum Magnitude", 0.0, 5.0, 0.0, 0.1)
 if st.button("🔄 Refresh Data"):
+    fetch_json.clear()
     st.rerun()
 
+# Where the user left the map on the previous run
+view = st.session_state.get("map") or {}
+zoom = view.get("zoom") or DEFAULT_ZOOM
+center = view.get("center") or {"lat": 20, "lng": 0}
+
 # Fetch data from API
 try:
-    response = requests.get(f"https://earthpulse-e965f2ce55ce.herokuapp.com/alerts?limit=50&min_magnitude={min_mag}")
-    data = response.json()
-    
+    # The server groups events into grid cells sized for the zoom level, so the
+    # map draws a few hundred circles however many earthquakes are in the catalog
+    clustered = fetch_json("/clusters", zoom=zoom, bbox=viewport_bbox(view.get("bounds"), zoom), min_magnitude=min_mag)
+    clusters = clustered["clusters"]
+
+    # Show metrics
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Earthquakes in View", clustered["total"])
+    if clusters:
+        cells = pd.DataFrame(clusters).dropna(subset=["mean_magnitude"])
+        if len(cells):
+            col2.metric("Avg Magnitude", f"{np.average(cells['mean_magnitude'], weights=cells['count']):.2f}")
+            col3.metric("Max Magnitude", f"{cells['max_magnitude'].max():.2f}")
+
+    # Create map
+    st.subheader("Earthquake Map")
+    m = folium.Map(location=[20, 0], zoom_start=DEFAULT_ZOOM)
+    layer = folium.FeatureGroup(name="Earthquakes")
+    if clusters:
+        cluster_layer(clusters).add_to(layer)
+    # Only the layer is replaced on reruns; the map keeps its position
+    st_folium(m, key="map", feature_group_to_add=layer, center=[center["lat"], center["lng"]], zoom=zoom,
+              width=700, height=500, returned_objects=["bounds", "zoom", "center"])
+
+    # Show data table
+    data = fetch_json("/alerts", limit=50, min_magnitude=min_mag)
     if data:
         df = pd.DataFrame(data)
-        
-        # Show metrics
-        col1, col2, col3 = st.columns(3)
-        col1.metric("Total Earthquakes", len(df))
-        col2.metric("Avg Magnitude", f"{df['magnitude'].mean():.2f}")
-        col3.metric("Max Magnitude", f"{df['magnitude'].max():.2f}")
-        
-        # Create map
-        st.subheader("Earthquake Map")
-        m = folium.Map(location=[20, 0], zoom_start=2)
-        
-        for idx, row in df.iterrows():
-            # Color based on magnitude
-            if row['magnitude'] < 2.5:
-                color = 'green'
-            elif row['magnitude'] < 4.5:
-                color = 'orange'
-            else:
-                color = 'red'
-            
-            folium.CircleMarker(
-                location=[row['latitude'], row['longitude']],
-                radius=row['magnitude'] * 2,
-                popup=f"{row['place']}<br>Magnitude: {row['magnitude']}<br>Depth: {row['depth']} km",
-                color=color,
-                fill=True,
-                fillColor=color
-            ).add_to(m)
-        
-        st_folium(m, width=700, height=500)
-        
-        # Show data table
         st.subheader("Recent Earthquakes")
-        st.dataframe(df[['place', 'magnitude', 'depth', 'occurred_at']], 
+        st.dataframe(df[['place', 'magnitude', 'depth', 'occurred_at']],
                      use_container_width=True)
     else:
         st.error("No data available")
-        
+
 except Exception as e:
-    st.error(f"Cannot connect to API. Make sure it's running on port 8000")
-    st.error(f"Error: {e}")
\ No newline at end of file
+    st.error(f"Cannot connect to the API at {API_URL}")
+    st.error(f"Error: {e}")
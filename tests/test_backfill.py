@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta
+from benchmarks.stub_server import StubFdsnServer
+from quake_ingest import backfill
+from quake_ingest.backfill import Backfill, remaining_windows, query_url
+
+START = datetime(2024, 1, 1)
+
+def test_remaining_windows_skips_done_intervals():
+    done = [(START + timedelta(days=2), START + timedelta(days=3)), (START - timedelta(days=5), START + timedelta(hours=12))]
+    windows = remaining_windows(START, START + timedelta(days=4), done, timedelta(days=1))
+    assert windows == [
+        (START + timedelta(hours=12), START + timedelta(days=1, hours=12)),
+        (START + timedelta(days=1, hours=12), START + timedelta(days=2)),
+        (START + timedelta(days=3), START + timedelta(days=4)),
+    ]
+
+def test_query_url():
+    url = query_url("http://stub/fdsn/", "query", START, START + timedelta(hours=1), 2.5)
+    assert url.startswith("http://stub/fdsn/query?format=geojson&starttime=2024-01-01T00%3A00%3A00")
+    assert "orderby=time-asc" in url and "minmagnitude=2.5" in url
+
+def run_backfill(monkeypatch, server_kwargs, **kwargs):
+    saved = []
+
+    async def fake_save(batch, source, announce=True):
+        assert announce is False
+        saved.extend(batch.ids)
+        return {"inserted": len(batch), "updated": 0, "unchanged": 0}
+
+    async def fake_announce():
+        pass
+
+    monkeypatch.setattr(backfill, "save_or_quarantine", fake_save)
+    monkeypatch.setattr(backfill, "announce_refresh", fake_announce)
+
+    async def run():
+        async with StubFdsnServer(**server_kwargs) as server:
+            job = Backfill(START, START + timedelta(days=2), base_url=server.base_url, window=timedelta(days=1),
+                           concurrency=3, batch_size=7, **kwargs)
+            return await job.run(), server.queries
+
+    totals, queries = asyncio.run(run())
+    return totals, queries, saved
+
+def test_backfill_splits_windows_over_the_cap(monkeypatch):
+    totals, queries, saved = run_backfill(monkeypatch, {"events_per_hour": 10, "max_allowed": 100})
+    #2 days x 240 events, plus the one sitting on the (inclusive) end bound
+    assert len(set(saved)) == 481
+    #each 240-event day had to be halved twice to fit under the cap of 100
+    assert len([q for q in queries if q[0] == "query"]) == totals["windows"] == 8
+
+def test_backfill_resumes_from_checkpoint(monkeypatch, tmp_path):
+    checkpoint = tmp_path / "backfill.jsonl"
+    first, _, saved = run_backfill(monkeypatch, {"events_per_hour": 2}, checkpoint=checkpoint)
+    assert first["windows"] == 2 and len(set(saved)) == 97
+    second, queries, saved = run_backfill(monkeypatch, {"events_per_hour": 2}, checkpoint=checkpoint)
+    assert second["windows"] == 0 and queries == [] and saved == []
+
+def test_streamed_backfill_quarantines_refused_rows(monkeypatch):
+    from quake_ingest import deadletter
+    from quake_ingest.db import WriteError
+    saved, quarantined = [], []
+
+    async def fake_save(batch, announce=True):
+        if any(event_id.endswith("5") for event_id in batch.ids):
+            raise WriteError("value out of range", transient=False)
+        saved.extend(batch.ids)
+        return {"inserted": len(batch), "updated": 0, "unchanged": 0}
+
+    async def fake_dead_letters(entries):
+        quarantined.extend(entries)
+
+    async def fake_announce():
+        pass
+
+    monkeypatch.setattr(deadletter, "save_earthquakes", fake_save)
+    monkeypatch.setattr(deadletter, "save_dead_letters", fake_dead_letters)
+    monkeypatch.setattr(backfill, "announce_refresh", fake_announce)
+
+    async def run():
+        async with StubFdsnServer(events_per_hour=2) as server:
+            job = Backfill(START, START + timedelta(days=1), base_url=server.base_url, window=timedelta(days=1),
+                           concurrency=1, batch_size=7)
+            return await job.run(), job.failed
+
+    totals, failed = asyncio.run(run())
+    assert failed == []
+    assert quarantined and all(entry["event_id"].endswith("5") for entry in quarantined)
+    assert not any(event_id.endswith("5") for event_id in saved)
+    assert totals["inserted"] == len(saved) == 49 - len(quarantined)
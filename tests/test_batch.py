@@ -0,0 +1,33 @@
+from datetime import datetime
+from quake_ingest.batch import QuakeBatch
+from quake_ingest.parser import parse_batch, parse_features, iter_batches
+
+def make_feature(id, mag=3.5, updated=189876539999):
+    return {
+        "id": id,
+        "properties": {"place": "Atlantic_Ocean", "mag": mag, "tsunami": 1, "time": 189876532456, "updated": updated},
+        "geometry": {"coordinates": [7, 8, 9]}
+    }
+
+def test_parse_batch_matches_dict_parser():
+    features = [make_feature("a"), make_feature("b", mag=None, updated=None)]
+    assert list(parse_batch(features).rows()) == parse_features(features)
+
+def test_from_rows_round_trips():
+    rows = parse_features([make_feature("a"), make_feature("b")])
+    assert list(QuakeBatch.from_rows(rows).rows()) == rows
+
+def test_dedupe_keeps_last_version_of_each_id():
+    batch = parse_batch([make_feature("a", 1.0), make_feature("b"), make_feature("a", 2.0)]).dedupe()
+    assert batch.ids == ["b", "a"]
+    assert batch.magnitude.tolist() == [3.5, 2.0]
+
+def test_columns_slices_and_converts_times():
+    columns = parse_batch([make_feature("a"), make_feature("b")]).columns(1, 2)
+    assert columns["id"] == ["b"]
+    assert columns["occurred_at"] == [datetime.fromtimestamp(189876532456 / 1000)]
+    assert columns["tsunami"] == [1]
+
+def test_iter_batches_groups_by_size():
+    batches = list(iter_batches((make_feature(str(i)) for i in range(5)), 2))
+    assert [len(b) for b in batches] == [2, 2, 1]
@@ -0,0 +1,56 @@
+import asyncio
+from benchmarks.synthetic import make_feed, write_feed, BENCH_ID_PREFIX
+from benchmarks.stub_server import StubFeedServer
+from benchmarks.api import percentile
+from benchmarks.run import compare
+from quake_ingest.fetcher import FeedFetcher
+from quake_ingest.parser import parse_batch
+from quake_ingest.streaming import iter_file_features
+
+def test_synthetic_feed_is_usgs_shaped():
+    feed = make_feed(2500, seed=1)
+    assert feed["metadata"]["count"] == 2500
+    batch = parse_batch(feed["features"])
+    assert len(batch) == 2500
+    assert len(set(batch.ids)) == 2500
+    assert all(event_id.startswith(BENCH_ID_PREFIX) for event_id in batch.ids)
+    assert make_feed(10, seed=1)["features"][3]["properties"]["place"] == feed["features"][3]["properties"]["place"]
+
+def test_written_feed_streams_back(tmp_path):
+    write_feed(tmp_path / "feed.geojson", 1200)
+    assert sum(1 for _ in iter_file_features(tmp_path / "feed.geojson")) == 1200
+
+def test_stub_server_serves_gzip_and_not_modified(tmp_path):
+    write_feed(tmp_path / "feed.geojson", 50)
+
+    async def run():
+        async with StubFeedServer(tmp_path) as server, FeedFetcher(retries=0) as fetcher:
+            first = await fetcher.fetch(server.url("feed.geojson"))
+            second = await fetcher.fetch(server.url("feed.geojson"))
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert len(first["features"]) == 50
+    assert second is None
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {"ingest": [{"size": 1000, "mode": "buffered", "events_per_sec": 1000, "peak_rss_mb": 100}],
+                "api": [{"endpoint": "latest", "p50_ms": 2.0, "p99_ms": 10.0}]}
+    current = {"ingest": [{"size": 1000, "mode": "buffered", "events_per_sec": 900, "peak_rss_mb": 150}],
+               "api": [{"endpoint": "latest", "p50_ms": 2.1, "p99_ms": 20.0}]}
+    regressions = compare(baseline, current, 0.2)
+    assert len(regressions) == 2
+    assert any("peak RSS" in r for r in regressions) and any("p99_ms" in r for r in regressions)
+
+def test_hot_window_benchmark_answers_latest_from_memory():
+    from benchmarks.hotwindow import bench_hot_window
+    result = bench_hot_window(2000, queries=5)
+    shapes = {shape["shape"]: shape for shape in result["shapes"]}
+    assert shapes["latest"]["answered"]
+    assert shapes["latest"]["p99_us"] > 0
@@ -0,0 +1,35 @@
+from quake_ingest.cache import RevisionCache
+
+def make_feature(id, updated):
+    return {"id": id, "properties": {"updated": updated}}
+
+def test_claim_features_skips_known_revisions():
+    cache = RevisionCache(10)
+    cache.claim_features([make_feature("a", 1), make_feature("b", 1)])
+    changed = cache.claim_features([make_feature("a", 1), make_feature("b", 2), make_feature("c", 1)])
+    assert [f["id"] for f in changed] == ["b", "c"]
+    assert cache.hits == 1
+
+def test_claimed_features_are_not_claimed_twice_until_released():
+    cache = RevisionCache(10)
+    first = cache.claim_features([make_feature("a", 1)])
+    assert cache.claim_features([make_feature("a", 1)]) == []
+    cache.release_features(first)
+    assert cache.claim_features([make_feature("a", 1)]) == first
+
+def test_cache_evicts_least_recently_seen():
+    cache = RevisionCache(2)
+    cache.remember("a", 1)
+    cache.remember("b", 1)
+    cache.claim_features([make_feature("a", 1)])  # touching "a" makes "b" the eviction candidate
+    cache.remember("c", 1)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+def test_generation_only_recorded_when_remembered():
+    cache = RevisionCache(10)
+    data = {"metadata": {"generated": 1744363492000}}
+    assert cache.is_new_generation("feed", data)
+    cache.remember_generation("feed", data)
+    assert not cache.is_new_generation("feed", data)
@@ -0,0 +1,70 @@
+from sqlalchemy.dialects.postgresql import asyncpg
+from quake_ingest.db import build_upsert
+
+def compile_sql(stmt):
+    return str(stmt.compile(dialect=asyncpg.dialect()))
+
+def test_build_upsert_binds_whole_columns_as_arrays():
+    sql = compile_sql(build_upsert())
+    assert sql.count("INSERT INTO earthquakes") == 1
+    assert "FROM unnest(" in sql
+    assert "::FLOAT[]" in sql and "::TIMESTAMP WITHOUT TIME ZONE[]" in sql
+    assert "ON CONFLICT (id, occurred_at) DO UPDATE" in sql
+    assert "IS DISTINCT FROM" in sql
+
+def test_build_upsert_without_skip_updates_unconditionally():
+    assert "IS DISTINCT FROM" not in compile_sql(build_upsert(skip_unchanged=False))
+
+def test_aggregate_uses_rollup_only_when_it_is_exact():
+    from datetime import datetime
+    from quake_ingest.db import build_aggregate_query
+    assert "earthquake_rollup_hourly" in compile_sql(build_aggregate_query("day", start=datetime(2024, 1, 1)))
+    assert "earthquake_rollup_hourly" in compile_sql(build_aggregate_query("hour", min_magnitude=3))
+    for raw in [
+        build_aggregate_query("minute", start=datetime(2024, 1, 1)),
+        build_aggregate_query("hour", start=datetime(2024, 1, 1, 0, 30)),
+        build_aggregate_query("hour", min_magnitude=2.5),
+        build_aggregate_query("day", bbox=(0, 0, 10, 10)),
+    ]:
+        assert "FROM earthquakes" in compile_sql(raw)
+
+def test_cluster_query_groups_by_grid_cell():
+    from quake_ingest.db import build_cluster_query
+    sql = compile_sql(build_cluster_query(1.5, min_magnitude=2, bbox=(170, -10, -170, 10)))
+    assert "floor((earthquakes.longitude +" in sql
+    assert "GROUP BY 1, 2" in sql
+    assert "<@ box(" in sql
+
+def test_build_engine_applies_pool_profile():
+    from quake_ingest.config import config
+    from quake_ingest.db import build_engine
+    engine = build_engine("ingest", config["production"] | {"DATABASE_URL": "postgresql+asyncpg://u:p@localhost/db"})
+    assert engine.pool.size() == config["production"]["DB_POOL"]["ingest"]["pool_size"]
+    assert engine.echo is False
+
+def test_importing_db_builds_no_engine():
+    import subprocess, sys
+    #a fresh interpreter: other tests may already have imported the driver
+    code = "import sys, quake_ingest.db as db; print(db._engine is None, 'asyncpg' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.split() == ["True", "False"]
+
+def test_init_db_skips_setup_when_schema_is_current(monkeypatch):
+    import asyncio
+    from contextlib import asynccontextmanager
+    from quake_ingest import db
+
+    class FakeEngine:
+        @asynccontextmanager
+        async def connect(self):
+            yield None
+
+        def begin(self):
+            raise AssertionError("no DDL transaction on a current schema")
+
+    async def current_version(conn):
+        return db.SCHEMA_VERSION
+
+    monkeypatch.setattr(db, "get_engine", lambda: FakeEngine())
+    monkeypatch.setattr(db, "schema_version", current_version)
+    assert asyncio.run(db.init_db()) is False
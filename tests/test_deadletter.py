@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from quake_ingest import deadletter
+from quake_ingest.config import current_config
+from quake_ingest.db import WriteError
+from quake_ingest.parser import parse_batch
+
+def make_feature(event_id, lon=1.0):
+    return {"id": event_id, "properties": {"place": "x", "mag": 1.0, "tsunami": 0, "time": 1000, "updated": 1},
+            "geometry": {"coordinates": [lon, 2.0, 3.0]}}
+
+def test_parse_batch_rejects_malformed_features_and_keeps_columns_aligned():
+    rejects = []
+    features = [make_feature("a"), {"id": "b"}, make_feature("c", lon=500.0), make_feature("d")]
+    batch = parse_batch(features, rejects)
+    assert batch.ids == ["a", "d"]
+    assert len(batch.longitude) == len(batch.magnitude) == len(batch.time_ms) == 2
+    assert [feature["id"] for feature, _ in rejects] == ["b", "c"]
+
+def test_save_or_quarantine_isolates_rejected_rows(monkeypatch):
+    attempts = []
+    quarantined = []
+
+    async def fake_save(batch, announce=True):
+        attempts.append(list(batch.ids))
+        if "bad" in batch.ids:
+            raise WriteError("value out of range", transient=False)
+        return {"inserted": len(batch), "updated": 0, "unchanged": 0}
+
+    async def fake_dead_letters(entries):
+        quarantined.extend(entries)
+    monkeypatch.setattr(deadletter, "save_earthquakes", fake_save)
+    monkeypatch.setattr(deadletter, "save_dead_letters", fake_dead_letters)
+    batch = parse_batch([make_feature(i) for i in ("a", "b", "bad", "c")])
+    counts = asyncio.run(deadletter.save_or_quarantine(batch, "http://x/all_hour.geojson"))
+    assert counts == {"inserted": 3, "updated": 0, "unchanged": 0}
+    assert attempts == [["a", "b", "bad", "c"], ["a", "b"], ["bad", "c"], ["bad"], ["c"]]
+    assert [(e["event_id"], e["stage"]) for e in quarantined] == [("bad", "write")]
+    assert quarantined[0]["payload"]["id"] == "bad"
+
+def test_save_or_quarantine_raises_transient_errors(monkeypatch):
+    async def fake_save(batch, announce=True):
+        raise WriteError("connection refused", transient=True)
+    monkeypatch.setattr(deadletter, "save_earthquakes", fake_save)
+    batch = parse_batch([make_feature("a"), make_feature("b")])
+    with pytest.raises(WriteError) as raised:
+        asyncio.run(deadletter.save_or_quarantine(batch, "x"))
+    assert raised.value.transient
+
+def test_quarantine_falls_back_to_file(monkeypatch, tmp_path):
+    async def fake_dead_letters(entries):
+        raise OSError("database unavailable")
+    monkeypatch.setattr(deadletter, "save_dead_letters", fake_dead_letters)
+    monkeypatch.setitem(current_config, "DEAD_LETTER_FILE", str(tmp_path / "dead.jsonl"))
+    asyncio.run(deadletter.quarantine(deadletter.parse_rejects("x", [({"id": "b"}, "missing properties")])))
+    lines = (tmp_path / "dead.jsonl").read_text().splitlines()
+    assert len(lines) == 1 and '"event_id": "b"' in lines[0]
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from aiohttp import web
+from quake_ingest.fetcher import FeedFetcher, FetchError
+
+FEED = {"metadata": {"generated": 1}, "features": []}
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_get("/feed", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/feed"
+
+def test_fetch_sends_validators_and_handles_304():
+    seen = []
+    async def handler(request):
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.json_response(FEED, headers={"ETag": '"v1"'})
+
+    async def run():
+        runner, url = await serve(handler)
+        try:
+            async with FeedFetcher(retries=0) as fetcher:
+                assert await fetcher.fetch(url) == FEED
+                assert await fetcher.fetch(url) is None
+                fetcher.invalidate(url)
+                assert await fetcher.fetch(url) == FEED
+        finally:
+            await runner.cleanup()
+    asyncio.run(run())
+    assert seen == [None, '"v1"', None]
+
+def test_fetch_retries_server_errors():
+    calls = []
+    async def handler(request):
+        calls.append(1)
+        if len(calls) < 3:
+            return web.Response(status=503)
+        return web.json_response(FEED)
+
+    async def run():
+        runner, url = await serve(handler)
+        try:
+            async with FeedFetcher(retries=2, backoff=0.01) as fetcher:
+                return await fetcher.fetch(url)
+        finally:
+            await runner.cleanup()
+    assert asyncio.run(run()) == FEED
+    assert len(calls) == 3
+
+def test_fetch_gives_up_after_retries():
+    async def handler(request):
+        return web.Response(status=500)
+
+    async def run():
+        runner, url = await serve(handler)
+        try:
+            async with FeedFetcher(retries=1, backoff=0.01) as fetcher:
+                await fetcher.fetch(url)
+        finally:
+            await runner.cleanup()
+    with pytest.raises(FetchError):
+        asyncio.run(run())
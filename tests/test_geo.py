@@ -0,0 +1,25 @@
+import pytest
+from quake_ingest.geo import haversine_km, bbox_around, parse_bbox, in_bbox
+
+def test_haversine_one_degree_of_latitude():
+    assert haversine_km(0, 0, 1, 0) == pytest.approx(111.19, abs=0.01)
+
+def test_bbox_around_contains_circle():
+    west, south, east, north = bbox_around(40, 10, 100)
+    for bearing_point in [(40, 10 + 1.17), (40.89, 10), (39.11, 10)]:
+        assert in_bbox(*bearing_point, (west, south, east, north))
+    assert haversine_km(40, 10, 40, east) >= 100
+
+def test_bbox_around_wraps_antimeridian():
+    west, south, east, north = bbox_around(0, 179.5, 200)
+    assert west > east
+    assert in_bbox(0, -179.5, (west, south, east, north))
+
+def test_bbox_around_pole_spans_all_longitudes():
+    assert bbox_around(89.5, 0, 200)[0::2] == (-180.0, 180.0)
+
+def test_parse_bbox_rejects_bad_input():
+    assert parse_bbox("-10,-5,10,5") == (-10, -5, 10, 5)
+    for bad in ["1,2,3", "a,b,c,d", "0,10,5,-10", "0,0,200,1"]:
+        with pytest.raises(ValueError):
+            parse_bbox(bad)
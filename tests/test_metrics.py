@@ -0,0 +1,53 @@
+import pytest
+from quake_ingest import metrics
+from quake_ingest.batch import QuakeBatch
+from quake_ingest.pipeline import observe_lag
+
+#metrics made here register on a copy, so they never show up in the real /metrics output
+def isolate_registry(monkeypatch):
+    monkeypatch.setattr(metrics, "_registry", list(metrics._registry))
+
+def test_counter_renders_labelled_samples(monkeypatch):
+    isolate_registry(monkeypatch)
+    counter = metrics.Counter("test_requests_total", "Requests", ["feed"])
+    counter.inc(feed="all_hour")
+    counter.inc(2, feed="all_hour")
+    text = metrics.render()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{feed="all_hour"} 3' in text
+
+def test_counter_rejects_wrong_labels(monkeypatch):
+    isolate_registry(monkeypatch)
+    counter = metrics.Counter("test_labels_total", "Labels", ["feed"])
+    with pytest.raises(ValueError):
+        counter.inc(status=200)
+
+def test_histogram_buckets_are_cumulative(monkeypatch):
+    isolate_registry(monkeypatch)
+    histogram = metrics.Histogram("test_seconds", "Latency", buckets=(0.5, 1))
+    for value in (0.25, 0.5, 0.75, 3):
+        histogram.observe(value)
+    lines = metrics.render().splitlines()
+    assert 'test_seconds_bucket{le="0.5"} 2' in lines
+    assert 'test_seconds_bucket{le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 4' in lines
+    assert "test_seconds_sum 4.5" in lines
+    assert "test_seconds_count 4" in lines
+
+def test_label_values_are_escaped(monkeypatch):
+    isolate_registry(monkeypatch)
+    gauge = metrics.Gauge("test_gauge", "Gauge", ["place"])
+    gauge.set(1, place='5 km "N" of\\Town')
+    assert 'test_gauge{place="5 km \\"N\\" of\\\\Town"} 1' in metrics.render()
+
+def test_feed_name():
+    assert metrics.feed_name("https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_hour.geojson") == "all_hour"
+
+def test_observe_lag_skips_missing_times():
+    batch = QuakeBatch()
+    batch.append("a", None, 1.0, 1.0, 0.0, 0.0, 0, 1_000_000, 1_030_000)
+    batch.append("b", None, 1.0, 1.0, 0.0, 0.0, 0, 1_000_000, None)
+    before = metrics.INGEST_LAG.count(since="event"), metrics.INGEST_LAG.count(since="update")
+    observe_lag(batch, now=1_060)
+    assert metrics.INGEST_LAG.count(since="event") == before[0] + 2
+    assert metrics.INGEST_LAG.count(since="update") == before[1] + 1
@@ -0,0 +1,50 @@
+import asyncio
+import pytest
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import asyncpg
+from sqlalchemy.schema import CreateTable
+from quake_ingest.db import Earthquake, build_relocate
+from quake_ingest.partitions import add_months, months_between, upcoming_months, partition_name, partition_month, partition_ddl
+from quake_ingest.retention import expired_months, archive_path, apply_retention, main
+
+def test_month_arithmetic_crosses_years():
+    assert add_months(datetime(2024, 11, 1), 3) == datetime(2025, 2, 1)
+    assert add_months(datetime(2024, 1, 1), -1) == datetime(2023, 12, 1)
+    assert months_between(datetime(2023, 12, 31, 23), datetime(2024, 2, 1)) == [
+        datetime(2023, 12, 1), datetime(2024, 1, 1), datetime(2024, 2, 1)]
+    assert upcoming_months(datetime(2024, 5, 17), 2) == [datetime(2024, 5, 1), datetime(2024, 6, 1), datetime(2024, 7, 1)]
+
+def test_partition_names_round_trip():
+    month = datetime(2024, 3, 1)
+    assert partition_name(month) == "earthquakes_p2024_03"
+    assert partition_month("earthquakes_p2024_03") == month
+    assert partition_month("earthquakes_unpartitioned") is None
+    assert partition_ddl(month).endswith("FOR VALUES FROM ('2024-03-01') TO ('2024-04-01')")
+
+def test_earthquakes_is_range_partitioned_by_month():
+    ddl = str(CreateTable(Earthquake.__table__).compile(dialect=asyncpg.dialect()))
+    assert "PRIMARY KEY (id, occurred_at)" in ddl
+    assert "PARTITION BY RANGE (occurred_at)" in ddl
+
+def test_relocate_deletes_rows_whose_origin_time_moved():
+    sql = str(build_relocate().compile(dialect=asyncpg.dialect()))
+    assert sql.startswith("DELETE FROM earthquakes USING unnest(")
+    assert "earthquakes.occurred_at != " in sql
+
+def test_expired_months_keep_the_retention_window():
+    months = [datetime(2023, m, 1) for m in range(1, 13)] + [datetime(2024, 1, 1)]
+    assert expired_months(months, 3, now=datetime(2024, 1, 15)) == [datetime(2023, m, 1) for m in range(1, 10)]
+    assert expired_months(months, 24, now=datetime(2024, 1, 15)) == []
+
+def test_archive_path_never_overwrites(tmp_path):
+    month = datetime(2020, 1, 1)
+    first = archive_path(tmp_path, month)
+    assert first.name == "earthquakes_p2020_01.parquet"
+    first.touch()
+    assert archive_path(tmp_path, month).name == "earthquakes_p2020_01.1.parquet"
+
+def test_retention_keeps_at_least_one_full_month():
+    with pytest.raises(ValueError):
+        asyncio.run(apply_retention(0))
+    with pytest.raises(SystemExit):
+        asyncio.run(main(["--retention-months", "0"]))
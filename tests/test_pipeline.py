@@ -0,0 +1,91 @@
+import asyncio
+import json
+from quake_ingest import deadletter
+from quake_ingest.cache import RevisionCache
+from quake_ingest.db import WriteError
+from quake_ingest.pipeline import IngestPipeline, make_parse_executor, run_parse, catch_up_url
+
+def make_feature(event_id, updated):
+    return {"id": event_id, "properties": {"place": "x", "mag": 1.0, "tsunami": 0, "time": 1000, "updated": updated},
+            "geometry": {"coordinates": [1.0, 2.0, 3.0]}}
+
+def body(generated, *features):
+    return json.dumps({"metadata": {"generated": generated}, "features": list(features)}).encode()
+
+class FakeFetcher:
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.invalidated = []
+
+    async def fetch(self, url, decode=True):
+        return self.bodies.pop(0)
+
+    def invalidate(self, url):
+        self.invalidated.append(url)
+
+def run_pipeline(monkeypatch, responses, save_result=True):
+    saved = []
+
+    async def fake_save(batch, announce=True):
+        saved.append(list(batch.ids))
+        if not save_result:
+            raise WriteError("connection refused", transient=True)
+        return {"inserted": len(batch), "updated": 0, "unchanged": 0}
+    monkeypatch.setattr(deadletter, "save_earthquakes", fake_save)
+    fetcher = FakeFetcher([b for _, b in responses])
+    revisions = RevisionCache(100)
+
+    async def run():
+        ingest = IngestPipeline(fetcher, revisions, feeds=[], parse_workers=1, flush_interval=0.01, report_interval=0)
+        ingest.write_retries = 1
+        ingest.write_backoff = 0
+        tasks = [asyncio.create_task(ingest._parser()), asyncio.create_task(ingest._writer())]
+        for url, _ in responses:
+            await ingest.fetch(url)
+        await ingest.responses.join()
+        await ingest.parsed.join()
+        await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        return ingest
+
+    return asyncio.run(run()), saved, revisions, fetcher
+
+def test_writer_merges_claimed_events_across_feeds(monkeypatch):
+    responses = [
+        ("http://x/all_hour.geojson", body(1, make_feature("a", 1), make_feature("b", 1))),
+        ("http://x/all_day.geojson", body(7, make_feature("a", 1), make_feature("c", 1))),
+        ("http://x/all_hour.geojson", body(2, make_feature("a", 1))),  # new generation, nothing changed
+    ]
+    ingest, saved, revisions, _ = run_pipeline(monkeypatch, responses)
+    assert saved == [["a", "b", "c"]]
+    assert not revisions.is_new_generation("http://x/all_day.geojson", {"metadata": {"generated": 7}})
+    assert not revisions.is_new_generation("http://x/all_hour.geojson", {"metadata": {"generated": 2}})
+    assert ingest.stats["parse"].events == 5 and ingest.stats["write"].events == 3
+
+def test_failed_write_releases_claims(monkeypatch):
+    responses = [("http://x/all_hour.geojson", body(1, make_feature("a", 1)))]
+    _, saved, revisions, fetcher = run_pipeline(monkeypatch, responses, save_result=False)
+    assert saved == [["a"], ["a"]]  # retried once
+    assert revisions.get("a") is None
+    assert fetcher.invalidated == ["http://x/all_hour.geojson"]
+    assert revisions.is_new_generation("http://x/all_hour.geojson", {"metadata": {"generated": 1}})
+
+def test_process_executor_parses_off_the_loop():
+    executor = make_parse_executor("process", 1)
+    try:
+        metadata, batch, rejects = asyncio.run(run_parse(executor, body(3, make_feature("a", 1))))
+    finally:
+        executor.shutdown()
+    assert metadata == {"generated": 3}
+    assert batch.ids == ["a"]
+    assert rejects == []
+
+def test_catch_up_url_widens_with_downtime():
+    feeds = [{"url": "http://x/all_hour.geojson"}, {"url": "http://x/all_day.geojson"}]
+    assert catch_up_url(3600, feeds) is None
+    assert catch_up_url(86400, feeds) is None
+    assert catch_up_url(2 * 86400, feeds).endswith("/all_week.geojson")
+    assert catch_up_url(10 * 86400, feeds).endswith("/all_month.geojson")
+    assert catch_up_url(90 * 86400, feeds).endswith("/all_month.geojson")
+    assert catch_up_url(7200, [{"url": "http://x/all_hour.geojson"}]).endswith("/all_day.geojson")
@@ -0,0 +1,128 @@
+import asyncio
+import random
+from benchmarks.rules import make_rules
+from benchmarks.stub_server import StubWebhookServer
+from benchmarks.synthetic import make_feature
+from quake_ingest.parser import parse_batch
+import pytest
+from quake_ingest.config import current_config
+from quake_ingest.rules import (Rule, RuleIndex, RuleEngine, WebhookNotifier, PublicResolver, check_webhook_url,
+                                point_in_polygon)
+
+def event(event_id, lon, lat, mag=3.0, depth=10.0, tsunami=0):
+    return {"id": event_id, "properties": {"place": event_id, "mag": mag, "tsunami": tsunami, "time": 1000, "updated": 1},
+            "geometry": {"coordinates": [lon, lat, depth]}}
+
+def test_point_in_polygon():
+    square = [[0, 0], [10, 0], [10, 10], [0, 10]]
+    assert point_in_polygon(5, 5, square)
+    assert not point_in_polygon(15, 5, square)
+    assert not point_in_polygon(5, -1, square)
+
+def test_rule_criteria():
+    rule = Rule(1, latitude=0, longitude=0, radius_km=200, min_magnitude=4, max_depth=70, tsunami=True)
+    assert rule.matches(1, 1, 5.0, 10.0, 1)
+    assert not rule.matches(1, 1, 3.9, 10.0, 1)
+    assert not rule.matches(1, 1, float("nan"), 10.0, 1)
+    assert not rule.matches(1, 1, 5.0, 100.0, 1)
+    assert not rule.matches(1, 1, 5.0, 10.0, 0)
+    assert not rule.matches(3, 3, 5.0, 10.0, 1)
+
+def test_index_finds_rules_across_the_antimeridian():
+    rules = [Rule(1, latitude=0, longitude=179.5, radius_km=300), Rule(2, polygon=[[10, 10], [20, 10], [20, 20]])]
+    batch = parse_batch([event("a", -179.5, 0.5), event("b", 18, 12), event("c", 12, 18)])
+    assert RuleIndex(rules, 1.0).match(batch) == {1: [0], 2: [1]}
+
+def test_polygons_across_the_antimeridian():
+    rule = Rule(1, polygon=[[170, -10], [-170, -10], [-170, 10], [170, 10]])
+    assert rule.bbox() == (170, -10, -170, 10)
+    assert rule.matches(0, 175, 3.0, 10.0, 0) and rule.matches(0, -175, 3.0, 10.0, 0)
+    assert not rule.matches(0, 0, 3.0, 10.0, 0) and not rule.matches(0, 160, 3.0, 10.0, 0)
+    batch = parse_batch([event("a", 179, 0), event("b", -179, 0), event("c", 0, 0)])
+    assert RuleIndex([rule], 1.0).match(batch) == {1: [0, 1]}
+
+def test_index_matches_like_a_full_scan():
+    rules = make_rules(2000, seed=3)
+    rng = random.Random(3)
+    batch = parse_batch(make_feature(i, rng, 0) for i in range(2000))
+    expected = {}
+    for index, values in enumerate(zip(batch.latitude, batch.longitude, batch.magnitude, batch.depth, batch.tsunami)):
+        for rule in rules:
+            if rule.matches(*values):
+                expected.setdefault(rule.id, []).append(index)
+    assert RuleIndex(rules, 2.0).match(batch) == expected
+
+def test_engine_delivers_one_webhook_per_rule_and_batch():
+    async def run():
+        async with StubWebhookServer() as server:
+            engine = RuleEngine(WebhookNotifier(timeout=5))
+            engine.set_rules([
+                Rule(1, name="big ones", webhook_url=server.url("big"), min_magnitude=5),
+                Rule(2, name="near zero", webhook_url=server.url("zero"), latitude=0, longitude=0, radius_km=500),
+            ])
+            batch = parse_batch([event("a", 1, 1, mag=6.1), event("b", 2, 2), event("c", 90, 45, mag=5.5)])
+            engine.on_change({"ids": batch.ids, "batch": batch, "inserted": batch.ids})
+            #the match task starts the delivery tasks: wait for both rounds
+            while engine._tasks:
+                await asyncio.gather(*engine._tasks)
+            await engine.close()
+            return server.received
+
+    received = dict(asyncio.run(run()))
+    assert [e["id"] for e in received["big"]["events"]] == ["a", "c"]
+    assert [e["id"] for e in received["zero"]["events"]] == ["a", "b"]
+    assert received["zero"]["rule_name"] == "near zero"
+    assert isinstance(received["big"]["events"][0]["occurred_at"], str)
+
+def test_engine_does_not_deliver_revisions_again():
+    delivered = []
+
+    class Notifier:
+        async def deliver(self, rule, events):
+            delivered.append([e["id"] for e in events])
+
+        async def close(self):
+            pass
+
+    async def run():
+        engine = RuleEngine(Notifier())
+        engine.set_rules([Rule(1, min_magnitude=5)])
+        batch = parse_batch([event("a", 1, 1, mag=6.1)])
+        engine.on_change({"ids": ["a"], "batch": batch, "inserted": ["a"]})
+        #the same event revised: written again, but not new
+        revised = parse_batch([event("a", 1, 1, mag=6.3), event("b", 2, 2, mag=5.2)])
+        engine.on_change({"ids": ["a", "b"], "batch": revised, "inserted": ["b"]})
+        while engine._tasks:
+            await asyncio.gather(*engine._tasks)
+        await engine.close()
+
+    asyncio.run(run())
+    assert delivered == [["a"], ["b"]]
+
+def test_webhooks_must_resolve_to_public_addresses(monkeypatch):
+    monkeypatch.setitem(current_config, "ALERT_WEBHOOK_ALLOW_PRIVATE", False)
+    asyncio.run(check_webhook_url("https://93.184.216.34/hook"))
+    for url in ["http://127.0.0.1/hook", "http://169.254.169.254/", "http://192.168.1.1/", "http://[fe80::1]/",
+                "ftp://93.184.216.34/", "http:///hook"]:
+        with pytest.raises(ValueError):
+            asyncio.run(check_webhook_url(url))
+    #what the delivery session connects through, whatever the record says by then
+    async def resolve_localhost():
+        return await PublicResolver().resolve("localhost", 80)
+    with pytest.raises(OSError):
+        asyncio.run(resolve_localhost())
+
+def test_delivery_refuses_private_webhooks(monkeypatch):
+    monkeypatch.setitem(current_config, "ALERT_WEBHOOK_ALLOW_PRIVATE", False)
+
+    async def run():
+        async with StubWebhookServer() as server:
+            notifier = WebhookNotifier(timeout=5)
+            try:
+                with pytest.raises(ValueError):
+                    await notifier.deliver(Rule(1, webhook_url=server.url("hook")), [])
+            finally:
+                await notifier.close()
+            return server.received
+
+    assert asyncio.run(run()) == []
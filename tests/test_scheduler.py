@@ -0,0 +1,20 @@
+import asyncio
+from quake_ingest.scheduler import FeedScheduler
+
+def test_scheduler_polls_each_feed_on_its_interval_and_survives_errors():
+    calls = {"fast": 0, "slow": 0}
+
+    async def handler(url):
+        calls[url] += 1
+        if url == "fast":
+            raise RuntimeError("boom")
+
+    async def run():
+        scheduler = FeedScheduler([{"url": "fast", "interval": 0.01}, {"url": "slow", "interval": 1}], handler)
+        try:
+            await asyncio.wait_for(scheduler.run(), 0.2)
+        except asyncio.TimeoutError:
+            pass
+    asyncio.run(run())
+    assert calls["fast"] > 5
+    assert calls["slow"] == 1
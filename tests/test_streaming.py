@@ -0,0 +1,35 @@
+import json
+import pytest
+from quake_ingest.streaming import FeatureStream, iter_features, iter_file_features
+
+FEED = {
+    "type": "FeatureCollection",
+    "metadata": {"generated": 1744363492000, "title": "features of the last hour"},
+    "features": [
+        {"type": "Feature", "id": "a", "properties": {"mag": 0.63, "place": "Ünïcode"}, "geometry": {"coordinates": [-122.8, 38.8, 1.55]}},
+        {"type": "Feature", "id": "b", "properties": {"mag": 12}, "geometry": {"coordinates": [1, 2, 3]}},
+    ],
+    "bbox": [-122.8, 2, 1, 1, 38.8, 3],
+}
+
+def test_features_survive_every_chunk_boundary():
+    raw = json.dumps(FEED, indent=1).encode("utf-8")
+    for size in (1, 2, 3, 7, 64, len(raw)):
+        chunks = [raw[i:i + size] for i in range(0, len(raw), size)]
+        assert list(iter_features(chunks)) == FEED["features"]
+
+def test_metadata_is_kept():
+    stream = FeatureStream()
+    stream.feed(json.dumps(FEED))
+    stream.close()
+    assert stream.metadata["generated"] == 1744363492000
+
+def test_truncated_input_raises():
+    raw = json.dumps(FEED)[:-20]
+    with pytest.raises(ValueError):
+        list(iter_features([raw]))
+
+def test_iter_file_features(tmp_path):
+    path = tmp_path / "feed.geojson"
+    path.write_text(json.dumps(FEED), encoding="utf-8")
+    assert [f["id"] for f in iter_file_features(path, chunk_size=5)] == ["a", "b"]